@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+BGE 推理运行时基准测试
+在同一批文献切片上比较 torch(fp32) / onnx / onnx-int8 的吞吐量，
+并以 torch fp32 向量为基准报告余弦一致性和近邻重合度
+
+用法:
+    python benchmark_bge_runtime.py --sample 512 --runtimes torch onnx-int8
+    python benchmark_bge_runtime.py --texts-file chunks.txt --threads 8
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+from bge_server import RUNTIMES, load_sentence_transformer
+
+# ChromaDB 持久化路径和集合（与 build_vector_db_v2.py 一致）
+CHROMA_DB_PATH = os.path.dirname(os.path.abspath(__file__))
+COLLECTION_NAME = "lfp_papers_v2"
+
+
+def load_sample_texts(args) -> list:
+    """从文本文件（每行一段）或向量库中随机抽取切片"""
+    if args.texts_file:
+        with open(args.texts_file, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        import chromadb
+        client = chromadb.PersistentClient(path=args.chroma_path)
+        collection = client.get_collection(args.collection)
+        texts = [doc for doc in collection.get(include=["documents"])["documents"] if doc]
+
+    if not texts:
+        sys.exit("❌ 没有可用的样本文本")
+    random.Random(args.seed).shuffle(texts)
+    return texts[:args.sample]
+
+
+def measure(model, texts: list, batch_size: int, repeat: int):
+    """编码全部样本，返回向量和最快一轮的吞吐量（条/秒）"""
+    model.encode(texts[:batch_size], normalize_embeddings=True, batch_size=batch_size)  # 预热
+    best = float("inf")
+    embeddings = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        embeddings = model.encode(
+            texts,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+            batch_size=batch_size
+        )
+        best = min(best, time.perf_counter() - start)
+    return np.asarray(embeddings, dtype=np.float32), len(texts) / best
+
+
+def topk_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """以样本互为查询，比较两组向量的 top-k 近邻重合比例"""
+    k = min(k, len(reference) - 1)
+    if k <= 0:
+        return 1.0
+    overlaps = []
+    for vectors in (reference, candidate):
+        sims = vectors @ vectors.T
+        np.fill_diagonal(sims, -np.inf)
+        overlaps.append(np.argpartition(-sims, k, axis=1)[:, :k])
+    return float(np.mean([
+        len(set(a) & set(b)) / k for a, b in zip(overlaps[0], overlaps[1])
+    ]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BGE 推理运行时基准测试")
+    parser.add_argument("--runtimes", nargs="+", choices=RUNTIMES, default=["torch", "onnx", "onnx-int8"],
+                        help="参与比较的运行时（torch fp32 始终作为基准）")
+    parser.add_argument("--device", default="cpu", help="torch 基准的设备")
+    parser.add_argument("--threads", type=int, default=0, help="推理线程数（0=默认）")
+    parser.add_argument("--sample", type=int, default=512, help="样本切片数")
+    parser.add_argument("--batch-size", type=int, default=32, help="编码批大小")
+    parser.add_argument("--repeat", type=int, default=3, help="计时轮数（取最快一轮）")
+    parser.add_argument("--topk", type=int, default=10, help="近邻重合度的 k")
+    parser.add_argument("--texts-file", help="样本文本文件（每行一段），默认从向量库抽取")
+    parser.add_argument("--chroma-path", default=CHROMA_DB_PATH, help="ChromaDB 路径")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="集合名称")
+    parser.add_argument("--seed", type=int, default=42, help="抽样随机种子")
+    parser.add_argument("--output", help="结果保存为 JSON 文件")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    texts = load_sample_texts(args)
+    print(f"📚 样本: {len(texts)} 条切片，平均 {sum(map(len, texts)) / len(texts):.0f} 字符")
+
+    runtimes = ["torch"] + [r for r in args.runtimes if r != "torch"]
+    reference = None
+    results = []
+    for runtime in runtimes:
+        print(f"\n🔄 加载运行时: {runtime}")
+        model = load_sentence_transformer(runtime, args.device if runtime == "torch" else "cpu", args.threads)
+        embeddings, throughput = measure(model, texts, args.batch_size, args.repeat)
+        del model
+
+        if reference is None:
+            reference = embeddings
+        cosines = np.sum(reference * embeddings, axis=1)
+        result = {
+            "runtime": runtime,
+            "texts_per_sec": round(throughput, 1),
+            "speedup": round(throughput / results[0]["texts_per_sec"], 2) if results else 1.0,
+            "cosine_mean": round(float(cosines.mean()), 5),
+            "cosine_min": round(float(cosines.min()), 5),
+            "cosine_p1": round(float(np.percentile(cosines, 1)), 5),
+            f"top{args.topk}_overlap": round(topk_overlap(reference, embeddings, args.topk), 4),
+        }
+        results.append(result)
+        print(f"   {result}")
+
+    print("\n" + "=" * 80)
+    print(f"{'运行时':<12}{'条/秒':>10}{'加速比':>8}{'余弦均值':>10}{'余弦最小':>10}{'近邻重合':>10}")
+    for r in results:
+        print(f"{r['runtime']:<12}{r['texts_per_sec']:>10}{r['speedup']:>8}"
+              f"{r['cosine_mean']:>10}{r['cosine_min']:>10}{r[f'top{args.topk}_overlap']:>10}")
+        if r["runtime"] != "torch" and r["cosine_min"] < 0.99:
+            print(f"   ⚠️  {r['runtime']} 最小余弦一致性低于 0.99")
+    print("=" * 80)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"sample": len(texts), "batch_size": args.batch_size, "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,21 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+import asyncio
+import base64
+import hashlib
+import os
+import platform
+import sqlite3
+import struct
+import threading
+import time
+import numpy as np
+import torch
 import uvicorn
 import logging
 
@@ -23,12 +37,832 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# 全局模型实例
+MODEL_ID = 'BAAI/bge-large-zh-v1.5'
+
+# 全局模型实例（第一个副本，用于健康检查）
 model = None
 
+# 服务配置（通过环境变量传递，uvicorn 多 worker 时每个进程都能读到）
+MAX_BATCH_SIZE = int(os.getenv("BGE_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("BGE_MAX_WAIT_MS", "5"))
+DEVICE = os.getenv("BGE_DEVICE", "cuda")  # 使用 GPU,如果没有改为 'cpu'
+REPLICAS = int(os.getenv("BGE_REPLICAS", "1"))
+THREADS_PER_REPLICA = int(os.getenv("BGE_THREADS_PER_REPLICA", "0"))  # 0 = 等于分配到的核数
+RUNTIME = os.getenv("BGE_RUNTIME", "torch").lower()  # torch / onnx / onnx-int8（ONNX 仅 CPU）
+ONNX_DIR = os.getenv("BGE_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bge_onnx"))
+ONNX_QUANT = os.getenv("BGE_ONNX_QUANT", "auto")  # auto / arm64 / avx2 / avx512 / avx512_vnni
+ENCODE_BATCH_SIZE = int(os.getenv("BGE_ENCODE_BATCH_SIZE", "32"))  # 单次前向的最大文本数
+LENGTH_BUCKETS = os.getenv("BGE_LENGTH_BUCKETS", "true").lower() == "true"
+MAX_BATCH_TOKENS = int(os.getenv("BGE_MAX_BATCH_TOKENS", "16384"))  # 单次前向的 token 上限（含填充）
+PASS_OVERHEAD_TOKENS = int(os.getenv("BGE_PASS_OVERHEAD_TOKENS", "512"))  # 每多一次前向折合的 token 数
+UNIX_SOCKET = os.getenv("BGE_UNIX_SOCKET", "")  # 本机传输的 Unix 套接字路径，为空时不开启
+SHM_SIZE_MB = int(os.getenv("BGE_SHM_SIZE_MB", "64"))  # 共享内存缓冲区大小（所有连接共用）
+CACHE_SIZE = int(os.getenv("BGE_CACHE_SIZE", "20000"))  # 内存缓存条数，0 = 关闭
+CACHE_PATH = os.getenv("BGE_CACHE_PATH", "")  # 磁盘缓存 SQLite 文件，为空时只用内存
+
+# 响应编码格式 -> base64 编码的数据类型（小端）；float 为 OpenAI 默认的JSON数组
+ENCODING_DTYPES = {
+    "float": None,
+    "base64": "<f4",
+    "base64_float16": "<f2",
+}
+
+
+def encode_embedding(embedding: np.ndarray, encoding_format: str):
+    """按请求的格式序列化单条向量"""
+    dtype = ENCODING_DTYPES[encoding_format]
+    if dtype is None:
+        return embedding.tolist()
+    return base64.b64encode(np.asarray(embedding, dtype=dtype).tobytes()).decode("ascii")
+
+
+def split_cores(n_replicas: int) -> List[List[int]]:
+    """把当前进程可用的CPU核按连续区间平均分给各副本"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if n_replicas > len(cores):
+        logger.warning(f"⚠️  副本数 {n_replicas} 超过可用核数 {len(cores)}，按核数创建副本")
+    n_replicas = max(1, min(n_replicas, len(cores)))
+    return [
+        cores[i * len(cores) // n_replicas:(i + 1) * len(cores) // n_replicas]
+        for i in range(n_replicas)
+    ]
+
+
+RUNTIMES = ("torch", "onnx", "onnx-int8")
+_export_lock = threading.Lock()
+
+
+def detect_quantization_config() -> str:
+    """按CPU指令集选择 ONNX Runtime 动态量化配置"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+def export_int8_model(quant_config: str) -> str:
+    """
+    导出动态 int8 量化的 ONNX 模型到 ONNX_DIR（已存在时直接复用）
+
+    Returns:
+        量化模型在 ONNX_DIR 中的相对路径
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    file_name = f"onnx/model_qint8_{quant_config}.onnx"
+    with _export_lock:
+        if not os.path.exists(os.path.join(ONNX_DIR, file_name)):
+            logger.info(f"🔄 导出 int8 量化 ONNX 模型 ({quant_config}) 到 {ONNX_DIR}，首次约需数分钟...")
+            fp32_model = SentenceTransformer(MODEL_ID, device="cpu", backend="onnx")
+            fp32_model.save_pretrained(ONNX_DIR)
+            export_dynamic_quantized_onnx_model(fp32_model, quant_config, ONNX_DIR)
+            logger.info(f"✅ 量化模型已保存: {file_name}")
+    return file_name
+
+
+def load_sentence_transformer(runtime: str = "torch", device: str = "cpu", threads: int = 0):
+    """
+    按运行时加载模型
+
+    Args:
+        runtime: torch / onnx / onnx-int8
+        device: torch 运行时的设备；ONNX 运行时固定使用 CPU
+        threads: ONNX Runtime 算子内线程数（0=由 ONNX Runtime 决定）
+
+    Returns:
+        SentenceTransformer 模型
+    """
+    if runtime not in RUNTIMES:
+        raise ValueError(f"不支持的运行时: {runtime}，可选: {', '.join(RUNTIMES)}")
+    if runtime == "torch":
+        return SentenceTransformer(MODEL_ID, device=device)
+
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("ONNX 运行时需要安装: pip install 'sentence-transformers[onnx]'（>=3.2）")
+
+    model_kwargs = {}
+    if threads:
+        # 会话线程池在加载线程中创建，继承副本线程的CPU亲和性
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs["session_options"] = session_options
+
+    if runtime == "onnx":
+        return SentenceTransformer(MODEL_ID, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    quant_config = detect_quantization_config() if ONNX_QUANT == "auto" else ONNX_QUANT
+    model_kwargs["file_name"] = export_int8_model(quant_config)
+    return SentenceTransformer(ONNX_DIR, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+def plan_buckets(lengths: List[int], batch_size: int, max_tokens: int, pass_overhead: int = 0) -> List[List[int]]:
+    """
+    按 token 长度分桶，使 (各桶最长长度 × 条数) 之和加上每次前向的固定开销最小
+
+    文本按长度升序排列后，最优分桶一定是连续区间，用动态规划求解（O(n × batch_size)）。
+    每桶最多 batch_size 条，且多于一条时 (最长长度 × 条数) 不超过 max_tokens
+
+    Args:
+        lengths: 各文本 token 数
+        batch_size: 每桶最多条数
+        max_tokens: 每桶 token 上限（含填充）
+        pass_overhead: 每多一次前向折合的 token 数，越大越倾向少分桶
+
+    Returns:
+        各桶的原始下标列表
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    sorted_lengths = [lengths[i] for i in order]
+    n = len(order)
+    best = [0.0] + [float("inf")] * n
+    cut = [0] * (n + 1)
+    for end in range(1, n + 1):
+        longest = sorted_lengths[end - 1]
+        for start in range(end - 1, max(-1, end - 1 - batch_size), -1):
+            size = end - start
+            if size > 1 and size * longest > max_tokens:
+                break
+            cost = best[start] + size * longest + pass_overhead
+            if cost < best[end]:
+                best[end] = cost
+                cut[end] = start
+
+    buckets: List[List[int]] = []
+    end = n
+    while end > 0:
+        buckets.append(order[cut[end]:end])
+        end = cut[end]
+    return buckets[::-1]
+
+
+def padded_tokens(buckets: List[List[int]], lengths: List[int]) -> int:
+    """各批次填充到最长文本后的 token 总数"""
+    return sum(max(lengths[i] for i in bucket) * len(bucket) for bucket in buckets if bucket)
+
+
+class PaddingStats:
+    """
+    填充统计
+
+    baseline 为 sentence-transformers 默认行为（按字符数排序后每 ENCODE_BATCH_SIZE 条一批），
+    bucketed 为按 token 长度分桶后的实际批次
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.texts = 0
+        self.tokens = 0
+        self.baseline_slots = 0
+        self.bucketed_slots = 0
+        self.forward_passes = 0
+
+    def record(self, lengths: List[int], baseline_slots: int, bucketed_slots: int, n_buckets: int):
+        with self._lock:
+            self.texts += len(lengths)
+            self.tokens += sum(lengths)
+            self.baseline_slots += baseline_slots
+            self.bucketed_slots += bucketed_slots
+            self.forward_passes += n_buckets
+
+    def metrics(self) -> dict:
+        """填充比例 = 填充 token / 批次总 token"""
+        with self._lock:
+            before = 1 - self.tokens / self.baseline_slots if self.baseline_slots else 0.0
+            after = 1 - self.tokens / self.bucketed_slots if self.bucketed_slots else 0.0
+            return {
+                "enabled": LENGTH_BUCKETS,
+                "max_batch_tokens": MAX_BATCH_TOKENS,
+                "texts": self.texts,
+                "tokens": self.tokens,
+                "forward_passes": self.forward_passes,
+                "padding_ratio_before": round(before, 4),
+                "padding_ratio_after": round(after, 4),
+                "compute_saved": round(1 - self.bucketed_slots / self.baseline_slots, 4)
+                if self.baseline_slots else 0.0
+            }
+
+
+padding_stats = PaddingStats()
+
+
+class ModelReplica:
+    """
+    模型副本
+
+    每个副本独占一个单线程执行器，编码在该线程中进行，不阻塞事件循环。
+    CPU 模式下该线程绑定到分配的核上，并设置 torch 线程数：
+    OpenMP 线程数按调用线程生效，其工作线程继承调用线程的CPU亲和性，
+    因此各副本的计算互不争抢核
+    """
+
+    def __init__(self, index: int, device: str, cores: Optional[List[int]] = None, threads: int = 0,
+                 runtime: str = "torch"):
+        self.index = index
+        self.device = device
+        self.runtime = runtime
+        self.cores = cores or []
+        self.threads = threads or len(self.cores)
+        self.model = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"bge-replica-{index}",
+            initializer=self._init_thread
+        )
+
+    def _init_thread(self):
+        """在副本线程中设置CPU亲和性和torch线程数"""
+        if self.device != "cpu":
+            return
+        if self.cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.cores)
+        if self.threads:
+            torch.set_num_threads(self.threads)
+
+    def load(self):
+        """加载模型（在副本线程中执行）"""
+        try:
+            self.model = load_sentence_transformer(self.runtime, self.device, self.threads)
+        except Exception as e:
+            if self.device == "cpu":
+                raise
+            logger.error(f"❌ 副本 {self.index} 加载失败: {e}")
+            # 尝试 CPU 模式
+            logger.warning("⚠️  改用 CPU 模式，PyTorch fp32 在 CPU 上较慢，可考虑 --runtime onnx-int8")
+            self.device = "cpu"
+            self._init_thread()
+            self.model = load_sentence_transformer(self.runtime, self.device)
+        logger.info(f"✅ 副本 {self.index} 加载完成 (runtime={self.runtime}, device={self.device}, "
+                    f"cores={self.cores if self.device == 'cpu' else '-'}, threads={self.threads or '-'})")
+
+    def encode(self, texts: List[str]):
+        """编码一个合并批次：按 token 长度分桶，逐桶编码后按原顺序拼回"""
+        if not LENGTH_BUCKETS or len(texts) <= 1:
+            return self._encode(texts, ENCODE_BATCH_SIZE)
+
+        lengths = self.token_lengths(texts)
+        buckets = plan_buckets(lengths, ENCODE_BATCH_SIZE, MAX_BATCH_TOKENS, PASS_OVERHEAD_TOKENS)
+        embeddings = None
+        for bucket in buckets:
+            bucket_embeddings = self._encode([texts[i] for i in bucket], len(bucket))
+            if embeddings is None:
+                embeddings = np.empty((len(texts), bucket_embeddings.shape[1]), dtype=bucket_embeddings.dtype)
+            embeddings[bucket] = bucket_embeddings
+
+        by_chars = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        baseline = [by_chars[i:i + ENCODE_BATCH_SIZE] for i in range(0, len(texts), ENCODE_BATCH_SIZE)]
+        padding_stats.record(lengths, padded_tokens(baseline, lengths), padded_tokens(buckets, lengths), len(buckets))
+        return embeddings
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """各文本截断后的 token 数（含特殊符号），没有分词器时按字符数估计"""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+        max_length = getattr(self.model, "max_seq_length", None) or 512
+        encoded = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _encode(self, texts: List[str], batch_size: int):
+        """调用模型编码（L2 归一化）"""
+        return self.model.encode(
+            texts,
+            normalize_embeddings=True,  # L2 归一化
+            show_progress_bar=False,
+            batch_size=batch_size
+        )
+
+
+class ReplicaPool:
+    """模型副本池：空闲副本队列，同一时刻每个副本只编码一个批次"""
+
+    def __init__(self, n_replicas: int, device: str, threads_per_replica: int = 0, runtime: str = "torch"):
+        if runtime != "torch":
+            device = "cpu"  # ONNX 运行时只用于 CPU
+        if device == "cpu":
+            core_groups = split_cores(n_replicas)
+        else:
+            core_groups = [[] for _ in range(max(1, n_replicas))]
+        self.replicas = [
+            ModelReplica(i, device, cores, threads_per_replica, runtime)
+            for i, cores in enumerate(core_groups)
+        ]
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def start(self):
+        """在各副本线程中并行加载模型"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(replica.executor, replica.load)
+            for replica in self.replicas
+        ])
+        self._idle = asyncio.Queue()
+        for replica in self.replicas:
+            self._idle.put_nowait(replica)
+
+    async def acquire(self) -> ModelReplica:
+        """等待空闲副本"""
+        return await self._idle.get()
+
+    def release(self, replica: ModelReplica):
+        """归还副本"""
+        self._idle.put_nowait(replica)
+
+    async def encode(self, replica: ModelReplica, texts: List[str]):
+        """在副本线程中编码"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(replica.executor, replica.encode, texts)
+
+    def shutdown(self):
+        """关闭副本线程"""
+        for replica in self.replicas:
+            replica.executor.shutdown(wait=False)
+
+    def metrics(self) -> dict:
+        """副本指标"""
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            "replicas": len(self.replicas),
+            "busy": len(self.replicas) - idle if self._idle is not None else 0,
+            "runtime": self.replicas[0].runtime,
+            "devices": [replica.device for replica in self.replicas],
+            "cores": [replica.cores for replica in self.replicas],
+            "threads": [replica.threads for replica in self.replicas]
+        }
+
+
+class MicroBatcher:
+    """
+    动态合批队列
+
+    收集 max_wait_ms 时间窗内（或累计达到 max_batch_size 条文本）的请求，
+    合并为一次 model.encode 调用，再把向量按请求切分返回。
+    所有副本都在忙时请求继续排队，下一个批次自然变大
+    """
+
+    # 批大小分布统计的区间上界
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+    def __init__(self, pool: ReplicaPool, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.pool = pool
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+        self.max_batch_seen = 0
+        self.encode_seconds = 0.0
+        self.batch_size_histogram = {f"<={b}": 0 for b in self.BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram[f">{self.BATCH_SIZE_BUCKETS[-1]}"] = 0
+
+    def start(self):
+        """在当前事件循环中启动合批任务"""
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止合批任务"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def submit(self, texts: List[str]):
+        """
+        提交一个请求的文本，等待合批编码结果
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的向量数组
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        return await future
+
+    async def _run(self):
+        """合批主循环"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n_texts = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+
+            # 先占用空闲副本，等待期间到达的请求并入本批次
+            replica = await self.pool.acquire()
+
+            while n_texts < self.max_batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout <= 0:
+                        item = self._queue.get_nowait()
+                    else:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                batch.append(item)
+                n_texts += len(item[0])
+
+            task = asyncio.create_task(self._encode_batch(replica, batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _encode_batch(self, replica: ModelReplica, batch: List[Tuple[List[str], asyncio.Future]]):
+        """在副本上编码一个合并批次并分发结果（已断开的请求直接跳过）"""
+        try:
+            batch = [(texts, future) for texts, future in batch if not future.done()]
+            if not batch:
+                return
+
+            all_texts = [text for texts, _ in batch for text in texts]
+            start = time.perf_counter()
+            try:
+                embeddings = await self.pool.encode(replica, all_texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        finally:
+            self.pool.release(replica)
+        self._record(len(batch), len(all_texts), time.perf_counter() - start)
+
+        offset = 0
+        for texts, future in batch:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(texts)])
+            offset += len(texts)
+
+    def _record(self, n_requests: int, n_texts: int, seconds: float):
+        """记录合批指标"""
+        self.batches += 1
+        self.requests += n_requests
+        self.texts += n_texts
+        self.encode_seconds += seconds
+        self.max_batch_seen = max(self.max_batch_seen, n_texts)
+        for bound in self.BATCH_SIZE_BUCKETS:
+            if n_texts <= bound:
+                self.batch_size_histogram[f"<={bound}"] += 1
+                break
+        else:
+            self.batch_size_histogram[f">{self.BATCH_SIZE_BUCKETS[-1]}"] += 1
+
+    def metrics(self) -> dict:
+        """合批指标：队列深度、实际批大小和编码耗时"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "avg_encode_ms": self.encode_seconds * 1000 / self.batches if self.batches else 0.0,
+            "batch_size_histogram": self.batch_size_histogram,
+            "inflight_batches": len(self._inflight)
+        }
+
+
+class VectorCache:
+    """
+    向量缓存：键为 sha1(模型名 + 文本)，值为归一化后的 float32 向量
+
+    - 内存层：LRU，最多 memory_size 条（1024 维约 4 KB/条）
+    - 磁盘层：可选 SQLite（WAL 模式），重启后保留，多个 worker 共享；不做容量淘汰
+    """
+
+    def __init__(self, memory_size: int = 20000, disk_path: str = "", model_id: str = MODEL_ID):
+        self.memory_size = max(0, memory_size)
+        self.model_id = model_id
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._conn = self._open_db(disk_path)
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    @staticmethod
+    def _open_db(disk_path: str) -> Optional[sqlite3.Connection]:
+        """打开磁盘缓存，失败时只使用内存层"""
+        try:
+            db_dir = os.path.dirname(disk_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(disk_path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            conn.commit()
+            logger.info(f"✅ 磁盘向量缓存: {disk_path}")
+            return conn
+        except Exception as e:
+            logger.warning(f"⚠️  磁盘向量缓存不可用，仅使用内存缓存: {e}")
+            return None
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_size > 0 or self._conn is not None
+
+    @property
+    def has_disk(self) -> bool:
+        return self._conn is not None
+
+    def make_key(self, text: str) -> str:
+        """缓存键：sha1(模型名 + 文本)，文本不做规范化，保证与直接编码的结果一致"""
+        return hashlib.sha1(f"{self.model_id}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """批量查询，返回命中的 键 -> 向量"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            n_memory = len(found)
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if missing and self._conn is not None:
+                try:
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        rows = self._conn.execute(
+                            f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(chunk))})",
+                            chunk
+                        ).fetchall()
+                        for key, blob in rows:
+                            vector = np.frombuffer(blob, dtype=np.float32)
+                            found[key] = vector
+                            self._remember(key, vector)
+                except Exception as e:
+                    logger.warning(f"⚠️  读取磁盘向量缓存失败: {e}")
+
+            self.hits_memory += n_memory
+            self.hits_disk += len(found) - n_memory
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """批量写入新编码的向量"""
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._conn is not None:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)",
+                        [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+                    )
+                    self._conn.commit()
+                except Exception as e:
+                    logger.warning(f"⚠️  写入磁盘向量缓存失败: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """写入内存层并按 LRU 淘汰"""
+        if self.memory_size == 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        """关闭磁盘缓存"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def metrics(self) -> dict:
+        """缓存指标（按去重后的文本计数）"""
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_size": len(self._memory),
+            "memory_limit": self.memory_size,
+            "disk_enabled": self.has_disk
+        }
+
+
+async def encode_with_cache(texts: List[str]) -> List[np.ndarray]:
+    """
+    编码文本，缓存命中的直接复用，只把未命中的（去重后）交给合批队列
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        与输入顺序一致的向量列表
+    """
+    if not vector_cache.enabled:
+        return list(await batcher.submit(texts))
+
+    keys = [vector_cache.make_key(text) for text in texts]
+    # 磁盘层查询放到线程中，避免阻塞事件循环
+    if vector_cache.has_disk:
+        vectors = await asyncio.to_thread(vector_cache.get_many, keys)
+    else:
+        vectors = vector_cache.get_many(keys)
+
+    misses = {key: text for key, text in zip(keys, texts) if key not in vectors}
+    if misses:
+        embeddings = await batcher.submit(list(misses.values()))
+        encoded = {
+            key: np.array(embedding, dtype=np.float32)
+            for key, embedding in zip(misses.keys(), embeddings)
+        }
+        if vector_cache.has_disk:
+            await asyncio.to_thread(vector_cache.put_many, encoded)
+        else:
+            vector_cache.put_many(encoded)
+        vectors.update(encoded)
+
+    if len(misses) < len(texts):
+        logger.info(f"⚡ 缓存命中 {len(texts) - len(misses)}/{len(texts)}，编码 {len(misses)} 条")
+    return [vectors[key] for key in keys]
+
+
+class SharedMemoryTransport:
+    """
+    本机传输：Unix 域套接字收发请求，向量写入共享内存缓冲区
+
+    与 backend/services/shm_transport.py 的协议一致（小端）:
+      握手（服务端 -> 客户端）: u32 名称长度 + 共享内存名称 + u64 缓冲区大小
+      请求: u32 文本数 + 每条 (u32 字节数 + UTF-8 文本)
+      响应: u32 状态码 + u32 行数 + u32 维度 + u64 偏移；状态码非200时随后是 u32 长度 + 错误信息
+    每个连接同一时刻占用一段区域：客户端用完上一次的向量后才会在该连接上发送下一个请求，
+    因此区域在同一连接的下一个请求到达或连接关闭时才释放。没有足够的空闲空间时返回503，
+    不覆盖任何仍在使用的区域
+    """
+
+    U32 = struct.Struct("<I")
+    U64 = struct.Struct("<Q")
+    RESPONSE = struct.Struct("<IIIQ")
+    ALIGN = 64
+
+    def __init__(self, path: str, size_mb: int = 64):
+        self.path = path
+        self.size = max(1, size_mb) * 1024 * 1024
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._regions: Dict[int, Tuple[int, int]] = {}  # 连接编号 -> (偏移, 大小)
+        self._next_connection = 0
+        self.requests = 0
+        self.texts = 0
+        self.full = 0
+
+    async def start(self):
+        """创建共享内存并监听套接字"""
+        self.shm = shared_memory.SharedMemory(create=True, size=self.size)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"🔗 本机传输: unix://{self.path} (共享内存 {self.shm.name}, {self.size // (1024 * 1024)} MB)")
+
+    async def stop(self):
+        """关闭套接字并释放共享内存"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def _reserve(self, connection: int, nbytes: int) -> Optional[int]:
+        """
+        为连接分配一段区域（首次适配，在事件循环中调用，无需加锁）
+
+        Args:
+            connection: 连接编号（调用前已释放该连接的上一段区域）
+            nbytes: 需要的字节数
+
+        Returns:
+            区域偏移，没有足够的连续空闲空间时返回None
+        """
+        size = (nbytes + self.ALIGN - 1) // self.ALIGN * self.ALIGN
+        cursor = 0
+        for offset, used in sorted(self._regions.values()):
+            if offset - cursor >= size:
+                break
+            cursor = offset + used
+        if cursor + size > self.size:
+            return None
+        self._regions[connection] = (cursor, size)
+        return cursor
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个客户端连接（连接内请求串行）"""
+        connection = self._next_connection
+        self._next_connection += 1
+        name = self.shm.name.encode("utf-8")
+        writer.write(self.U32.pack(len(name)) + name + self.U64.pack(self.size))
+        try:
+            await writer.drain()
+            while True:
+                (n_texts,) = self.U32.unpack(await reader.readexactly(self.U32.size))
+                texts = []
+                for _ in range(n_texts):
+                    (size,) = self.U32.unpack(await reader.readexactly(self.U32.size))
+                    texts.append((await reader.readexactly(size)).decode("utf-8"))
+                # 新请求说明客户端已用完该连接上一次的向量
+                self._regions.pop(connection, None)
+                writer.write(await self._respond(connection, texts))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._regions.pop(connection, None)
+            writer.close()
+
+    async def _respond(self, connection: int, texts: List[str]) -> bytes:
+        """编码并把向量写入该连接的共享内存区域，返回响应帧"""
+        if model is None:
+            return self._error(503, "模型未加载")
+        if not texts:
+            return self.RESPONSE.pack(200, 0, 0, 0)
+        try:
+            embeddings = await encode_with_cache(texts)
+        except Exception as e:
+            logger.error(f"❌ Embedding 生成失败: {e}")
+            return self._error(500, str(e))
+
+        dim = len(embeddings[0])
+        nbytes = len(embeddings) * dim * 4
+        if nbytes > self.size:
+            return self._error(413, f"单次请求 {nbytes} 字节超过共享内存大小 {self.size}")
+        offset = self._reserve(connection, nbytes)
+        if offset is None:
+            self.full += 1
+            return self._error(503, f"共享内存已满（{len(self._regions)} 个连接持有向量），请稍后重试")
+        rows = np.ndarray((len(embeddings), dim), dtype="<f4", buffer=self.shm.buf, offset=offset)
+        for i, embedding in enumerate(embeddings):
+            rows[i] = embedding
+        del rows
+
+        self.requests += 1
+        self.texts += len(texts)
+        return self.RESPONSE.pack(200, len(embeddings), dim, offset)
+
+    def _error(self, status: int, message: str) -> bytes:
+        data = message.encode("utf-8")
+        return self.RESPONSE.pack(status, 0, 0, 0) + self.U32.pack(len(data)) + data
+
+    def metrics(self) -> dict:
+        """本机传输指标"""
+        return {
+            "path": self.path,
+            "shared_memory_mb": self.size // (1024 * 1024),
+            "requests": self.requests,
+            "texts": self.texts,
+            "regions_in_use": len(self._regions),
+            "bytes_in_use": sum(size for _, size in self._regions.values()),
+            "full": self.full
+        }
+
+
+pool = ReplicaPool(n_replicas=REPLICAS, device=DEVICE, threads_per_replica=THREADS_PER_REPLICA, runtime=RUNTIME)
+batcher = MicroBatcher(pool, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+vector_cache = VectorCache(memory_size=CACHE_SIZE, disk_path=CACHE_PATH)
+local_transport = SharedMemoryTransport(UNIX_SOCKET, SHM_SIZE_MB) if UNIX_SOCKET else None
+
 class EmbeddingRequest(BaseModel):
     input: List[str]
     model: str = "bge-large-zh-v1.5"
+    encoding_format: str = "float"  # float / base64（float32）/ base64_float16
 
 class EmbeddingResponse(BaseModel):
     data: List[dict]
@@ -39,22 +873,27 @@ class EmbeddingResponse(BaseModel):
 async def load_model():
     """启动时加载模型"""
     global model
-    try:
-        logger.info("正在加载 BGE 模型: BAAI/bge-large-zh-v1.5")
-        model = SentenceTransformer(
-            'BAAI/bge-large-zh-v1.5',
-            device='cuda'  # 使用 GPU,如果没有改为 'cpu'
-        )
-        logger.info("✅ 模型加载完成!")
-    except Exception as e:
-        logger.error(f"❌ 模型加载失败: {e}")
-        # 尝试 CPU 模式
-        logger.info("尝试使用 CPU 模式...")
-        model = SentenceTransformer(
-            'BAAI/bge-large-zh-v1.5',
-            device='cpu'
-        )
-        logger.info("✅ 模型加载完成 (CPU 模式)")
+    logger.info(f"正在加载 BGE 模型: {MODEL_ID} ({len(pool.replicas)} 个副本, "
+                f"runtime={RUNTIME}, device={pool.replicas[0].device})")
+    await pool.start()
+    model = pool.replicas[0].model
+    logger.info("✅ 模型加载完成!")
+    
+    batcher.start()
+    logger.info(f"📦 动态合批: max_batch_size={MAX_BATCH_SIZE}, max_wait_ms={MAX_WAIT_MS}")
+    
+    if local_transport is not None:
+        await local_transport.start()
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    """关闭时停止本机传输、合批任务和副本线程"""
+    if local_transport is not None:
+        await local_transport.stop()
+    await batcher.stop()
+    pool.shutdown()
+    vector_cache.close()
 
 @app.post("/v1/embeddings", response_model=EmbeddingResponse)
 async def create_embeddings(request: EmbeddingRequest):
@@ -64,28 +903,32 @@ async def create_embeddings(request: EmbeddingRequest):
     兼容 OpenAI API 格式:
     POST /v1/embeddings
     {
-        "input": ["文本1", "文本2"]
+        "input": ["文本1", "文本2"],
+        "encoding_format": "base64"
     }
+    
+    encoding_format 为 base64 时每条向量是小端 float32 字节的 base64 字符串
+    （与 OpenAI 约定一致），base64_float16 为小端 float16，默认 float 返回JSON数组
     """
     if model is None:
         raise HTTPException(status_code=503, detail="模型未加载")
+    if request.encoding_format not in ENCODING_DTYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的 encoding_format: {request.encoding_format}，可选: {', '.join(ENCODING_DTYPES)}"
+        )
     
     try:
         logger.info(f"收到请求: {len(request.input)} 个文本")
         
-        # 生成 embeddings
-        embeddings = model.encode(
-            request.input,
-            normalize_embeddings=True,  # L2 归一化
-            show_progress_bar=False,
-            batch_size=32  # 批处理大小
-        )
+        # 生成 embeddings（缓存未命中的文本与并发请求合批编码）
+        embeddings = await encode_with_cache(request.input)
         
         # 格式化响应
         data = [
             {
                 "object": "embedding",
-                "embedding": embedding.tolist(),
+                "embedding": encode_embedding(embedding, request.encoding_format),
                 "index": i
             }
             for i, embedding in enumerate(embeddings)
@@ -113,7 +956,21 @@ async def health():
         "status": "healthy" if model is not None else "unhealthy",
         "model": "bge-large-zh-v1.5",
         "device": str(model.device) if model else "unknown",
-        "embedding_dim": 1024
+        "runtime": RUNTIME,
+        "embedding_dim": 1024,
+        "queue_depth": batcher.metrics()["queue_depth"],
+        "replicas": len(pool.replicas)
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """合批、副本和缓存指标"""
+    return {
+        "batching": batcher.metrics(),
+        "replicas": pool.metrics(),
+        "cache": vector_cache.metrics(),
+        "padding": padding_stats.metrics(),
+        "local_transport": local_transport.metrics() if local_transport is not None else None
     }
 
 @app.get("/")
@@ -125,7 +982,8 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "embeddings": "/v1/embeddings",
-            "health": "/health"
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
@@ -136,11 +994,53 @@ if __name__ == "__main__":
     parser.add_argument("--host", default="0.0.0.0", help="监听地址")
     parser.add_argument("--port", type=int, default=8001, help="监听端口")
     parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE, help="动态合批的最大文本数")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="动态合批的最长等待时间（毫秒）")
+    parser.add_argument("--device", default=DEVICE, help="运行设备 (cuda/cpu)")
+    parser.add_argument("--replicas", type=int, default=REPLICAS, help="模型副本数（CPU 模式下按核平均分配）")
+    parser.add_argument("--threads-per-replica", type=int, default=THREADS_PER_REPLICA,
+                        help="每个副本的 torch 线程数（0=分配到的核数）")
+    parser.add_argument("--runtime", choices=RUNTIMES, default=RUNTIME,
+                        help="推理运行时：torch / onnx / onnx-int8（ONNX 仅 CPU，int8 为动态量化）")
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE, help="单次前向的最大文本数")
+    parser.add_argument("--max-batch-tokens", type=int, default=MAX_BATCH_TOKENS,
+                        help="单次前向的 token 上限（最长文本长度 × 条数）")
+    parser.add_argument("--pass-overhead-tokens", type=int, default=PASS_OVERHEAD_TOKENS,
+                        help="分桶时每多一次前向折合的 token 数（GPU 上可调大）")
+    parser.add_argument("--no-length-buckets", action="store_true", help="关闭按 token 长度分桶")
+    parser.add_argument("--unix-socket", default=UNIX_SOCKET,
+                        help="同时监听的 Unix 套接字路径（本机共享内存传输，仅支持单 worker）")
+    parser.add_argument("--shm-size-mb", type=int, default=SHM_SIZE_MB, help="共享内存缓冲区大小（MB）")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="内存向量缓存条数（0=关闭）")
+    parser.add_argument("--cache-path", default=CACHE_PATH, help="磁盘向量缓存 SQLite 文件（为空则只用内存）")
     args = parser.parse_args()
+    if args.unix_socket and args.workers > 1:
+        parser.error("--unix-socket 只支持单个 worker，可用 --replicas 在进程内并行")
+    
+    # uvicorn 以模块路径加载 app，通过环境变量把参数传给各 worker
+    os.environ["BGE_MAX_BATCH_SIZE"] = str(args.max_batch_size)
+    os.environ["BGE_MAX_WAIT_MS"] = str(args.max_wait_ms)
+    os.environ["BGE_DEVICE"] = args.device
+    os.environ["BGE_REPLICAS"] = str(args.replicas)
+    os.environ["BGE_THREADS_PER_REPLICA"] = str(args.threads_per_replica)
+    os.environ["BGE_RUNTIME"] = args.runtime
+    os.environ["BGE_ENCODE_BATCH_SIZE"] = str(args.encode_batch_size)
+    os.environ["BGE_MAX_BATCH_TOKENS"] = str(args.max_batch_tokens)
+    os.environ["BGE_PASS_OVERHEAD_TOKENS"] = str(args.pass_overhead_tokens)
+    os.environ["BGE_LENGTH_BUCKETS"] = "false" if args.no_length_buckets or not LENGTH_BUCKETS else "true"
+    os.environ["BGE_UNIX_SOCKET"] = args.unix_socket
+    os.environ["BGE_SHM_SIZE_MB"] = str(args.shm_size_mb)
+    os.environ["BGE_CACHE_SIZE"] = str(args.cache_size)
+    os.environ["BGE_CACHE_PATH"] = args.cache_path
     
     logger.info(f"🚀 启动 BGE Embedding 服务")
     logger.info(f"   监听地址: {args.host}:{args.port}")
     logger.info(f"   工作进程: {args.workers}")
+    logger.info(f"   动态合批: {args.max_batch_size} 条 / {args.max_wait_ms} ms")
+    logger.info(f"   模型副本: {args.replicas} ({args.runtime if args.runtime != 'torch' else args.device})")
+    if args.unix_socket:
+        logger.info(f"   本机传输: unix://{args.unix_socket}")
+    logger.info(f"   向量缓存: 内存 {args.cache_size} 条, 磁盘 {args.cache_path or '关闭'}")
     
     uvicorn.run(
         "bge_server:app",
@@ -6,10 +6,10 @@
 import json
 import os
 import re
+import sys
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-import requests
 import chromadb
 from chromadb.config import Settings
 import time
@@ -22,6 +22,10 @@ except ImportError:
     print("❌ PyMuPDF 未安装，请运行: conda install -n agent pymupdf")
     exit(1)
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "code"))
+from backend.services.embedding_client import EmbeddingClient, EmbeddingError
+from backend.repositories.vector_index import export_snapshot
+
 # ==================== 配置 ====================
 PAPERS_DIR = Path("/Users/zhuyinghua/Desktop/agent/main/papers")
 JSON_DIR = Path("/Users/zhuyinghua/Desktop/agent/main/json")
@@ -131,45 +135,26 @@ def extract_doi_from_text(text: str) -> str:
 
 
 # ==================== Embedding 生成 ====================
-def generate_embedding(text: str, retry_count=5) -> list:
-    """调用 BGE API 生成 embedding (带重试)"""
-    
-    for attempt in range(retry_count):
-        try:
-            # 添加延迟避免限流
-            time.sleep(API_DELAY)
-            
-            response = requests.post(
-                BGE_API_URL,
-                json={
-                    "input": [text]
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json()["data"][0]["embedding"]
-            elif response.status_code == 429:
-                # 遇到限流,指数退避
-                wait_time = (2 ** attempt) * 5  # 5, 10, 20, 40, 80 秒
-                print(f"  ⚠️ API 限流 (429), {wait_time}秒后重试 (第{attempt+1}/{retry_count}次)")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"  ⚠️ Embedding 失败: {response.status_code}")
-                if attempt < retry_count - 1:
-                    time.sleep(3)
-                    continue
-                return None
-                
-        except Exception as e:
-            print(f"  ⚠️ Embedding 错误: {e}")
-            if attempt < retry_count - 1:
-                time.sleep(3)
-                continue
-            return None
+# 限流(429)和服务端错误按 5, 10, 20, 40 秒指数退避，最多重试 4 次
+embedding_client = EmbeddingClient(
+    api_url=BGE_API_URL,
+    timeout=30,
+    max_retries=4,
+    backoff_base=5.0,
+    max_backoff=80.0
+)
+
+
+def generate_embedding(text: str):
+    """调用 BGE API 生成 embedding (带重试，base64 传输并解码为 float32 数组)"""
+    # 添加延迟避免限流
+    time.sleep(API_DELAY)
     
-    return None
+    try:
+        return embedding_client.embed_batch([text])[0]
+    except EmbeddingError as e:
+        print(f"  ⚠️ Embedding 失败: {e}")
+        return None
 
 
 # ==================== 处理单个 PDF ====================
@@ -211,13 +196,13 @@ def process_single_pdf(pdf_path: Path) -> dict:
     
     # 生成 embedding
     embedding = generate_embedding(summary)
-    if not embedding:
+    if embedding is None:
         return {"status": "error", "pdf": pdf_path.name, "error": "Embedding生成失败"}
     
     # 保存 JSON
     data = {
         "text": summary,
-        "embedding": embedding,
+        "embedding": embedding.tolist(),
         "metadata": {
             "source_file": pdf_path.name,
             "doi": doi
@@ -384,6 +369,9 @@ def main():
     print(f"   最终文档数: {final_count}")
     print(f"   数据库路径: {VECTOR_DB_PATH}")
     
+    # 导出 mmap 快照（后端各 worker 共享加载）
+    export_snapshot(collection, os.path.join(VECTOR_DB_PATH, "snapshots", "lfp_papers"))
+    
     # ChromaDB PersistentClient 不需要手动关闭
     
     print("\n" + "=" * 80)
@@ -11,9 +11,9 @@ V2.0 向量数据库构建脚本
 """
 import os
 import re
+import sys
 import json
 import time
-import requests
 import fitz  # PyMuPDF
 import chromadb
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -21,6 +21,10 @@ from tqdm import tqdm
 from uuid import uuid4
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "code"))
+from backend.services.embedding_client import EmbeddingClient, EmbeddingError
+from backend.repositories.vector_index import export_snapshot
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -45,25 +49,23 @@ CHUNK_OVERLAP = 100
 # 批处理大小
 BATCH_SIZE = 32
 
+# Embedding 客户端（连接复用 + 重试退避）
+embedding_client = EmbeddingClient(api_url=BGE_API_URL, timeout=120, batch_size=BATCH_SIZE)
+
 
-def get_embeddings(texts: list) -> list:
-    """调用 BGE 服务获取向量"""
+def get_embeddings(texts: list):
+    """
+    调用 BGE 服务获取向量（base64 传输，直接解码为 float32 矩阵），
+    重试耗尽后返回 None（该批次跳过，不写入零向量）
+    """
     if not texts:
         return []
     
     try:
-        response = requests.post(
-            BGE_API_URL,
-            json={"input": texts},
-            timeout=120
-        )
-        response.raise_for_status()
-        data = response.json()["data"]
-        return [item["embedding"] for item in data]
-    except Exception as e:
+        return embedding_client.embed_batch(texts)
+    except EmbeddingError as e:
         logger.error(f"Embedding API 错误: {e}")
-        # 错误时返回零向量，避免程序崩溃
-        return [[0.0] * 1024 for _ in texts]
+        return None
 
 
 def clean_text(text: str) -> str:
@@ -189,6 +191,7 @@ def main():
     total_chunks = 0
     total_pdfs = 0
     failed_pdfs = []
+    skipped_chunks = 0
     
     for filename in tqdm(pdf_files, desc="处理 PDF"):
         filepath = os.path.join(PDF_DIR, filename)
@@ -221,12 +224,15 @@ def main():
             embeddings = get_embeddings(batch_documents)
             
             # 写入数据库
-            collection.add(
-                embeddings=embeddings,
-                documents=batch_documents,
-                metadatas=batch_metadatas,
-                ids=batch_ids
-            )
+            if embeddings is None:
+                skipped_chunks += len(batch_documents)
+            else:
+                collection.add(
+                    embeddings=embeddings.tolist(),
+                    documents=batch_documents,
+                    metadatas=batch_metadatas,
+                    ids=batch_ids
+                )
             
             # 清空缓冲区
             batch_documents = []
@@ -237,12 +243,15 @@ def main():
     if batch_documents:
         logger.info(f"   处理最后批次: {len(batch_documents)} 个切片")
         embeddings = get_embeddings(batch_documents)
-        collection.add(
-            embeddings=embeddings,
-            documents=batch_documents,
-            metadatas=batch_metadatas,
-            ids=batch_ids
-        )
+        if embeddings is None:
+            skipped_chunks += len(batch_documents)
+        else:
+            collection.add(
+                embeddings=embeddings.tolist(),
+                documents=batch_documents,
+                metadatas=batch_metadatas,
+                ids=batch_ids
+            )
     
     # 6. 统计信息
     final_count = collection.count()
@@ -252,10 +261,14 @@ def main():
     logger.info(f"   处理 PDF: {total_pdfs}/{len(pdf_files)}")
     logger.info(f"   生成切片: {total_chunks}")
     logger.info(f"   数据库总量: {final_count}")
+    logger.info(f"   向量失败跳过切片: {skipped_chunks}")
     logger.info(f"   失败文件: {len(failed_pdfs)}")
     if failed_pdfs:
         logger.info(f"   失败列表: {failed_pdfs[:10]}...")
     logger.info("=" * 60)
+    
+    # 7. 导出 mmap 快照（后端各 worker 共享加载）
+    export_snapshot(collection, os.path.join(CHROMA_DB_PATH, "snapshots", COLLECTION_NAME))
 
 
 if __name__ == "__main__":
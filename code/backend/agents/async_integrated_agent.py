@@ -0,0 +1,459 @@
+"""
+异步集成智能Agent - Async Integrated Agent
+基于 asyncio 的执行路径：LLM 使用 ainvoke/astream，
+BGE 通过共享的合批Embedding客户端调用，ChromaDB/Neo4j 调用放入线程池执行
+"""
+import asyncio
+import logging
+import queue
+import threading
+from typing import Dict, Any, Optional, AsyncGenerator, AsyncIterator, Iterator
+
+from backend.config.settings import settings
+from backend.agents.integrated_agent import IntegratedAgent, _speculation_slots
+from backend.models.entities import RetrievalContext
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncIntegratedAgent(IntegratedAgent):
+    """
+    异步集成Agent
+    
+    与 IntegratedAgent 共享专家系统和事件格式，
+    每个进行中的问题不再独占一个线程，可在单进程内并发处理大量SSE流
+    """
+    
+    async def _aget_expert(self, expert_name: str):
+        """在线程池中完成专家的懒加载（初始化会连接数据库，并发的首次调用由懒加载属性加锁只创建一次）"""
+        return await asyncio.to_thread(getattr, self, expert_name)
+    
+    async def aquery(
+        self,
+        user_question: str,
+        auto_route: bool = True,
+        speculative: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """
+        处理用户查询（异步，带自动路由）
+        
+        Args:
+            user_question: 用户问题
+            auto_route: 是否自动路由
+            speculative: 是否推测式并行执行路由和检索，默认读取配置
+        
+        Returns:
+            查询结果字典
+        """
+        logger.info(f"\n{'='*80}\n🔍 处理用户查询(异步): {user_question}\n{'='*80}")
+        
+        if not auto_route:
+            return {
+                "mode": "manual",
+                "message": "请手动选择专家系统",
+                "user_question": user_question
+            }
+        
+        if speculative is None:
+            speculative = settings.speculative_routing
+        
+        speculation: Dict[str, asyncio.Task] = {}
+        try:
+            # 0. 推测执行：与路由LLM调用并发启动
+            if speculative:
+                speculation = self._astart_speculation(user_question)
+            
+            # 1. 路由决策（联合规划时同时得到检索关键词和Cypher）
+            if settings.joint_planning and not speculative:
+                routing_result = await self._router.aplan(user_question)
+            else:
+                routing_result = await self._router.aroute(user_question)
+            
+            if not routing_result.get("success", True):
+                logger.warning(f"⚠️ 路由失败，使用降级策略")
+            
+            expert_name = routing_result.get("primary_expert", "literature")
+            logger.info(f"📍 路由决策: {expert_name} "
+                        f"(置信度: {routing_result.get('confidence', 0.0):.2f})")
+            
+            if expert_name not in ("neo4j", "literature", "community"):
+                logger.warning(f"未知的专家系统: {expert_name}，使用文献专家")
+                expert_name = "literature"
+            
+            # 未被选中的推测分支直接取消
+            prefetched = await self._acollect_speculation(speculation, expert_name)
+            if prefetched is None:
+                prefetched = self._plan_prefetch(user_question, routing_result, expert_name)
+            
+            # 2. 调用对应的专家系统
+            if expert_name == "neo4j":
+                result = await self._aquery_neo4j(user_question, cypher=prefetched)
+            elif expert_name == "community":
+                result = await self._aquery_community(user_question)
+            else:
+                result = await self._aquery_literature(user_question, context=prefetched)
+            
+            # 3. 添加路由信息到结果中
+            result["routing_info"] = routing_result
+            result["expert_used"] = expert_name
+            if speculative:
+                result["speculation"] = {
+                    "branches": list(speculation.keys()),
+                    "used": prefetched is not None
+                }
+            
+            return result
+        
+        except Exception as e:
+            logger.error(f"❌ 查询执行失败: {e}", exc_info=True)
+            for task in speculation.values():
+                task.cancel()
+            return {
+                "success": False,
+                "error": str(e),
+                "expert_used": "unknown",
+                "user_question": user_question
+            }
+    
+    def _astart_speculation(self, question: str) -> Dict[str, asyncio.Task]:
+        """启动推测任务，受单请求LLM调用上限和进程内并发上限约束"""
+        tasks: Dict[str, asyncio.Task] = {}
+        for branch in self._speculation_plan(question):
+            if not _speculation_slots().acquire(blocking=False):
+                logger.info("⏭️ 推测并发已满，跳过剩余推测分支")
+                break
+            task = asyncio.create_task(self._arun_speculative_branch(branch, question))
+            task.add_done_callback(lambda _: _speculation_slots().release())
+            tasks[branch] = task
+        return tasks
+    
+    async def _arun_speculative_branch(self, branch: str, question: str) -> Any:
+        """执行单个推测分支（异步）"""
+        if branch == "literature":
+            semantic_expert = await self._aget_expert("semantic_expert")
+            context = RetrievalContext(question=question, top_k=20)
+            await semantic_expert.aprepare_context(context)
+            await semantic_expert.aembed_context(context)
+            return context
+        if branch == "neo4j":
+            query_expert = await self._aget_expert("query_expert")
+            if not query_expert.can_handle(question):
+                return None
+            return await query_expert.agenerate_cypher(question)
+        return None
+    
+    async def _acollect_speculation(
+        self,
+        speculation: Dict[str, asyncio.Task],
+        expert_name: str
+    ) -> Any:
+        """等待被选中分支的结果，取消其余分支（失败时的处理同 _collect_speculation）"""
+        selected = speculation.get(expert_name)
+        for branch, task in speculation.items():
+            if task is not selected and task.cancel():
+                logger.info(f"🗑️ 取消推测分支: {branch}")
+        if selected is None:
+            return None
+        try:
+            return self._usable_speculation(await selected)
+        except Exception as e:
+            logger.warning(f"⚠️ 推测分支执行失败，改为同步执行: {e}")
+            return None
+    
+    async def aquery_stream(self, user_question: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式处理用户查询（异步），事件格式与 query_stream 一致
+        
+        Args:
+            user_question: 用户问题
+        
+        Yields:
+            查询结果块
+        """
+        try:
+            yield {"type": "start", "question": user_question}
+            
+            semantic_expert = await self._aget_expert("semantic_expert")
+            
+            # 步骤1: 生成搜索关键词
+            yield self._step_event("generate_keywords", "📝 正在生成搜索关键词...", "processing")
+            try:
+                context = await semantic_expert.aprepare_context(
+                    RetrievalContext(question=user_question, top_k=20)
+                )
+                yield self._step_event(
+                    "generate_keywords",
+                    f"✅ 搜索关键词: {context.search_query}",
+                    "success",
+                    data={"keywords": context.search_query}
+                )
+            except Exception as e:
+                yield self._step_event(
+                    "generate_keywords", "⚠️ 关键词生成失败,使用原始问题", "warning", error=str(e)
+                )
+                context = RetrievalContext(
+                    question=user_question,
+                    search_query=user_question,
+                    top_k=20
+                )
+            
+            # 步骤2: 生成查询向量
+            yield self._step_event("generate_embedding", "🔢 正在调用BGE API生成查询向量...", "processing")
+            if await semantic_expert.aembed_context(context):
+                yield self._step_event("generate_embedding", "✅ 查询向量生成成功", "success")
+                
+                # 步骤3: 查询向量数据库
+                yield self._step_event("query_vector_db", "🔍 正在查询向量数据库...", "processing")
+                try:
+                    await semantic_expert.asearch_context(context, with_scores=True)
+                except Exception as e:
+                    logger.error(f"语义搜索失败: {e}")
+                    context.error = str(e)
+                    context.error_step = "search"
+            
+            if not context.success:
+                for event in self._retrieval_error_events(context):
+                    yield event
+                return
+            
+            doc_count = len(context.documents)
+            yield self._step_event(
+                "query_vector_db", f"✅ 找到 {doc_count} 条相关文献", "success", data={"count": doc_count}
+            )
+            
+            if doc_count == 0:
+                yield self._step_event("no_results", "❌ 未找到相关文献", "warning")
+                yield {
+                    "type": "content",
+                    "content": "抱歉,没有找到与您问题相关的文献。请尝试使用不同的关键词。"
+                }
+                yield {"type": "done", "references": [], "metadata": {}}
+                return
+            
+            # 步骤4: 构建Prompt（精确问题先加载PDF原文）
+            yield self._step_event("build_prompt", "🛠️ 正在构建提示词...", "processing")
+            pdf_info = await semantic_expert.aload_context_pdfs(context, load_pdf=True)
+            is_broad = pdf_info.get('is_broad_question', False)
+            for event in self._pdf_info_events(pdf_info):
+                yield event
+            yield self._step_event("build_prompt", "✅ 提示词构建完成", "success")
+            
+            references = self._build_references(context)
+            metadata = self._retrieval_metadata(context, pdf_info)
+            yield {
+                "type": "metadata",
+                "expert": "literature",
+                "references": references,
+                "retrieval": metadata
+            }
+            
+            # 步骤5: 逐token转发LLM输出
+            yield self._step_event("call_llm", "🤖 正在调用LLM生成综合答案...", "processing")
+            answer_parts = []
+            try:
+                async for token in semantic_expert.astream_answer(context, is_broad=is_broad):
+                    answer_parts.append(token)
+                    yield {"type": "content", "content": token}
+            except Exception as e:
+                logger.error(f"答案生成失败: {e}", exc_info=True)
+                yield self._step_event("call_llm", f"❌ 答案生成异常: {str(e)}", "error", error=str(e))
+                yield {
+                    "type": "error",
+                    "error": "答案生成过程中发生异常",
+                    "details": str(e)
+                }
+                yield {"type": "done", "references": references, "metadata": metadata}
+                return
+            
+            answer = "".join(answer_parts)
+            if not answer.strip():
+                yield {
+                    "type": "content",
+                    "content": "抱歉,虽然找到了相关文献,但未能生成完整的答案。请尝试重新提问或换个角度描述您的问题。"
+                }
+            
+            yield self._step_event("call_llm", "✅ LLM响应成功", "success")
+            
+            done = {
+                "type": "done",
+                "references": references,
+                "metadata": metadata
+            }
+            if answer.strip():
+                # DOI插入为CPU密集的文本比对，放入线程池
+                final_answer = await asyncio.to_thread(
+                    semantic_expert.finalize_answer, answer, context, is_broad
+                )
+                if final_answer != answer:
+                    done["final_answer"] = final_answer
+            yield done
+        
+        except Exception as e:
+            logger.error(f"❌ 流式查询失败: {e}", exc_info=True)
+            yield {"type": "error", "error": str(e)}
+            yield {"type": "done", "references": [], "metadata": {}}
+    
+    async def _aquery_neo4j(self, question: str, cypher: Optional[str] = None) -> Dict[str, Any]:
+        """使用Neo4j知识图谱查询（异步）"""
+        try:
+            query_expert = await self._aget_expert("query_expert")
+            result = await query_expert.aexecute_query(question, cypher=cypher)
+            result["expert_used"] = "neo4j"
+            return result
+        except Exception as e:
+            logger.error(f"Neo4j查询失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "expert_used": "neo4j"
+            }
+    
+    async def _aquery_literature(
+        self,
+        question: str,
+        n_results: int = 10,
+        context: Optional[RetrievalContext] = None
+    ) -> Dict[str, Any]:
+        """使用文献语义搜索（异步）"""
+        try:
+            semantic_expert = await self._aget_expert("semantic_expert")
+            if context is None or not context.searched:
+                context = await semantic_expert.aretrieve(
+                    question, top_k=20, with_scores=True, context=context
+                )
+            query_result = await semantic_expert.aquery_with_details(
+                question, load_pdf=True, context=context
+            )
+            return {
+                "success": True,
+                "answer": query_result.get('answer', ''),
+                "references": self._build_references(context, n_results),
+                "expert_used": "literature",
+                "pdf_info": query_result.get('pdf_info', {})
+            }
+        except Exception as e:
+            logger.error(f"文献搜索失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "expert_used": "literature"
+            }
+    
+    async def _aquery_community(self, question: str, n_results: int = 5) -> Dict[str, Any]:
+        """使用社区摘要分析（异步）"""
+        try:
+            community_expert = await self._aget_expert("community_expert")
+            result = await community_expert.aanalyze(question, top_k=n_results)
+            result["expert_used"] = "community"
+            return result
+        except Exception as e:
+            logger.error(f"社区分析失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "expert_used": "community"
+            }
+    
+    async def aquery_with_expert(
+        self,
+        user_question: str,
+        expert_name: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        使用指定的专家系统查询（异步，不经过路由）
+        
+        Args:
+            user_question: 用户问题
+            expert_name: 专家系统名称 (neo4j/literature/community)
+            **kwargs: 额外参数
+        
+        Returns:
+            查询结果
+        """
+        if expert_name == "neo4j":
+            return await self._aquery_neo4j(user_question)
+        elif expert_name == "literature":
+            return await self._aquery_literature(user_question, kwargs.get("n_results", 10))
+        elif expert_name == "community":
+            return await self._aquery_community(user_question, kwargs.get("n_results", 5))
+        return {
+            "success": False,
+            "error": f"未知的专家系统: {expert_name}",
+            "user_question": user_question
+        }
+
+
+# 全局单例
+_async_integrated_agent: Optional[AsyncIntegratedAgent] = None
+_async_integrated_agent_lock = threading.Lock()
+
+
+def get_async_integrated_agent() -> AsyncIntegratedAgent:
+    """获取全局异步集成Agent实例"""
+    global _async_integrated_agent
+    with _async_integrated_agent_lock:
+        if _async_integrated_agent is None:
+            _async_integrated_agent = AsyncIntegratedAgent()
+    return _async_integrated_agent
+
+
+# 后台事件循环（线程式服务器如 Flask 中，同一进程的全部异步问题在这个循环内并发执行）
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+_STREAM_DONE = object()
+
+
+class _StreamError:
+    """在线程间传递异步生成器抛出的异常"""
+    
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取（首次调用时启动）运行在守护线程中的事件循环"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-agent-loop", daemon=True).start()
+            _background_loop = loop
+    return _background_loop
+
+
+def stream_in_background(stream: AsyncIterator[Any]) -> Iterator[Any]:
+    """
+    在后台事件循环中运行异步生成器，在调用线程中同步迭代其结果
+    
+    供 Flask 的同步SSE响应使用：请求线程只负责转发事件，检索、LLM流式输出等
+    在共享的事件循环中并发执行。调用方停止迭代（如客户端断开）时取消对应任务
+    
+    Args:
+        stream: 异步生成器（如 AsyncIntegratedAgent.aquery_stream(...)）
+    
+    Returns:
+        同步迭代器，逐个产出异步生成器的结果；异步生成器抛出的异常在调用线程中重新抛出
+    """
+    items: "queue.Queue[Any]" = queue.Queue()
+    
+    async def pump():
+        try:
+            async for item in stream:
+                items.put(item)
+        except Exception as e:
+            items.put(_StreamError(e))
+        finally:
+            items.put(_STREAM_DONE)
+    
+    future = asyncio.run_coroutine_threadsafe(pump(), get_background_loop())
+    try:
+        while True:
+            item = items.get()
+            if item is _STREAM_DONE:
+                return
+            if isinstance(item, _StreamError):
+                raise item.error
+            yield item
+    finally:
+        future.cancel()
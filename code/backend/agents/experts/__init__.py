@@ -4,8 +4,9 @@
 """
 
 from .router_expert import RouterExpert
+from .local_router import LocalRouter
 from .query_expert import QueryExpert
 from .semantic_expert import SemanticExpert
 from .community_expert import CommunityExpert
 
-__all__ = ['RouterExpert', 'QueryExpert', 'SemanticExpert', 'CommunityExpert']
+__all__ = ['RouterExpert', 'LocalRouter', 'QueryExpert', 'SemanticExpert', 'CommunityExpert']
@@ -3,6 +3,7 @@
 功能：基于社区摘要向量数据库进行技术分析和关系洞察
 """
 from typing import Dict, List, Any, Optional
+import asyncio
 import logging
 
 from backend.services.llm_service import LLMService
@@ -103,6 +104,23 @@ class CommunityExpert:
                 "distances": []
             }
     
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 5
+    ) -> Dict[str, Any]:
+        """
+        搜索社区摘要（异步，ChromaDB查询在线程池中执行）
+        
+        Args:
+            query: 搜索查询
+            top_k: 返回数量
+            
+        Returns:
+            搜索结果
+        """
+        return await asyncio.to_thread(self.search, query, top_k)
+    
     def analyze(
         self,
         query: str,
@@ -127,24 +145,71 @@ class CommunityExpert:
         # 2. 使用 LLM 合成答案（如果有 LLM 服务）
         if self._llm and search_results.get("documents"):
             try:
-                # 格式化社区摘要
-                formatted_summaries = []
-                for i, (doc, metadata) in enumerate(zip(
-                    search_results["documents"],
-                    search_results["metadatas"]
-                ), 1):
-                    summary_text = f"""
+                messages = self._build_analysis_messages(query, search_results)
+                search_results["final_answer"] = self._llm.invoke(messages, profile="synthesis").content
+                
+            except Exception as e:
+                logger.error(f"LLM 合成答案失败: {e}")
+                search_results["llm_error"] = str(e)
+        
+        return search_results
+    
+    async def aanalyze(
+        self,
+        query: str,
+        top_k: int = 5
+    ) -> Dict[str, Any]:
+        """
+        综合分析（异步）
+        
+        Args:
+            query: 分析查询
+            top_k: 检索数量
+            
+        Returns:
+            分析结果
+        """
+        search_results = await self.asearch(query, top_k)
+        
+        if not search_results.get("success"):
+            return search_results
+        
+        if self._llm and search_results.get("documents"):
+            try:
+                messages = self._build_analysis_messages(query, search_results)
+                response = await self._llm.ainvoke(messages, profile="synthesis")
+                search_results["final_answer"] = response.content
+                
+            except Exception as e:
+                logger.error(f"LLM 合成答案失败: {e}")
+                search_results["llm_error"] = str(e)
+        
+        return search_results
+    
+    def _build_analysis_messages(
+        self,
+        query: str,
+        search_results: Dict[str, Any]
+    ) -> List[Any]:
+        """构建社区分析的LLM消息列表"""
+        # 格式化社区摘要
+        formatted_summaries = []
+        for i, (doc, metadata) in enumerate(zip(
+            search_results["documents"],
+            search_results["metadatas"]
+        ), 1):
+            summary_text = f"""
 社区摘要 {i}:
   - 级别: {metadata.get('level', 'Unknown')}
   - 实体数: {len(metadata.get('entities', []))}
   - 内容: {doc}
 """
-                    formatted_summaries.append(summary_text)
-                
-                summaries_text = "\n".join(formatted_summaries)
-                
-                # 构建提示词
-                prompt = f"""基于以下社区摘要，回答用户的问题。
+            formatted_summaries.append(summary_text)
+        
+        summaries_text = "\n".join(formatted_summaries)
+        
+        # 构建提示词
+        prompt = f"""基于以下社区摘要，回答用户的问题。
 
 【用户问题】
 {query}
@@ -153,19 +218,9 @@ class CommunityExpert:
 {summaries_text}
 
 请提供深入的技术分析和洞察。"""
-                
-                from langchain_core.messages import HumanMessage, SystemMessage
-                messages = [
-                    SystemMessage(content="你是一个材料科学技术分析专家，擅长从社区级别的知识中提取洞察。"),
-                    HumanMessage(content=prompt)
-                ]
-                
-                answer = self._llm.invoke(messages).content
-                
-                search_results["final_answer"] = answer
-                
-            except Exception as e:
-                logger.error(f"LLM 合成答案失败: {e}")
-                search_results["llm_error"] = str(e)
         
-        return search_results
+        from langchain_core.messages import HumanMessage, SystemMessage
+        return [
+            SystemMessage(content="你是一个材料科学技术分析专家，擅长从社区级别的知识中提取洞察。"),
+            HumanMessage(content=prompt)
+        ]
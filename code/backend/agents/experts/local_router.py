@@ -0,0 +1,226 @@
+"""
+本地路由分类器 - Local Router
+功能：基于BGE向量的最近质心分类，置信度足够时跳过路由LLM调用
+"""
+from typing import Dict, List, Any, Optional, Tuple, Callable
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def bge_embed(texts: List[str]) -> List[List[float]]:
+    """调用BGE服务批量生成向量"""
+    from backend.services.embedding_client import get_embedding_client
+
+    return get_embedding_client().embed_batch(texts)
+
+
+def load_routing_log(path: str, limit: int = 2000) -> List[Tuple[str, str]]:
+    """
+    读取路由决策日志（JSONL，每行包含 question 和 expert）
+
+    Args:
+        path: 日志文件路径
+        limit: 最多读取的最新记录数
+
+    Returns:
+        (问题, 专家) 列表
+    """
+    if not path or not os.path.exists(path):
+        return []
+
+    samples = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                question = record.get("question")
+                expert = record.get("expert")
+                if question and expert in LocalRouter.EXPERT_NAMES:
+                    samples.append((question, expert))
+    except Exception as e:
+        logger.error(f"读取路由日志失败: {e}")
+        return []
+
+    return samples[-limit:]
+
+
+class LocalRouter:
+    """
+    本地路由分类器
+
+    将每个专家的示例问题（RouterExpert.EXPERTS 中的 examples 加上路由日志）
+    编码为归一化向量并求质心，新问题按与各质心的余弦相似度分类。
+    置信度为相似度的 softmax 概率，低于阈值时交由LLM路由
+    """
+
+    EXPERT_NAMES = ("neo4j", "literature", "community")
+
+    def __init__(
+        self,
+        embed_fn: Optional[EmbedFn] = None,
+        threshold: float = 0.75,
+        temperature: float = 0.05
+    ):
+        """
+        初始化本地路由分类器
+
+        Args:
+            embed_fn: 批量文本向量化函数，默认调用BGE服务
+            threshold: 置信度阈值，达到时直接采用本地结果
+            temperature: softmax 温度，越小置信度越"尖锐"
+        """
+        self._embed_fn = embed_fn or bge_embed
+        self.threshold = threshold
+        self.temperature = temperature
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._sample_counts: Dict[str, int] = {}
+
+    @property
+    def ready(self) -> bool:
+        """是否已完成训练"""
+        return self._centroids is not None
+
+    @property
+    def sample_counts(self) -> Dict[str, int]:
+        """各专家参与训练的样本数"""
+        return dict(self._sample_counts)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """向量化并L2归一化"""
+        vectors = np.asarray(self._embed_fn(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def fit(self, samples: List[Tuple[str, str]]) -> bool:
+        """
+        用带标签的问题训练质心
+
+        Args:
+            samples: (问题, 专家) 列表
+
+        Returns:
+            是否训练成功（至少两个专家有样本）
+        """
+        samples = [(q, e) for q, e in samples if q and e in self.EXPERT_NAMES]
+        labels = sorted({e for _, e in samples}, key=self.EXPERT_NAMES.index)
+        if len(labels) < 2:
+            logger.warning("本地路由训练样本不足（少于两个专家）")
+            return False
+
+        vectors = self._embed([q for q, _ in samples])
+        expert_of = np.array([e for _, e in samples])
+
+        centroids = []
+        for label in labels:
+            centroid = vectors[expert_of == label].mean(axis=0)
+            centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+
+        self._labels = labels
+        self._centroids = np.stack(centroids)
+        self._sample_counts = {label: int((expert_of == label).sum()) for label in labels}
+        logger.info(f"✅ 本地路由训练完成: {self._sample_counts}")
+        return True
+
+    def _score(self, vectors: np.ndarray) -> np.ndarray:
+        """计算各问题属于各专家的softmax概率"""
+        similarities = vectors @ self._centroids.T
+        logits = similarities / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, question: str) -> Dict[str, Any]:
+        """
+        预测问题所属专家
+
+        Args:
+            question: 用户问题
+
+        Returns:
+            包含 primary_expert, confidence, confident, scores 的字典
+        """
+        if not self.ready:
+            raise RuntimeError("本地路由尚未训练")
+
+        probs = self._score(self._embed([question]))[0]
+        return self._to_prediction(probs)
+
+    def _to_prediction(self, probs: np.ndarray) -> Dict[str, Any]:
+        """将概率向量转换为预测结果"""
+        best = int(np.argmax(probs))
+        confidence = float(probs[best])
+        return {
+            "primary_expert": self._labels[best],
+            "confidence": confidence,
+            "confident": confidence >= self.threshold,
+            "scores": {label: float(p) for label, p in zip(self._labels, probs)}
+        }
+
+    def evaluate(
+        self,
+        labelled: List[Tuple[str, str]],
+        llm_route_fn: Optional[Callable[[str], str]] = None
+    ) -> Dict[str, Any]:
+        """
+        在带标签问题集上评估路由准确率和LLM跳过率
+
+        Args:
+            labelled: (问题, 正确专家) 列表
+            llm_route_fn: 低置信度时使用的LLM路由函数，返回专家名；
+                为空时只统计本地分类结果
+
+        Returns:
+            评估报告
+        """
+        if not self.ready:
+            raise RuntimeError("本地路由尚未训练")
+        if not labelled:
+            return {"total": 0}
+
+        probs = self._score(self._embed([q for q, _ in labelled]))
+
+        skipped = 0
+        skipped_correct = 0
+        argmax_correct = 0
+        combined_correct = 0
+        deferred_with_llm = 0
+        for (question, label), row in zip(labelled, probs):
+            prediction = self._to_prediction(row)
+            local_correct = prediction["primary_expert"] == label
+            argmax_correct += local_correct
+
+            if prediction["confident"]:
+                skipped += 1
+                skipped_correct += local_correct
+                combined_correct += local_correct
+            elif llm_route_fn is not None:
+                deferred_with_llm += 1
+                combined_correct += llm_route_fn(question) == label
+
+        total = len(labelled)
+        report = {
+            "total": total,
+            "threshold": self.threshold,
+            "llm_skip_rate": skipped / total,
+            "local_accuracy_when_skipped": skipped_correct / skipped if skipped else None,
+            "local_argmax_accuracy": argmax_correct / total
+        }
+        if llm_route_fn is not None:
+            report["overall_accuracy"] = combined_correct / total
+            report["llm_calls"] = deferred_with_llm
+        return report
@@ -3,6 +3,7 @@
 功能：基于 Neo4j 知识图谱进行精确的结构化数据查询
 """
 from typing import Dict, List, Any, Optional, Tuple
+import asyncio
 import logging
 import os
 import json
@@ -14,6 +15,27 @@ from backend.utils.pdf_loader import PDFManager
 
 logger = logging.getLogger(__name__)
 
+# 知识图谱结构说明（Cypher生成和联合规划提示词共用）
+GRAPH_SCHEMA = """## Neo4j 知识图谱结构
+
+节点类型：
+- Material：材料节点，包含以下属性：
+  - material_name: 材料名称（包含DOI）
+  - tap_density: 振实密度
+  - compaction_density: 压实密度
+  - discharge_capacity: 放电容量
+  - coulombic_efficiency: 库伦效率
+  - synthesis_method: 合成方法
+  - preparation_method: 制备方法
+  - precursor: 前驱体
+  - carbon_source: 碳源
+  - carbon_content: 碳含量
+  - coating_material: 包覆材料
+  - particle_size: 粒径
+  - surface_area: 比表面积
+  - cycling_stability: 循环稳定性
+  - conductivity: 导电性"""
+
 
 class QueryExpert:
     """精确查询专家 - 处理需要精确数值比较的查询"""
@@ -66,25 +88,7 @@ class QueryExpert:
         """构建Cypher查询生成提示词"""
         return """你是一个Cypher查询生成专家。你的任务是将用户关于材料的问题转换为精确的Cypher查询。
 
-## Neo4j 知识图谱结构
-
-节点类型：
-- Material：材料节点，包含以下属性：
-  - material_name: 材料名称（包含DOI）
-  - tap_density: 振实密度
-  - compaction_density: 压实密度
-  - discharge_capacity: 放电容量
-  - coulombic_efficiency: 库伦效率
-  - synthesis_method: 合成方法
-  - preparation_method: 制备方法
-  - precursor: 前驱体
-  - carbon_source: 碳源
-  - carbon_content: 碳含量
-  - coating_material: 包覆材料
-  - particle_size: 粒径
-  - surface_area: 比表面积
-  - cycling_stability: 循环稳定性
-  - conductivity: 导电性
+""" + GRAPH_SCHEMA + """
 
 ## 查询规则
 
@@ -159,28 +163,55 @@ ORDER BY m.tap_density DESC
             return self._generate_simple_cypher(question)
         
         try:
-            from langchain_core.messages import HumanMessage, SystemMessage
-            
-            messages = [
-                SystemMessage(content=self._cypher_prompt),
-                HumanMessage(content=f"用户问题：{question}")
-            ]
+            response = self._llm.invoke(self._build_cypher_messages(question), profile="fast")
+            return self._parse_cypher(response.content)
             
-            response = self._llm.invoke(messages)
-            cypher = response.content.strip()
-            
-            # 提取代码块中的Cypher
-            if "```cypher" in cypher:
-                cypher = cypher.split("```cypher")[1].split("```")[0].strip()
-            elif "```" in cypher:
-                cypher = cypher.split("```")[1].split("```")[0].strip()
+        except Exception as e:
+            logger.error(f"生成Cypher失败: {e}")
+            return self._generate_simple_cypher(question)
+    
+    async def agenerate_cypher(self, question: str) -> str:
+        """
+        生成Cypher查询语句（异步）
+        
+        Args:
+            question: 用户问题
             
-            return cypher
+        Returns:
+            Cypher查询语句
+        """
+        if self._llm is None:
+            return self._generate_simple_cypher(question)
+        
+        try:
+            response = await self._llm.ainvoke(self._build_cypher_messages(question), profile="fast")
+            return self._parse_cypher(response.content)
             
         except Exception as e:
             logger.error(f"生成Cypher失败: {e}")
             return self._generate_simple_cypher(question)
     
+    def _build_cypher_messages(self, question: str) -> List[Any]:
+        """构建Cypher生成的消息列表"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        return [
+            SystemMessage(content=self._cypher_prompt),
+            HumanMessage(content=f"用户问题：{question}")
+        ]
+    
+    def _parse_cypher(self, content: str) -> str:
+        """从LLM响应中提取Cypher代码"""
+        cypher = content.strip()
+        
+        # 提取代码块中的Cypher
+        if "```cypher" in cypher:
+            cypher = cypher.split("```cypher")[1].split("```")[0].strip()
+        elif "```" in cypher:
+            cypher = cypher.split("```")[1].split("```")[0].strip()
+        
+        return cypher
+    
     def _generate_simple_cypher(self, question: str) -> str:
         """
         使用规则生成简单的Cypher查询
@@ -243,12 +274,13 @@ ORDER BY m.{property_name} DESC
         
         return cypher.strip()
     
-    def execute_query(self, question: str) -> Dict[str, Any]:
+    def execute_query(self, question: str, cypher: Optional[str] = None) -> Dict[str, Any]:
         """
         执行精确查询
         
         Args:
             question: 用户问题
+            cypher: 预先生成的Cypher（如推测执行的结果），为空时现场生成
             
         Returns:
             查询结果
@@ -262,33 +294,40 @@ ORDER BY m.{property_name} DESC
         
         try:
             # 生成Cypher查询
-            cypher = self.generate_cypher(question)
-            
             if not cypher:
-                return {
-                    "success": False,
-                    "error": "无法生成查询语句",
-                    "expert": "query"
-                }
+                cypher = self.generate_cypher(question)
+            return self._run_cypher(question, cypher)
             
-            logger.info(f"生成的Cypher查询: {cypher}")
-            
-            # 执行查询
-            results = self._neo4j.execute_cypher(cypher)
-            
-            # 格式化结果
-            materials = []
-            for record in results:
-                materials.append(dict(record))
+        except Exception as e:
+            logger.error(f"精确查询失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "expert": "query"
+            }
+    
+    async def aexecute_query(self, question: str, cypher: Optional[str] = None) -> Dict[str, Any]:
+        """
+        执行精确查询（异步，Neo4j查询在线程池中执行）
+        
+        Args:
+            question: 用户问题
+            cypher: 预先生成的Cypher，为空时现场生成
             
+        Returns:
+            查询结果
+        """
+        if not self.can_handle(question):
             return {
-                "success": True,
-                "expert": "query",
-                "cypher_query": cypher,
-                "result_count": len(materials),
-                "materials": materials[:100],  # 限制返回数量
-                "question": question
+                "success": False,
+                "error": "问题不适合精确查询",
+                "expert": "query"
             }
+        
+        try:
+            if not cypher:
+                cypher = await self.agenerate_cypher(question)
+            return await asyncio.to_thread(self._run_cypher, question, cypher)
             
         except Exception as e:
             logger.error(f"精确查询失败: {e}")
@@ -298,6 +337,34 @@ ORDER BY m.{property_name} DESC
                 "expert": "query"
             }
     
+    def _run_cypher(self, question: str, cypher: str) -> Dict[str, Any]:
+        """执行Cypher查询并格式化结果"""
+        if not cypher:
+            return {
+                "success": False,
+                "error": "无法生成查询语句",
+                "expert": "query"
+            }
+        
+        logger.info(f"生成的Cypher查询: {cypher}")
+        
+        # 执行查询
+        results = self._neo4j.execute_cypher(cypher)
+        
+        # 格式化结果
+        materials = []
+        for record in results:
+            materials.append(dict(record))
+        
+        return {
+            "success": True,
+            "expert": "query",
+            "cypher_query": cypher,
+            "result_count": len(materials),
+            "materials": materials[:100],  # 限制返回数量
+            "question": question
+        }
+    
     def query_by_property(
         self, 
         property_name: str, 
@@ -432,7 +499,7 @@ ORDER BY m.{property_name} DESC
             
             from langchain_core.messages import HumanMessage
             
-            response = self._llm.invoke([HumanMessage(content=prompt)])
+            response = self._llm.invoke([HumanMessage(content=prompt)], profile="synthesis")
             return response.content.strip()
             
         except Exception as e:
@@ -2,10 +2,17 @@
 智能路由专家 - Router Expert
 功能：分析用户问题，决定调用哪个数据库/专家系统
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import json
 import logging
+import os
+import threading
 
+from backend.config.settings import settings
 from backend.services.llm_service import LLMService
+from .local_router import LocalRouter, load_routing_log
+from .query_expert import GRAPH_SCHEMA
 
 logger = logging.getLogger(__name__)
 
@@ -69,17 +76,33 @@ class RouterExpert:
         }
     }
     
-    def __init__(self, llm_service: Optional[LLMService] = None):
+    def __init__(
+        self,
+        llm_service: Optional[LLMService] = None,
+        local_router: Optional[LocalRouter] = None,
+        log_decisions: bool = True
+    ):
         """
         初始化路由专家
         
         Args:
             llm_service: LLM服务实例
+            local_router: 本地路由分类器，为空且开启 LOCAL_ROUTER_ENABLED 时自动创建
+            log_decisions: 是否把LLM路由决策写入路由日志（评估时关闭，避免测试集混入训练样本）
         """
         logger.info("🧭 正在初始化智能路由专家...")
         
         self._llm = llm_service
         self._router_prompt = self._build_router_prompt()
+        self._plan_prompt = self._build_plan_prompt()
+        
+        if local_router is None and settings.local_router_enabled:
+            local_router = LocalRouter(threshold=settings.local_router_threshold)
+        self._local_router = local_router
+        self._local_router_failed = False
+        self._local_router_lock = threading.Lock()
+        self._log_decisions = log_decisions
+        self._routing_log_lock = threading.Lock()
         
         logger.info("✅ 智能路由专家初始化完成！\n")
     
@@ -197,81 +220,324 @@ class RouterExpert:
         
         return prompt
     
-    def route(self, user_question: str) -> Dict[str, Any]:
+    def _build_plan_prompt(self) -> str:
+        """构建联合规划提示词（路由决策 + 检索关键词 + Cypher）"""
+        
+        return self._router_prompt + """
+
+---
+
+## 联合规划：附加输出字段
+
+为减少LLM调用次数，同一个JSON中还必须包含以下字段，下游专家将直接使用：
+
+- "search_query": 文献语义检索关键词。提取材料名称、合成方法、改性策略、性能指标等核心概念，
+  用空格分隔，不超过50字（如"水热合成 磷酸铁锂"）。无论选择哪个专家都要给出
+- "cypher": 当 primary_expert 为 neo4j 时，给出可直接执行的Cypher查询（单行字符串，不要代码块标记）；
+  其他情况为空字符串
+
+""" + GRAPH_SCHEMA + """
+
+Cypher规则：
+- "大于X" → `WHERE m.property > X`，"小于X" → `WHERE m.property < X`
+- "最高/最大" → `ORDER BY m.property DESC LIMIT 1`
+- 文本匹配使用 CONTAINS，如 `WHERE m.synthesis_method CONTAINS '球磨'`
+- 只返回相关属性"""
+    
+    def plan(self, user_question: str, use_local: bool = True) -> Dict[str, Any]:
         """
-        分析用户问题并路由到合适的专家系统
+        联合规划：一次LLM调用同时给出路由决策、检索关键词和Cypher查询
         
         Args:
             user_question: 用户问题
+            use_local: 是否先尝试本地路由分类器
             
         Returns:
-            路由决策字典
+            路由决策字典，LLM规划成功时额外包含 search_query 和 cypher
         """
-        logger.info(f"🔍 分析用户问题: {user_question}")
+        logger.info(f"🔍 联合规划用户问题: {user_question}")
+        
+        if use_local:
+            local_result = self._local_route(user_question)
+            if local_result is not None:
+                return local_result
         
-        # 如果没有LLM，使用降级策略
         if self._llm is None:
-            fallback_expert = self._fallback_routing(user_question)
-            return {
-                "success": False,
-                "error": "LLM服务未初始化",
-                "primary_expert": fallback_expert,
-                "confidence": 0.5,
-                "reasoning": "使用关键词匹配降级",
-                "user_question": user_question
-            }
+            return self._fallback_result(user_question, "LLM服务未初始化", "使用关键词匹配降级")
         
         try:
-            from langchain_core.messages import HumanMessage, SystemMessage
+            response = self._llm.invoke(self._build_plan_messages(user_question), profile="fast")
+            result = self._parse_plan_response(user_question, response.content)
+            self._log_decision(result)
+            return result
             
-            messages = [
-                SystemMessage(content=self._router_prompt),
-                HumanMessage(content=f"用户问题：{user_question}")
-            ]
+        except Exception as e:
+            logger.error(f"❌ 联合规划失败: {e}")
+            return self._fallback_result(user_question, str(e), "API调用失败，使用关键词匹配降级")
+    
+    async def aplan(self, user_question: str, use_local: bool = True) -> Dict[str, Any]:
+        """
+        联合规划（异步）
+        
+        Args:
+            user_question: 用户问题
+            use_local: 是否先尝试本地路由分类器
             
-            response = self._llm.invoke(messages)
-            result_text = response.content.strip()
+        Returns:
+            路由决策字典，LLM规划成功时额外包含 search_query 和 cypher
+        """
+        logger.info(f"🔍 联合规划用户问题: {user_question}")
+        
+        if use_local and self._local_router is not None:
+            local_result = await asyncio.to_thread(self._local_route, user_question)
+            if local_result is not None:
+                return local_result
+        
+        if self._llm is None:
+            return self._fallback_result(user_question, "LLM服务未初始化", "使用关键词匹配降级")
+        
+        try:
+            response = await self._llm.ainvoke(self._build_plan_messages(user_question), profile="fast")
+            result = self._parse_plan_response(user_question, response.content)
+            await asyncio.to_thread(self._log_decision, result)
+            return result
             
-            # 提取JSON（去除可能的markdown代码块标记）
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+        except Exception as e:
+            logger.error(f"❌ 联合规划失败: {e}")
+            return self._fallback_result(user_question, str(e), "API调用失败，使用关键词匹配降级")
+    
+    def route(self, user_question: str, use_local: bool = True) -> Dict[str, Any]:
+        """
+        分析用户问题并路由到合适的专家系统
+        
+        Args:
+            user_question: 用户问题
+            use_local: 是否先尝试本地路由分类器
             
-            # 解析JSON
-            import json
-            routing_decision = json.loads(result_text)
+        Returns:
+            路由决策字典
+        """
+        logger.info(f"🔍 分析用户问题: {user_question}")
+        
+        # 本地分类器置信度足够时直接返回，不调用LLM
+        if use_local:
+            local_result = self._local_route(user_question)
+            if local_result is not None:
+                return local_result
+        
+        # 如果没有LLM，使用降级策略
+        if self._llm is None:
+            return self._fallback_result(user_question, "LLM服务未初始化", "使用关键词匹配降级")
+        
+        try:
+            response = self._llm.invoke(self._build_route_messages(user_question), profile="fast")
+            result = self._parse_routing_response(user_question, response.content)
+            self._log_decision(result)
+            return result
             
-            # 验证返回的expert是否有效
-            valid_experts = ["neo4j", "literature", "community"]
-            if routing_decision.get("primary_expert") not in valid_experts:
-                logger.warning(f"⚠️  无效的专家选择，使用默认值")
-                routing_decision["primary_expert"] = "literature"
+        except Exception as e:
+            logger.error(f"❌ 路由失败: {e}")
             
-            logger.info(f"✅ 路由决策: {routing_decision['primary_expert']} "
-                       f"(置信度: {routing_decision.get('confidence', 0):.2f})")
-            logger.info(f"   理由: {routing_decision.get('reasoning', 'N/A')}")
+            # 降级策略：使用简单的关键词匹配
+            return self._fallback_result(user_question, str(e), "API调用失败，使用关键词匹配降级")
+    
+    async def aroute(self, user_question: str) -> Dict[str, Any]:
+        """
+        分析用户问题并路由到合适的专家系统（异步）
+        
+        Args:
+            user_question: 用户问题
             
-            return {
-                "success": True,
-                "user_question": user_question,
-                **routing_decision
-            }
+        Returns:
+            路由决策字典
+        """
+        logger.info(f"🔍 分析用户问题: {user_question}")
+        
+        if self._local_router is not None:
+            local_result = await asyncio.to_thread(self._local_route, user_question)
+            if local_result is not None:
+                return local_result
+        
+        if self._llm is None:
+            return self._fallback_result(user_question, "LLM服务未初始化", "使用关键词匹配降级")
+        
+        try:
+            response = await self._llm.ainvoke(self._build_route_messages(user_question), profile="fast")
+            result = self._parse_routing_response(user_question, response.content)
+            await asyncio.to_thread(self._log_decision, result)
+            return result
             
         except Exception as e:
             logger.error(f"❌ 路由失败: {e}")
+            return self._fallback_result(user_question, str(e), "API调用失败，使用关键词匹配降级")
+    
+    def _build_route_messages(self, user_question: str) -> List[Any]:
+        """构建路由LLM调用的消息列表"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        return [
+            SystemMessage(content=self._router_prompt),
+            HumanMessage(content=f"用户问题：{user_question}")
+        ]
+    
+    def _build_plan_messages(self, user_question: str) -> List[Any]:
+        """构建联合规划LLM调用的消息列表"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        return [
+            SystemMessage(content=self._plan_prompt),
+            HumanMessage(content=f"用户问题：{user_question}")
+        ]
+    
+    def _parse_plan_response(self, user_question: str, content: str) -> Dict[str, Any]:
+        """解析联合规划JSON，规范化 search_query 和 cypher 字段"""
+        result = self._parse_routing_response(user_question, content)
+        
+        result["search_query"] = str(result.get("search_query") or "").strip().strip('"\'')
+        cypher = str(result.get("cypher") or "").strip()
+        if "```" in cypher:
+            cypher = cypher.split("```")[1].removeprefix("cypher").strip()
+        result["cypher"] = cypher if result["primary_expert"] == "neo4j" else ""
+        
+        logger.info(f"   检索关键词: {result['search_query'] or 'N/A'}")
+        if result["cypher"]:
+            logger.info(f"   Cypher: {result['cypher']}")
+        
+        return result
+    
+    def _parse_routing_response(self, user_question: str, content: str) -> Dict[str, Any]:
+        """解析LLM返回的路由JSON"""
+        result_text = content.strip()
+        
+        # 提取JSON（去除可能的markdown代码块标记）
+        if "```json" in result_text:
+            result_text = result_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in result_text:
+            result_text = result_text.split("```")[1].split("```")[0].strip()
+        
+        # 解析JSON
+        routing_decision = json.loads(result_text)
+        
+        # 验证返回的expert是否有效
+        valid_experts = ["neo4j", "literature", "community"]
+        if routing_decision.get("primary_expert") not in valid_experts:
+            logger.warning(f"⚠️  无效的专家选择，使用默认值")
+            routing_decision["primary_expert"] = "literature"
+        
+        logger.info(f"✅ 路由决策: {routing_decision['primary_expert']} "
+                   f"(置信度: {routing_decision.get('confidence', 0):.2f})")
+        logger.info(f"   理由: {routing_decision.get('reasoning', 'N/A')}")
+        
+        return {
+            "success": True,
+            "user_question": user_question,
+            "source": "llm",
+            **routing_decision
+        }
+    
+    def training_samples(self) -> List[Tuple[str, str]]:
+        """
+        本地路由的训练样本：专家示例问题 + 路由决策日志
+        
+        Returns:
+            (问题, 专家) 列表
+        """
+        samples = [
+            (example, name)
+            for name, info in self.EXPERTS.items()
+            for example in info["examples"]
+        ]
+        samples.extend(load_routing_log(settings.routing_log_path))
+        return samples
+    
+    def _ensure_local_router(self) -> Optional[LocalRouter]:
+        """首次使用时训练本地路由，训练失败后不再重试"""
+        if self._local_router is None or self._local_router_failed:
+            return None
+        if self._local_router.ready:
+            return self._local_router
+        
+        with self._local_router_lock:
+            if not self._local_router.ready and not self._local_router_failed:
+                try:
+                    fitted = self._local_router.fit(self.training_samples())
+                except Exception as e:
+                    logger.warning(f"⚠️  本地路由训练失败，改用LLM路由: {e}")
+                    fitted = False
+                self._local_router_failed = not fitted
+        
+        return self._local_router if self._local_router.ready else None
+    
+    def _local_route(self, user_question: str) -> Optional[Dict[str, Any]]:
+        """
+        使用本地分类器路由
+        
+        Args:
+            user_question: 用户问题
             
-            # 降级策略：使用简单的关键词匹配
-            fallback_expert = self._fallback_routing(user_question)
-            
-            return {
-                "success": False,
-                "error": str(e),
-                "primary_expert": fallback_expert,
-                "confidence": 0.5,
-                "reasoning": "API调用失败，使用关键词匹配降级",
-                "user_question": user_question
-            }
+        Returns:
+            置信度达到阈值时返回路由决策，否则返回None
+        """
+        local_router = self._ensure_local_router()
+        if local_router is None:
+            return None
+        
+        try:
+            prediction = local_router.predict(user_question)
+        except Exception as e:
+            logger.warning(f"⚠️  本地路由失败，改用LLM路由: {e}")
+            return None
+        
+        if not prediction["confident"]:
+            logger.info(f"   本地路由置信度不足 ({prediction['primary_expert']}: "
+                       f"{prediction['confidence']:.2f})，交由LLM路由")
+            return None
+        
+        logger.info(f"⚡ 本地路由决策: {prediction['primary_expert']} "
+                   f"(置信度: {prediction['confidence']:.2f})")
+        
+        return {
+            "success": True,
+            "user_question": user_question,
+            "source": "local",
+            "primary_expert": prediction["primary_expert"],
+            "confidence": prediction["confidence"],
+            "reasoning": "本地向量分类器与该专家示例问题最相近",
+            "scores": prediction["scores"]
+        }
+    
+    def _log_decision(self, routing_result: Dict[str, Any]):
+        """将高置信度的LLM路由决策追加到路由日志，供本地路由再训练"""
+        if not self._log_decisions or self._local_router is None or not settings.routing_log_path:
+            return
+        if float(routing_result.get("confidence") or 0) < settings.routing_log_min_confidence:
+            return
+        
+        record = {
+            "question": routing_result["user_question"],
+            "expert": routing_result["primary_expert"],
+            "confidence": routing_result.get("confidence")
+        }
+        try:
+            log_dir = os.path.dirname(settings.routing_log_path)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            with self._routing_log_lock:
+                with open(settings.routing_log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.warning(f"⚠️  写入路由日志失败: {e}")
+    
+    def _fallback_result(self, user_question: str, error: str, reasoning: str) -> Dict[str, Any]:
+        """构建降级路由结果"""
+        return {
+            "success": False,
+            "error": error,
+            "primary_expert": self._fallback_routing(user_question),
+            "confidence": 0.5,
+            "reasoning": reasoning,
+            "user_question": user_question
+        }
     
     def _fallback_routing(self, question: str) -> str:
         """
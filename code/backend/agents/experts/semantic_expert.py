@@ -2,17 +2,25 @@
 语义搜索专家 - Semantic Expert
 功能：基于向量数据库进行文献语义搜索
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Generator, AsyncGenerator
+import asyncio
 import logging
 import os
 import json
 import re
-import requests
+import time
 
+from backend.config.settings import settings
 from backend.services.llm_service import LLMService
+from backend.services.embedding_cache import get_embedding_cache
+from backend.services.embedding_client import EmbeddingClient, get_embedding_client
+from backend.services.reranker import Reranker, get_reranker
 from backend.repositories.vector_repository import VectorRepository
+from backend.repositories.lexical_index import exact_terms, reciprocal_rank_fusion
+from backend.models.entities import RetrievalContext
 from backend.utils.pdf_loader import PDFManager
 from backend.utils.doi_inserter import ProgrammaticDOIInserter
+from backend.utils.diversity import select_diverse
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +31,9 @@ class SemanticExpert:
     def __init__(
         self, 
         vector_repo: VectorRepository,
-        llm_service: Optional[LLMService] = None
+        llm_service: Optional[LLMService] = None,
+        embedding_client: Optional[EmbeddingClient] = None,
+        reranker: Optional[Reranker] = None
     ):
         """
         初始化语义搜索专家
@@ -31,9 +41,13 @@ class SemanticExpert:
         Args:
             vector_repo: 向量数据库仓储
             llm_service: LLM服务实例（用于结果增强）
+            embedding_client: Embedding客户端（EmbeddingClient 或 LocalEmbeddingClient），默认使用全局实例
+            reranker: 交叉编码器重排序器，默认在 RERANKER_ENABLED 时使用全局实例
         """
         self._vector_repo = vector_repo
         self._llm = llm_service
+        self._embedding_client = embedding_client
+        self._reranker = reranker or get_reranker()
         
         # 加载prompt模板
         self._search_prompt = self._build_search_prompt()
@@ -154,27 +168,54 @@ class SemanticExpert:
             return self._generate_simple_query(question)
         
         try:
-            from langchain_core.messages import HumanMessage, SystemMessage
+            response = self._llm.invoke(self._build_search_messages(question), profile="fast")
+            return self._parse_search_query(response.content)
             
-            messages = [
-                SystemMessage(content=self._search_prompt),
-                HumanMessage(content=f"用户问题：{question}")
-            ]
-            
-            response = self._llm.invoke(messages)
-            query = response.content.strip()
-            
-            # 去除可能的引号和代码块标记
-            query = query.strip('"\'')
-            if "```" in query:
-                query = query.split("```")[0].strip()
+        except Exception as e:
+            logger.error(f"生成搜索查询失败: {e}")
+            return self._generate_simple_query(question)
+    
+    async def agenerate_search_query(self, question: str) -> str:
+        """
+        生成语义搜索查询（异步）
+        
+        Args:
+            question: 用户问题
             
-            return query
+        Returns:
+            搜索查询字符串
+        """
+        if self._llm is None:
+            return self._generate_simple_query(question)
+        
+        try:
+            response = await self._llm.ainvoke(self._build_search_messages(question), profile="fast")
+            return self._parse_search_query(response.content)
             
         except Exception as e:
             logger.error(f"生成搜索查询失败: {e}")
             return self._generate_simple_query(question)
     
+    def _build_search_messages(self, question: str) -> List[Any]:
+        """构建关键词提取的消息列表"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        
+        return [
+            SystemMessage(content=self._search_prompt),
+            HumanMessage(content=f"用户问题：{question}")
+        ]
+    
+    def _parse_search_query(self, content: str) -> str:
+        """清理LLM返回的搜索查询"""
+        query = content.strip()
+        
+        # 去除可能的引号和代码块标记
+        query = query.strip('"\'')
+        if "```" in query:
+            query = query.split("```")[0].strip()
+        
+        return query
+    
     def _generate_simple_query(self, question: str) -> str:
         """
         使用规则生成简单的搜索查询
@@ -225,122 +266,480 @@ class SemanticExpert:
         Returns:
             搜索结果
         """
-        # 移除 can_handle 检查，允许所有问题进行语义搜索
+        context = self.retrieve(
+            question,
+            top_k=top_k,
+            with_scores=with_scores,
+            filter_metadata=filter_metadata
+        )
+        return context.to_dict()
+    
+    def retrieve(
+        self,
+        question: str,
+        top_k: int = 20,
+        with_scores: bool = True,
+        filter_metadata: Optional[Dict] = None,
+        context: Optional[RetrievalContext] = None
+    ) -> RetrievalContext:
+        """
+        执行一次完整检索并返回检索上下文
         
-        try:
-            # 生成搜索查询
-            logger.info("\n" + "="*80)
-            logger.info("📝 [步骤2] 提取关键词")
-            search_query = self.generate_search_query(question)
-            logger.info(f"关键词: {search_query}")
-            logger.info("="*80)
+        关键词、查询向量和检索结果只计算一次，
+        后续的PDF加载、答案合成和引用构建都复用该上下文
+        
+        Args:
+            question: 用户问题
+            top_k: 检索数量
+            with_scores: 是否计算相似度分数
+            filter_metadata: 元数据过滤条件
+            context: 部分完成的检索上下文（如推测执行已生成关键词和向量），只补齐缺失步骤
             
-            # 生成查询的embedding向量（使用BGE API）
-            logger.info("\n" + "="*80)
-            logger.info("🔢 [步骤3] 生成查询向量(Embedding)")
-            logger.info(f"BGE API地址: {self._bge_api_url}")
-            logger.info(f"输入文本: {search_query}")
-            try:
-                response = requests.post(
-                    self._bge_api_url,
-                    json={"input": [search_query]},
-                    timeout=30
+        Returns:
+            检索上下文
+        """
+        # 移除 can_handle 检查，允许所有问题进行语义搜索
+        if context is None:
+            context = RetrievalContext(question=question, top_k=top_k)
+        if context.searched or not context.success:
+            return context
+        try:
+            self.prepare_context(context)
+            if self.embed_context(context):
+                self.search_context(
+                    context,
+                    with_scores=with_scores,
+                    filter_metadata=filter_metadata
                 )
-                response.raise_for_status()
-                query_embedding = response.json()["data"][0]["embedding"]
-                logger.info(f"✅ 成功生成embedding")
-                logger.info(f"向量维度: {len(query_embedding)}")
-                logger.info(f"向量前5维: {query_embedding[:5]}")
-                logger.info("="*80)
-            except Exception as e:
-                logger.error(f"❌ 生成embedding失败: {e}")
-                return {
-                    "success": False,
-                    "error": f"生成查询向量失败: {str(e)}",
-                    "error_step": "generate_embedding",
-                    "expert": "semantic",
-                    "documents": []
-                }
-            
-            # 执行搜索
-            logger.info("\n" + "="*80)
-            logger.info("🔍 [步骤4] 查询向量数据库")
-            logger.info(f"检索数量: top_k={top_k}")
-            results = self._vector_repo.search(
-                query_embedding=query_embedding,
-                n_results=top_k,
-                where_filter=filter_metadata
-            )
+        except Exception as e:
+            logger.error(f"语义搜索失败: {e}")
+            context.error = str(e)
+            context.error_step = "search"
+        
+        return context
+    
+    def prepare_context(self, context: RetrievalContext) -> RetrievalContext:
+        """
+        生成检索关键词并写入上下文（已有关键词时跳过）
+        
+        Args:
+            context: 检索上下文
             
-            if not results.get('success'):
-                logger.error(f"❌ 向量搜索失败: {results.get('error')}")
-                return {
-                    "success": False,
-                    "error": results.get('error', '搜索失败'),
-                    "error_step": "vector_search",
-                    "expert": "semantic"
-                }
+        Returns:
+            检索上下文
+        """
+        if context.search_query:
+            return context
+        
+        logger.info("\n" + "="*80)
+        logger.info("📝 [步骤2] 提取关键词")
+        context.search_query = self.generate_search_query(context.question)
+        logger.info(f"关键词: {context.search_query}")
+        logger.info("="*80)
+        return context
+    
+    def embed_context(self, context: RetrievalContext) -> bool:
+        """
+        生成查询的embedding向量（使用BGE API）并写入上下文
+        
+        Args:
+            context: 检索上下文
             
-            # 格式化结果
-            documents = []
-            docs = results.get('documents', [])
-            metadatas = results.get('metadatas', [])
-            distances = results.get('distances', [])
-            ids = results.get('ids', [])
+        Returns:
+            是否成功
+        """
+        if context.query_embedding is not None:
+            return True
+        
+        search_query = context.search_query or context.question
+        logger.info("\n" + "="*80)
+        logger.info("🔢 [步骤3] 生成查询向量(Embedding)")
+        logger.info(f"输入文本: {search_query}")
+        if self._load_cached_embedding(context, search_query):
+            return True
+        
+        if settings.embedding_backend == "http":
+            logger.info(f"BGE API地址: {self._bge_api_url}")
+        try:
+            context.query_embedding = self.embedding_client.embed_query(search_query)
+            self._store_cached_embedding(search_query, context.query_embedding)
+            logger.info(f"✅ 成功生成embedding")
+            logger.info(f"向量维度: {len(context.query_embedding)}")
+            logger.info(f"向量前5维: {context.query_embedding[:5]}")
+            logger.info("="*80)
+            return True
+        except Exception as e:
+            logger.error(f"❌ 生成embedding失败: {e}")
+            context.error = f"生成查询向量失败: {str(e)}"
+            context.error_step = "generate_embedding"
+            return False
+    
+    @property
+    def embedding_client(self) -> EmbeddingClient:
+        """Embedding客户端（默认使用全局实例，后端由 EMBEDDING_BACKEND 决定）"""
+        if self._embedding_client is None:
+            self._embedding_client = get_embedding_client()
+        return self._embedding_client
+    
+    def _load_cached_embedding(self, context: RetrievalContext, search_query: str) -> bool:
+        """从查询向量缓存读取embedding，命中时写入上下文"""
+        cache = get_embedding_cache()
+        if cache is None:
+            return False
+        vector = cache.get(search_query)
+        if vector is None:
+            return False
+        context.query_embedding = vector
+        logger.info(f"⚡ 查询向量缓存命中 (维度: {len(vector)})")
+        return True
+    
+    def _store_cached_embedding(self, search_query: str, vector: List[float]):
+        """将新生成的embedding写入查询向量缓存"""
+        cache = get_embedding_cache()
+        if cache is not None:
+            cache.put(search_query, vector)
+    
+    def search_context(
+        self,
+        context: RetrievalContext,
+        with_scores: bool = True,
+        filter_metadata: Optional[Dict] = None
+    ) -> bool:
+        """
+        使用上下文中的查询向量检索向量数据库，并写入原始结果和过滤后结果
+        
+        Args:
+            context: 检索上下文（需已生成 query_embedding）
+            with_scores: 是否计算相似度分数
+            filter_metadata: 元数据过滤条件
             
-            for i, doc_content in enumerate(docs):
-                doc_data = {
-                    "id": ids[i] if i < len(ids) else str(i),
-                    "content": doc_content,
-                }
-                if i < len(metadatas) and metadatas[i]:
-                    doc_data["metadata"] = metadatas[i]
-                if with_scores and i < len(distances):
-                    # ChromaDB 使用 cosine 距离 (范围 0-2)
-                    # 余弦相似度 = 1 - (cosine_distance / 2)
-                    # 距离越小,相似度越高
-                    distance = distances[i]
-                    similarity = 1 - (distance / 2.0)  # 转换为 0-1 范围的相似度
-                    doc_data["score"] = max(0.0, min(1.0, similarity))  # 确保在 0-1 范围内
-                documents.append(doc_data)
+        Returns:
+            是否成功
+        """
+        logger.info("\n" + "="*80)
+        logger.info("🔍 [步骤4] 查询向量数据库")
+        # 结果多样化时多取候选，按 DOI 分组后再选出 top_k 个切片
+        diversify = settings.diversity_selection
+        fetch_k = context.top_k * max(1, settings.diversity_overfetch) if diversify else context.top_k
+        logger.info(f"检索数量: top_k={context.top_k}, 候选数={fetch_k}")
+        results = self._vector_repo.search(
+            query_embedding=context.query_embedding,
+            n_results=fetch_k,
+            where_filter=filter_metadata,
+            include_embeddings=diversify
+        )
+        
+        if not results.get('success'):
+            logger.error(f"❌ 向量搜索失败: {results.get('error')}")
+            context.error = results.get('error', '搜索失败')
+            context.error_step = "vector_search"
+            return False
+        
+        # 格式化结果
+        documents = []
+        docs = results.get('documents', [])
+        metadatas = results.get('metadatas', [])
+        distances = results.get('distances', [])
+        ids = results.get('ids', [])
+        hit_embeddings = results.get('embeddings')
+        embeddings: Optional[Dict[str, Any]] = None
+        if diversify:
+            embeddings = {
+                doc_id: hit_embeddings[i]
+                for i, doc_id in enumerate(ids)
+                if hit_embeddings is not None and i < len(hit_embeddings)
+            }
+        
+        for i, doc_content in enumerate(docs):
+            doc_data = {
+                "id": ids[i] if i < len(ids) else str(i),
+                "content": doc_content,
+            }
+            if i < len(metadatas) and metadatas[i]:
+                doc_data["metadata"] = metadatas[i]
+            if with_scores and i < len(distances):
+                doc_data["score"] = self._distance_to_score(distances[i])
+            documents.append(doc_data)
+        
+        # 混合检索：BM25 关键词命中与向量命中按 RRF 融合
+        if settings.hybrid_search:
+            documents = self._fuse_lexical(
+                context, documents, with_scores, filter_metadata,
+                limit=fetch_k, embeddings=embeddings
+            )
+        
+        # 结果多样化：按 DOI 分组做 MMR，同一论文的切片不再占满 top_k
+        if diversify:
+            candidates = len(documents)
+            documents = select_diverse(
+                documents,
+                [embeddings.get(doc["id"]) for doc in documents],
+                top_k=context.top_k,
+                lambda_mult=settings.diversity_mmr_lambda,
+                chunks_per_doi=settings.diversity_chunks_per_doi
+            )
+            logger.info(f"🧩 结果多样化: 候选 {candidates} 条 → {len(documents)} 条, "
+                        f"{len({doc.get('mmr_rank') for doc in documents})} 篇论文")
+        
+        # 交叉编码器重排序：预算允许时对排名靠前的候选一次批量打分
+        if self._reranker is not None:
+            documents = self._rerank(context, documents)
+        
+        # 应用相似度过滤
+        filtered_documents = self._filter_by_similarity(
+            documents=documents,
+            question=context.question,
+            with_scores=with_scores
+        )
+        context.raw_documents = documents
+        context.documents = filtered_documents
+        context.searched = True
+        
+        logger.info(f"✅ 检索成功")
+        logger.info(f"原始结果数: {len(documents)}")
+        logger.info(f"过滤后结果数: {len(filtered_documents)}")
+        logger.info("\n前3条检索结果预览:")
+        for i, doc in enumerate(filtered_documents[:3], 1):
+            score = doc.get('score', 0)
+            content_preview = doc.get('content', '')[:100]
+            doi = doc.get('metadata', {}).get('DOI', 'N/A')
+            logger.info(f"  [{i}] 相似度={score:.4f}, DOI={doi}")
+            logger.info(f"      内容: {content_preview}...")
+        logger.info("="*80)
+        return True
+    
+    def _rerank(self, context: RetrievalContext, documents: List[Dict]) -> List[Dict]:
+        """
+        交叉编码器重排序，并把本次耗时和名次变化写入上下文
+        
+        Args:
+            context: 检索上下文（使用原始问题作为查询）
+            documents: 当前排序的候选
             
-            # 应用相似度过滤
-            filtered_documents = self._filter_by_similarity(
-                documents=documents,
-                question=question,
-                with_scores=with_scores
+        Returns:
+            重排后的文档；跳过或失败时原样返回
+        """
+        try:
+            documents, info = self._reranker.rerank(
+                context.question,
+                documents,
+                top_n=settings.reranker_top_n
             )
+        except Exception as e:
+            logger.error(f"❌ 重排序失败: {e}")
+            context.rerank_info = {"applied": False, "skipped": "error", "error": str(e)}
+            return documents
+        
+        context.rerank_info = info
+        if info.get("applied"):
+            logger.info(f"🔄 重排序: {info['reranked']}/{info['candidates']} 条, "
+                        f"{info['elapsed_ms']:.1f}ms (预算 {info['budget_ms']:.0f}ms), "
+                        f"名次变化 {info['moved']} 条, 首条{'已' if info['top1_changed'] else '未'}改变")
+        else:
+            logger.info(f"⚠️  跳过重排序: {info.get('skipped')}")
+        return documents
+    
+    @staticmethod
+    def _distance_to_score(distance: float) -> float:
+        """
+        向量距离转换为 0-1 的相似度
+        
+        ChromaDB 使用 cosine 距离 (范围 0-2)，余弦相似度 = 1 - (cosine_distance / 2)，
+        距离越小相似度越高
+        """
+        return max(0.0, min(1.0, 1 - (distance / 2.0)))
+    
+    def _fuse_lexical(
+        self,
+        context: RetrievalContext,
+        documents: List[Dict],
+        with_scores: bool = True,
+        filter_metadata: Optional[Dict] = None,
+        limit: Optional[int] = None,
+        embeddings: Optional[Dict[str, Any]] = None
+    ) -> List[Dict]:
+        """
+        BM25 关键词检索并与向量结果按倒数排名融合
+        
+        仅由关键词命中的文档也计算向量相似度；两路都命中的文档记录各自排名。
+        命中文档记录 BM25 得分，并在 lexical_terms 中记录与查询共有的字母数字/化学式词项，
+        供相似度过滤判断是否豁免。词法索引未就绪或过滤条件不受支持时原样返回向量结果
+        
+        Args:
+            context: 检索上下文（使用检索关键词和查询向量）
+            documents: 按向量距离排序的文档
+            with_scores: 是否计算相似度分数
+            filter_metadata: 元数据过滤条件
+            limit: 返回数量，默认 top_k
+            embeddings: 文档 id 到向量的映射，提供时补充仅由关键词命中的文档向量
             
-            logger.info(f"✅ 检索成功")
-            logger.info(f"原始结果数: {len(documents)}")
-            logger.info(f"过滤后结果数: {len(filtered_documents)}")
-            logger.info("\n前3条检索结果预览:")
-            for i, doc in enumerate(filtered_documents[:3], 1):
-                score = doc.get('score', 0)
-                content_preview = doc.get('content', '')[:100]
-                doi = doc.get('metadata', {}).get('DOI', 'N/A')
-                logger.info(f"  [{i}] 相似度={score:.4f}, DOI={doi}")
-                logger.info(f"      内容: {content_preview}...")
-            logger.info("="*80)
+        Returns:
+            按融合得分排序的前 limit 个文档
+        """
+        start = time.perf_counter()
+        lexical = self._vector_repo.lexical_search(
+            query=context.search_query or context.question,
+            n_results=settings.hybrid_lexical_top_k,
+            query_embedding=context.query_embedding if with_scores else None,
+            where_filter=filter_metadata,
+            include_embeddings=embeddings is not None
+        )
+        if not lexical.get('success') or not lexical.get('ids'):
+            return documents
+        
+        query_terms = exact_terms(context.search_query or context.question)
+        scores = lexical.get('scores') or []
+        by_id = {doc["id"]: doc for doc in documents}
+        for rank, doc in enumerate(documents, 1):
+            doc["vector_rank"] = rank
+        for i, doc_id in enumerate(lexical['ids']):
+            doc = by_id.get(doc_id)
+            if doc is None:
+                doc = {"id": doc_id, "content": lexical['documents'][i]}
+                if lexical['metadatas'][i]:
+                    doc["metadata"] = lexical['metadatas'][i]
+                if with_scores and 'distances' in lexical:
+                    doc["score"] = self._distance_to_score(lexical['distances'][i])
+                by_id[doc_id] = doc
+            doc["lexical_rank"] = i + 1
+            if i < len(scores):
+                doc["lexical_score"] = float(scores[i])
+            matched = query_terms & exact_terms(doc.get("content", "")) if query_terms else set()
+            if matched:
+                doc["lexical_terms"] = sorted(matched)
+            if embeddings is not None and 'embeddings' in lexical:
+                embeddings.setdefault(doc_id, lexical['embeddings'][i])
+        
+        fused = reciprocal_rank_fusion(
+            [[doc["id"] for doc in documents], lexical['ids']],
+            k=settings.hybrid_rrf_k
+        )
+        merged = sorted(by_id.values(), key=lambda doc: -fused[doc["id"]])[:limit or context.top_k]
+        for doc in merged:
+            doc["rrf_score"] = fused[doc["id"]]
+        
+        added = sum(1 for doc in merged if "vector_rank" not in doc)
+        logger.info(f"🔀 混合检索: 关键词命中 {len(lexical['ids'])} 条, 新增 {added} 条 "
+                    f"({(time.perf_counter() - start) * 1000:.1f}ms)")
+        return merged
+    
+    async def asearch(
+        self,
+        question: str,
+        top_k: int = 10,
+        with_scores: bool = False,
+        filter_metadata: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """
+        执行语义搜索（异步）
+        
+        Args:
+            question: 用户问题
+            top_k: 返回结果数量
+            with_scores: 是否返回相似度分数
+            filter_metadata: 元数据过滤条件
             
-            return {
-                "success": True,
-                "expert": "semantic",
-                "search_query": search_query,
-                "result_count": len(filtered_documents),
-                "original_count": len(documents),
-                "documents": filtered_documents,
-                "question": question
-            }
+        Returns:
+            搜索结果
+        """
+        context = await self.aretrieve(
+            question,
+            top_k=top_k,
+            with_scores=with_scores,
+            filter_metadata=filter_metadata
+        )
+        return context.to_dict()
+    
+    async def aretrieve(
+        self,
+        question: str,
+        top_k: int = 20,
+        with_scores: bool = True,
+        filter_metadata: Optional[Dict] = None,
+        context: Optional[RetrievalContext] = None
+    ) -> RetrievalContext:
+        """
+        执行一次完整检索并返回检索上下文（异步）
+        
+        Args:
+            question: 用户问题
+            top_k: 检索数量
+            with_scores: 是否计算相似度分数
+            filter_metadata: 元数据过滤条件
+            context: 部分完成的检索上下文，只补齐缺失步骤
             
+        Returns:
+            检索上下文
+        """
+        if context is None:
+            context = RetrievalContext(question=question, top_k=top_k)
+        if context.searched or not context.success:
+            return context
+        try:
+            await self.aprepare_context(context)
+            if await self.aembed_context(context):
+                await self.asearch_context(
+                    context,
+                    with_scores=with_scores,
+                    filter_metadata=filter_metadata
+                )
         except Exception as e:
             logger.error(f"语义搜索失败: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "error_step": "search",
-                "expert": "semantic"
-            }
+            context.error = str(e)
+            context.error_step = "search"
+        
+        return context
+    
+    async def aprepare_context(self, context: RetrievalContext) -> RetrievalContext:
+        """生成检索关键词并写入上下文（异步）"""
+        if context.search_query:
+            return context
+        
+        context.search_query = await self.agenerate_search_query(context.question)
+        logger.info(f"关键词: {context.search_query}")
+        return context
+    
+    async def aembed_context(self, context: RetrievalContext) -> bool:
+        """
+        生成查询向量并写入上下文（异步，与同步请求共享合批队列）
+        
+        Args:
+            context: 检索上下文
+            
+        Returns:
+            是否成功
+        """
+        if context.query_embedding is not None:
+            return True
+        
+        search_query = context.search_query or context.question
+        if await asyncio.to_thread(self._load_cached_embedding, context, search_query):
+            return True
+        
+        try:
+            context.query_embedding = await self.embedding_client.aembed_query(search_query)
+            await asyncio.to_thread(self._store_cached_embedding, search_query, context.query_embedding)
+            logger.info(f"✅ 成功生成embedding (维度: {len(context.query_embedding)})")
+            return True
+        except Exception as e:
+            logger.error(f"❌ 生成embedding失败: {e}")
+            context.error = f"生成查询向量失败: {str(e)}"
+            context.error_step = "generate_embedding"
+            return False
+    
+    async def asearch_context(
+        self,
+        context: RetrievalContext,
+        with_scores: bool = True,
+        filter_metadata: Optional[Dict] = None
+    ) -> bool:
+        """检索向量数据库（异步，ChromaDB查询在线程池中执行）"""
+        return await asyncio.to_thread(
+            self.search_context,
+            context,
+            with_scores,
+            filter_metadata
+        )
     
     def search_by_material(self, material: str, top_k: int = 5) -> Dict[str, Any]:
         """
@@ -516,9 +915,15 @@ class SemanticExpert:
         filtered = []
         filtered_count = 0
         
+        lexical_floor = settings.hybrid_lexical_score_floor
         for doc in documents:
             score = doc.get('score', 1.0)
-            if score >= threshold:
+            # 命中查询中字母数字/化学式术语（或 BM25 得分达到下限）的关键词结果不按向量相似度过滤；
+            # 只共享常见中文二元组（如“材料”“性能”）的命中仍按阈值过滤
+            exact_hit = bool(doc.get('lexical_terms')) or (
+                lexical_floor > 0 and doc.get('lexical_score', 0.0) >= lexical_floor
+            )
+            if score >= threshold or exact_hit:
                 filtered.append(doc)
             else:
                 filtered_count += 1
@@ -574,28 +979,66 @@ class SemanticExpert:
         self,
         question: str,
         top_k: int = 20,
-        load_pdf: bool = True
+        load_pdf: bool = True,
+        context: Optional[RetrievalContext] = None
     ) -> Dict[str, Any]:
-        """执行查询并返回详细信息（包括PDF加载情况）"""
-        search_result = self.search(question, top_k=top_k, with_scores=True)
+        """
+        执行查询并返回详细信息（包括PDF加载情况）
         
-        if not search_result.get('success'):
+        Args:
+            question: 用户问题
+            top_k: 检索数量（未传入context时使用）
+            load_pdf: 是否加载PDF原文
+            context: 已完成的检索上下文，传入时不再重复检索
+            
+        Returns:
+            包含 answer 和 pdf_info 的字典
+        """
+        if context is None:
+            context = self.retrieve(question, top_k=top_k, with_scores=True)
+        
+        if not context.success:
             return {
                 'answer': '检索失败',
-                'pdf_info': {'error': search_result.get('error')}
+                'pdf_info': {'error': context.error}
             }
         
-        documents = search_result.get('documents', [])
+        documents = context.documents
         if not documents:
             return {
                 'answer': '未找到相关文献。',
                 'pdf_info': {'documents_found': 0}
             }
         
-        # 判断问题类型
-        is_broad = self._is_broad_question(question)
+        pdf_info = self.load_context_pdfs(context, load_pdf=load_pdf)
+        
+        if pdf_info['is_broad_question']:
+            answer = self._synthesize_broad_answer(question, documents)
+        else:
+            answer = self._synthesize_semantic_answer(question, documents, context.pdf_contents)
+        return {
+            'answer': answer,
+            'pdf_info': pdf_info
+        }
+    
+    def load_context_pdfs(
+        self,
+        context: RetrievalContext,
+        load_pdf: bool = True
+    ) -> Dict[str, Any]:
+        """
+        判断问题类型，精确问题加载PDF原文到检索上下文
+        
+        Args:
+            context: 检索上下文
+            load_pdf: 是否加载PDF原文
+            
+        Returns:
+            PDF加载信息
+        """
+        documents = context.documents
+        is_broad = self._is_broad_question(context.question)
         
-        # 初始化PDF信息
         pdf_info = {
             'documents_found': len(documents),
             'is_broad_question': is_broad,
@@ -607,14 +1050,9 @@ class SemanticExpert:
         # 宽泛问题：不加载PDF
         if is_broad:
             logger.info("检测到宽泛问题，使用宽泛问题合成模板（不加载PDF）")
-            answer = self._synthesize_broad_answer(question, documents)
-            return {
-                'answer': answer,
-                'pdf_info': pdf_info
-            }
+            return pdf_info
         
         # 精确问题：加载PDF
-        pdf_contents = {}
         if load_pdf and self._pdf_manager:
             logger.info("\n" + "="*80)
             logger.info("📄 [步骤5] 加载PDF原文")
@@ -624,6 +1062,7 @@ class SemanticExpert:
             
             if dois:
                 pdf_contents = self._load_pdf_contents(dois)
+                context.pdf_contents = pdf_contents
                 pdf_info['pdf_loaded'] = len(pdf_contents)
                 pdf_info['pdf_failed'] = len(dois) - len(pdf_contents)
                 logger.info(f"\n正在加载PDF原文 (最多3篇):")
@@ -637,12 +1076,286 @@ class SemanticExpert:
                 logger.info("⚠️  未提取到DOI")
             logger.info("="*80)
         
-        answer = self._synthesize_semantic_answer(question, documents, pdf_contents)
+        return pdf_info
+    
+    def stream_answer(
+        self,
+        context: RetrievalContext,
+        is_broad: bool = False
+    ) -> Generator[str, None, None]:
+        """
+        流式合成答案，LLM每产出一段文本立即返回
+        
+        Args:
+            context: 检索上下文（需已完成检索，精确问题需已加载PDF）
+            is_broad: 是否为宽泛问题
+            
+        Yields:
+            答案文本块（未插入DOI）
+        """
+        if is_broad:
+            yield from self._stream_broad_answer(context.question, context.documents)
+        else:
+            yield from self._stream_semantic_answer(
+                context.question, context.documents, context.pdf_contents
+            )
+    
+    def finalize_answer(
+        self,
+        answer: str,
+        context: RetrievalContext,
+        is_broad: bool = False
+    ) -> str:
+        """
+        对流式生成的完整答案做后处理（精确问题程序化插入DOI）
+        
+        Args:
+            answer: 流式生成的完整答案
+            context: 检索上下文
+            is_broad: 是否为宽泛问题
+            
+        Returns:
+            最终答案
+        """
+        if is_broad or not self._llm or not self._semantic_synthesis_prompt:
+            return answer
+        try:
+            return self._insert_dois(answer.strip(), context.documents)
+        except Exception as e:
+            logger.error(f"DOI插入失败: {e}")
+            return answer
+    
+    async def aquery_with_details(
+        self,
+        question: str,
+        top_k: int = 20,
+        load_pdf: bool = True,
+        context: Optional[RetrievalContext] = None
+    ) -> Dict[str, Any]:
+        """
+        执行查询并返回详细信息（异步）
+        
+        Args:
+            question: 用户问题
+            top_k: 检索数量（未传入context时使用）
+            load_pdf: 是否加载PDF原文
+            context: 已完成的检索上下文
+            
+        Returns:
+            包含 answer 和 pdf_info 的字典
+        """
+        if context is None:
+            context = await self.aretrieve(question, top_k=top_k, with_scores=True)
+        
+        if not context.success:
+            return {
+                'answer': '检索失败',
+                'pdf_info': {'error': context.error}
+            }
+        
+        if not context.documents:
+            return {
+                'answer': '未找到相关文献。',
+                'pdf_info': {'documents_found': 0}
+            }
+        
+        pdf_info = await self.aload_context_pdfs(context, load_pdf=load_pdf)
+        is_broad = pdf_info['is_broad_question']
+        
+        try:
+            parts = [token async for token in self.astream_answer(context, is_broad=is_broad)]
+            answer = self.finalize_answer("".join(parts).strip(), context, is_broad=is_broad)
+        except Exception as e:
+            logger.error(f"答案合成失败: {e}")
+            answer = self._format_simple_answer(context.documents)
+        
         return {
             'answer': answer,
             'pdf_info': pdf_info
         }
     
+    async def aload_context_pdfs(
+        self,
+        context: RetrievalContext,
+        load_pdf: bool = True
+    ) -> Dict[str, Any]:
+        """加载PDF原文到检索上下文（异步，文件读取在线程池中执行）"""
+        return await asyncio.to_thread(self.load_context_pdfs, context, load_pdf)
+    
+    async def astream_answer(
+        self,
+        context: RetrievalContext,
+        is_broad: bool = False
+    ) -> AsyncGenerator[str, None]:
+        """
+        流式合成答案（异步）
+        
+        Args:
+            context: 检索上下文
+            is_broad: 是否为宽泛问题
+            
+        Yields:
+            答案文本块（未插入DOI）
+        """
+        documents = context.documents
+        if is_broad:
+            if not self._llm or not self._broad_question_prompt:
+                yield self._format_simple_answer(documents)
+                return
+            prompt = self._build_broad_prompt(context.question, documents)
+        else:
+            if not self._llm or not self._semantic_synthesis_prompt:
+                yield self._format_simple_answer(documents)
+                return
+            prompt = self._build_semantic_prompt(context.question, documents, context.pdf_contents)
+        
+        async for token in self._astream_llm(prompt, documents):
+            yield token
+    
+    def _build_semantic_prompt(
+        self,
+        user_question: str,
+        documents: List[Dict],
+        pdf_contents: Optional[Dict[str, str]] = None
+    ) -> str:
+        """构建精确问题的合成Prompt"""
+        # 构建文献列表
+        literature_list = []
+        for i, doc in enumerate(documents[:10], 1):
+            lit = {
+                "序号": i,
+                "内容": doc.get('content', '')[:500]
+            }
+            if doc.get('metadata'):
+                lit["元数据"] = doc['metadata']
+            literature_list.append(lit)
+        
+        literature_json = json.dumps(literature_list, ensure_ascii=False, indent=2)
+        
+        # 添加PDF原文
+        pdf_section = ""
+        if pdf_contents:
+            pdf_section = "\n\n## 📄 相关论文原文摘要\n"
+            for doi, content in pdf_contents.items():
+                pdf_section += f"\n### DOI: {doi}\n{content[:5000]}\n"
+        
+        prompt = self._semantic_synthesis_prompt.replace("{user_question}", user_question)
+        prompt = prompt.replace("{literature_results}", literature_json)
+        prompt = prompt.replace("{pdf_contents}", pdf_section if pdf_section else "无PDF原文")
+        
+        logger.info("\n" + "="*80)
+        logger.info("📋 [步骤6] 构建Prompt")
+        logger.info(f"文献摘要: {len(literature_list)} 篇")
+        logger.info(f"PDF原文: {len(pdf_contents) if pdf_contents else 0} 篇")
+        logger.info(f"Prompt长度: {len(prompt):,} 字符 (~{len(prompt)//4:,} tokens)")
+        logger.info(f"\nPrompt预览 (前200字):")
+        logger.info(prompt[:200] + "...")
+        logger.info("="*80)
+        
+        return prompt
+    
+    def _build_broad_prompt(self, user_question: str, documents: List[Dict]) -> str:
+        """构建宽泛问题的合成Prompt"""
+        # 提取文献摘要
+        summaries = []
+        for i, doc in enumerate(documents[:15], 1):
+            summaries.append({
+                "序号": i,
+                "摘要": doc.get('content', '')[:800]
+            })
+        
+        summaries_json = json.dumps(summaries, ensure_ascii=False, indent=2)
+        
+        prompt = self._broad_question_prompt.replace("{user_question}", user_question)
+        prompt = prompt.replace("{literature_summaries}", summaries_json)
+        return prompt
+    
+    def _stream_llm(self, prompt: str, documents: List[Dict]) -> Generator[str, None, None]:
+        """
+        调用 LLMService.stream 逐块产出文本
+        
+        尚未产出任何文本时失败则降级为简单格式化答案，
+        已产出部分文本后失败则向上抛出异常
+        """
+        from langchain_core.messages import HumanMessage
+        
+        logger.info("\n" + "="*80)
+        logger.info("🤖 [步骤7] 生成回答（流式）")
+        emitted = 0
+        try:
+            for chunk in self._llm.stream([HumanMessage(content=prompt)], profile="synthesis"):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if text:
+                    emitted += len(text)
+                    yield text
+        except Exception as e:
+            logger.error(f"LLM流式生成失败: {e}")
+            if emitted:
+                raise
+            yield self._format_simple_answer(documents)
+            return
+        logger.info(f"✅ LLM流式生成完成 ({emitted} 字符)")
+        logger.info("="*80)
+    
+    async def _astream_llm(self, prompt: str, documents: List[Dict]) -> AsyncGenerator[str, None]:
+        """调用 LLMService.astream 逐块产出文本（降级规则同 _stream_llm）"""
+        from langchain_core.messages import HumanMessage
+        
+        emitted = 0
+        try:
+            async for chunk in self._llm.astream([HumanMessage(content=prompt)], profile="synthesis"):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if text:
+                    emitted += len(text)
+                    yield text
+        except Exception as e:
+            logger.error(f"LLM流式生成失败: {e}")
+            if emitted:
+                raise
+            yield self._format_simple_answer(documents)
+            return
+        logger.info(f"✅ LLM流式生成完成 ({emitted} 字符)")
+    
+    def _stream_semantic_answer(
+        self,
+        user_question: str,
+        documents: List[Dict],
+        pdf_contents: Optional[Dict[str, str]] = None
+    ) -> Generator[str, None, None]:
+        """流式合成语义搜索答案（精确问题，不含DOI插入）"""
+        if not self._llm or not self._semantic_synthesis_prompt:
+            yield self._format_simple_answer(documents)
+            return
+        
+        prompt = self._build_semantic_prompt(user_question, documents, pdf_contents)
+        yield from self._stream_llm(prompt, documents)
+    
+    def _stream_broad_answer(
+        self,
+        user_question: str,
+        documents: List[Dict]
+    ) -> Generator[str, None, None]:
+        """流式合成宽泛问题答案"""
+        if not self._llm or not self._broad_question_prompt:
+            yield self._format_simple_answer(documents)
+            return
+        
+        prompt = self._build_broad_prompt(user_question, documents)
+        yield from self._stream_llm(prompt, documents)
+    
+    def _insert_dois(self, pure_answer: str, documents: List[Dict]) -> str:
+        """程序化插入DOI"""
+        logger.info("\n" + "="*80)
+        logger.info("📌 [步骤8] 程序化插入DOI")
+        search_result_for_insert = {
+            'documents': [doc.get('content', '') for doc in documents],
+            'metadatas': [doc.get('metadata', {}) for doc in documents],
+            'distances': [1.0 - doc.get('score', 0.5) for doc in documents]  # 转换回距离
+        }
+        answer_with_doi = self._doi_inserter.insert_dois(pure_answer, search_result_for_insert)
+        logger.info("="*80)
+        return answer_with_doi
+    
     def _synthesize_semantic_answer(
         self,
         user_question: str,
@@ -654,60 +1367,10 @@ class SemanticExpert:
             return self._format_simple_answer(documents)
         
         try:
-            # 构建文献列表
-            literature_list = []
-            for i, doc in enumerate(documents[:10], 1):
-                lit = {
-                    "序号": i,
-                    "内容": doc.get('content', '')[:500]
-                }
-                if doc.get('metadata'):
-                    lit["元数据"] = doc['metadata']
-                literature_list.append(lit)
-            
-            literature_json = json.dumps(literature_list, ensure_ascii=False, indent=2)
-            
-            # 添加PDF原文
-            pdf_section = ""
-            if pdf_contents:
-                pdf_section = "\n\n## 📄 相关论文原文摘要\n"
-                for doi, content in pdf_contents.items():
-                    pdf_section += f"\n### DOI: {doi}\n{content[:5000]}\n"
-            
-            prompt = self._semantic_synthesis_prompt.replace("{user_question}", user_question)
-            prompt = prompt.replace("{literature_results}", literature_json)
-            prompt = prompt.replace("{pdf_contents}", pdf_section if pdf_section else "无PDF原文")
-            
-            logger.info("\n" + "="*80)
-            logger.info("📋 [步骤6] 构建Prompt")
-            logger.info(f"文献摘要: {len(literature_list)} 篇")
-            logger.info(f"PDF原文: {len(pdf_contents) if pdf_contents else 0} 篇")
-            logger.info(f"Prompt长度: {len(prompt):,} 字符 (~{len(prompt)//4:,} tokens)")
-            logger.info(f"\nPrompt预览 (前200字):")
-            logger.info(prompt[:200] + "...")
-            logger.info("="*80)
-            
-            from langchain_core.messages import HumanMessage
-            
-            logger.info("\n" + "="*80)
-            logger.info("🤖 [步骤7] 生成回答")
-            response = self._llm.invoke([HumanMessage(content=prompt)])
-            pure_answer = response.content.strip()
-            logger.info(f"✅ LLM生成纯净答案完成 ({len(pure_answer)} 字符)")
-            logger.info("="*80)
-            
-            # 程序化插入DOI
-            logger.info("\n" + "="*80)
-            logger.info("📌 [步骤8] 程序化插入DOI")
-            search_result_for_insert = {
-                'documents': [doc.get('content', '') for doc in documents],
-                'metadatas': [doc.get('metadata', {}) for doc in documents],
-                'distances': [1.0 - doc.get('score', 0.5) for doc in documents]  # 转换回距离
-            }
-            answer_with_doi = self._doi_inserter.insert_dois(pure_answer, search_result_for_insert)
-            logger.info("="*80)
-            
-            return answer_with_doi
+            pure_answer = "".join(
+                self._stream_semantic_answer(user_question, documents, pdf_contents)
+            ).strip()
+            return self._insert_dois(pure_answer, documents)
             
         except Exception as e:
             logger.error(f"语义答案合成失败: {e}")
@@ -723,23 +1386,7 @@ class SemanticExpert:
             return self._format_simple_answer(documents)
         
         try:
-            # 提取文献摘要
-            summaries = []
-            for i, doc in enumerate(documents[:15], 1):
-                summaries.append({
-                    "序号": i,
-                    "摘要": doc.get('content', '')[:800]
-                })
-            
-            summaries_json = json.dumps(summaries, ensure_ascii=False, indent=2)
-            
-            prompt = self._broad_question_prompt.replace("{user_question}", user_question)
-            prompt = prompt.replace("{literature_summaries}", summaries_json)
-            
-            from langchain_core.messages import HumanMessage
-            
-            response = self._llm.invoke([HumanMessage(content=prompt)])
-            return response.content.strip()
+            return "".join(self._stream_broad_answer(user_question, documents)).strip()
             
         except Exception as e:
             logger.error(f"宽泛问题答案合成失败: {e}")
@@ -761,40 +1408,29 @@ class SemanticExpert:
         
         return answer
     
-    def query(self, question: str, load_pdf: bool = True) -> str:
+    def query(
+        self,
+        question: str,
+        load_pdf: bool = True,
+        context: Optional[RetrievalContext] = None
+    ) -> str:
         """执行查询并返回格式化的答案"""
-        result = self.search(question=question, top_k=20, with_scores=True)
+        if context is None:
+            context = self.retrieve(question, top_k=20, with_scores=True)
         
-        if not result.get('success'):
-            return f"搜索失败: {result.get('error', '未知错误')}"
+        if not context.success:
+            return f"搜索失败: {context.error or '未知错误'}"
         
-        documents = result.get('documents', [])
+        documents = context.documents
         
         if not documents:
             return "未找到相关文献。"
         
-        # 判断问题类型
-        is_broad = self._is_broad_question(question)
+        pdf_info = self.load_context_pdfs(context, load_pdf=load_pdf)
         
         # 宽泛问题：不加载PDF，使用宽泛问题模板
-        if is_broad:
-            logger.info("检测到宽泛问题，使用宽泛问题合成模板")
+        if pdf_info['is_broad_question']:
             return self._synthesize_broad_answer(question, documents)
         
-        # 精确问题：加载PDF，使用精确问题模板
-        pdf_contents = {}
-        if load_pdf and self._pdf_manager:
-            logger.info("\n" + "="*80)
-            logger.info("📄 [步骤5] 提取DOI并加载PDF原文")
-            dois = self._extract_dois(documents)
-            logger.info(f"提取到的DOI列表: {dois}")
-            if dois:
-                pdf_contents = self._load_pdf_contents(dois)
-                logger.info(f"✅ 成功加载 {len(pdf_contents)} 篇PDF")
-                for doi, content in pdf_contents.items():
-                    logger.info(f"  - {doi}: {len(content)} 字符")
-            else:
-                logger.info("⚠️  未提取到DOI")
-            logger.info("="*80)
-        
-        return self._synthesize_semantic_answer(question, documents, pdf_contents)
+        # 精确问题：已加载PDF，使用精确问题模板
+        return self._synthesize_semantic_answer(question, documents, context.pdf_contents)
@@ -4,12 +4,16 @@ Integrated Intelligent Agent with Auto-Routing
 """
 import os
 import logging
-from typing import Dict, Any, Optional, Generator
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Generator
 from dotenv import load_dotenv
 
+from backend.config.settings import settings
 from backend.agents.experts import RouterExpert, QueryExpert, SemanticExpert, CommunityExpert
 from backend.services import LLMService, Neo4jService, VectorService
 from backend.repositories.vector_repository import VectorRepository, CommunityVectorRepository
+from backend.models.entities import RetrievalContext
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -43,10 +47,11 @@ class IntegratedAgent:
         logger.info("📍 初始化路由专家...")
         self._router = RouterExpert(llm_service=self._llm_service)
         
-        # 2. 初始化专家系统（懒加载）
+        # 2. 初始化专家系统（懒加载，加锁保证并发的首批请求只创建一次仓储和数据库连接）
         self._query_expert = None
         self._semantic_expert = None
         self._community_expert = None
+        self._experts_lock = threading.RLock()
         
         logger.info("✅ 集成智能Agent初始化完成！\n")
     
@@ -54,47 +59,59 @@ class IntegratedAgent:
     def query_expert(self) -> QueryExpert:
         """懒加载精确查询专家"""
         if self._query_expert is None:
-            logger.info("📊 初始化精确查询专家...")
-            if self._neo4j_service is None:
-                from backend.services import get_neo4j_service
-                self._neo4j_service = get_neo4j_service()
-            self._query_expert = QueryExpert(
-                neo4j_service=self._neo4j_service,
-                llm_service=self._llm_service
-            )
+            with self._experts_lock:
+                if self._query_expert is None:
+                    logger.info("📊 初始化精确查询专家...")
+                    if self._neo4j_service is None:
+                        from backend.services import get_neo4j_service
+                        self._neo4j_service = get_neo4j_service()
+                    self._query_expert = QueryExpert(
+                        neo4j_service=self._neo4j_service,
+                        llm_service=self._llm_service
+                    )
         return self._query_expert
     
     @property
     def semantic_expert(self) -> SemanticExpert:
         """懒加载语义搜索专家"""
         if self._semantic_expert is None:
-            logger.info("📚 初始化语义搜索专家...")
-            vector_repo = VectorRepository()
-            self._semantic_expert = SemanticExpert(
-                vector_repo=vector_repo,
-                llm_service=self._llm_service
-            )
+            with self._experts_lock:
+                if self._semantic_expert is None:
+                    logger.info("📚 初始化语义搜索专家...")
+                    vector_repo = VectorRepository()
+                    self._semantic_expert = SemanticExpert(
+                        vector_repo=vector_repo,
+                        llm_service=self._llm_service
+                    )
         return self._semantic_expert
     
     @property
     def community_expert(self) -> CommunityExpert:
         """懒加载社区摘要专家"""
         if self._community_expert is None:
-            logger.info("🏘️ 初始化社区摘要专家...")
-            community_repo = CommunityVectorRepository()
-            self._community_expert = CommunityExpert(
-                community_repo=community_repo,
-                llm_service=self._llm_service
-            )
+            with self._experts_lock:
+                if self._community_expert is None:
+                    logger.info("🏘️ 初始化社区摘要专家...")
+                    community_repo = CommunityVectorRepository()
+                    self._community_expert = CommunityExpert(
+                        community_repo=community_repo,
+                        llm_service=self._llm_service
+                    )
         return self._community_expert
     
-    def query(self, user_question: str, auto_route: bool = True) -> Dict[str, Any]:
+    def query(
+        self,
+        user_question: str,
+        auto_route: bool = True,
+        speculative: Optional[bool] = None
+    ) -> Dict[str, Any]:
         """
         处理用户查询（带自动路由）
         
         Args:
             user_question: 用户问题
             auto_route: 是否自动路由
+            speculative: 是否推测式并行执行路由和检索，默认读取配置
             
         Returns:
             查询结果字典
@@ -108,9 +125,20 @@ class IntegratedAgent:
                 "user_question": user_question
             }
         
+        if speculative is None:
+            speculative = settings.speculative_routing
+        
+        speculation: Dict[str, Future] = {}
         try:
-            # 1. 路由决策
-            routing_result = self._router.route(user_question)
+            # 0. 推测执行：路由决策前先启动检索关键词/向量和Cypher生成
+            if speculative:
+                speculation = self._start_speculation(user_question)
+            
+            # 1. 路由决策（联合规划时同时得到检索关键词和Cypher）
+            if settings.joint_planning and not speculative:
+                routing_result = self._router.plan(user_question)
+            else:
+                routing_result = self._router.route(user_question)
             
             if not routing_result.get("success", True):
                 logger.warning(f"⚠️ 路由失败，使用降级策略")
@@ -122,25 +150,37 @@ class IntegratedAgent:
             logger.info(f"📍 路由决策: {expert_name} (置信度: {confidence:.2f})")
             logger.info(f"   理由: {reasoning}")
             
+            # 未被选中的推测分支：未启动的取消，已启动的结果丢弃
+            prefetched = self._collect_speculation(speculation, expert_name)
+            if prefetched is None:
+                prefetched = self._plan_prefetch(user_question, routing_result, expert_name)
+            
             # 2. 调用对应的专家系统
             if expert_name == "neo4j":
-                result = self._query_neo4j(user_question)
+                result = self._query_neo4j(user_question, cypher=prefetched)
             elif expert_name == "literature":
-                result = self._query_literature(user_question)
+                result = self._query_literature(user_question, context=prefetched)
             elif expert_name == "community":
                 result = self._query_community(user_question)
             else:
                 logger.warning(f"未知的专家系统: {expert_name}，使用文献专家")
-                result = self._query_literature(user_question)
+                result = self._query_literature(user_question, context=prefetched)
             
             # 3. 添加路由信息到结果中
             result["routing_info"] = routing_result
             result["expert_used"] = expert_name
+            if speculative:
+                result["speculation"] = {
+                    "branches": list(speculation.keys()),
+                    "used": prefetched is not None
+                }
             
             return result
             
         except Exception as e:
             logger.error(f"❌ 查询执行失败: {e}", exc_info=True)
+            for future in speculation.values():
+                future.cancel()
             return {
                 "success": False,
                 "error": str(e),
@@ -148,6 +188,114 @@ class IntegratedAgent:
                 "user_question": user_question
             }
     
+    def _plan_prefetch(
+        self,
+        question: str,
+        routing_result: Dict[str, Any],
+        expert_name: str
+    ) -> Any:
+        """
+        将联合规划结果转换为专家可直接使用的中间结果
+        
+        Args:
+            question: 用户问题
+            routing_result: 路由/规划结果
+            expert_name: 选中的专家
+            
+        Returns:
+            文献专家返回带关键词的检索上下文，Neo4j专家返回Cypher，其余返回None
+        """
+        if expert_name == "literature" and routing_result.get("search_query"):
+            return RetrievalContext(
+                question=question,
+                search_query=routing_result["search_query"],
+                top_k=20
+            )
+        if expert_name == "neo4j" and routing_result.get("cypher"):
+            return routing_result["cypher"]
+        return None
+    
+    def _speculation_plan(self, question: str) -> List[str]:
+        """
+        按关键词预判的专家排序推测分支，并按单请求LLM调用上限截断
+        
+        每个分支恰好消耗一次LLM调用（文献关键词 / Cypher生成）
+        """
+        predicted = self._router._fallback_routing(question)
+        branches = ["literature", "neo4j"]
+        if predicted == "neo4j":
+            branches.reverse()
+        return branches[:max(0, settings.speculative_max_llm_calls)]
+    
+    def _start_speculation(self, question: str) -> Dict[str, Future]:
+        """启动推测分支，进程内推测并发已满时跳过（负载保护）"""
+        futures: Dict[str, Future] = {}
+        for branch in self._speculation_plan(question):
+            if not _speculation_slots().acquire(blocking=False):
+                logger.info("⏭️ 推测并发已满，跳过剩余推测分支")
+                break
+            future = _speculation_executor().submit(self._run_speculative_branch, branch, question)
+            future.add_done_callback(lambda _: _speculation_slots().release())
+            futures[branch] = future
+        if futures:
+            logger.info(f"🔮 推测执行分支: {list(futures.keys())}")
+        return futures
+    
+    def _run_speculative_branch(self, branch: str, question: str) -> Any:
+        """执行单个推测分支，返回可交给专家复用的中间结果"""
+        if branch == "literature":
+            context = RetrievalContext(question=question, top_k=20)
+            self.semantic_expert.prepare_context(context)
+            self.semantic_expert.embed_context(context)
+            return context
+        if branch == "neo4j":
+            query_expert = self.query_expert
+            if not query_expert.can_handle(question):
+                return None
+            return query_expert.generate_cypher(question)
+        return None
+    
+    def _collect_speculation(self, speculation: Dict[str, Future], expert_name: str) -> Any:
+        """
+        取出被路由选中分支的结果，丢弃其余分支
+        
+        选中分支抛出异常，或返回失败的检索上下文（如生成查询向量失败）时返回None，
+        由调用方改为同步执行；失败上下文中已生成的检索关键词保留复用
+        """
+        selected = speculation.get(expert_name)
+        for branch, future in speculation.items():
+            if future is not selected:
+                if future.cancel():
+                    logger.info(f"🗑️ 取消推测分支: {branch}")
+                else:
+                    logger.info(f"🗑️ 丢弃推测分支结果: {branch}")
+        if selected is None:
+            return None
+        try:
+            return self._usable_speculation(selected.result())
+        except Exception as e:
+            logger.warning(f"⚠️ 推测分支执行失败，改为同步执行: {e}")
+            return None
+    
+    @staticmethod
+    def _usable_speculation(result: Any) -> Any:
+        """
+        检查选中分支的结果能否交给专家复用
+        
+        失败的检索上下文（如生成查询向量失败）不直接交给专家，
+        只保留已生成的检索关键词，其余步骤同步重新执行
+        """
+        if not isinstance(result, RetrievalContext) or result.success:
+            return result
+        logger.warning(f"⚠️ 推测分支执行失败，改为同步执行: {result.error}")
+        if not result.search_query:
+            return None
+        return RetrievalContext(
+            question=result.question,
+            search_query=result.search_query,
+            top_k=result.top_k
+        )
+    
     def query_stream(self, user_question: str) -> Generator[Dict[str, Any], None, None]:
         """
         流式处理用户查询
@@ -170,14 +318,17 @@ class IntegratedAgent:
                 "status": "processing"
             }
             
+            # 检索上下文：关键词、查询向量和检索结果每个问题只计算一次
             try:
-                search_query = self.semantic_expert.generate_search_query(user_question)
+                context = self.semantic_expert.prepare_context(
+                    RetrievalContext(question=user_question, top_k=20)
+                )
                 yield {
                     "type": "step",
                     "step": "generate_keywords",
-                    "message": f"✅ 搜索关键词: {search_query}",
+                    "message": f"✅ 搜索关键词: {context.search_query}",
                     "status": "success",
-                    "data": {"keywords": search_query}
+                    "data": {"keywords": context.search_query}
                 }
             except Exception as e:
                 yield {
@@ -187,7 +338,11 @@ class IntegratedAgent:
                     "status": "warning",
                     "error": str(e)
                 }
-                search_query = user_question
+                context = RetrievalContext(
+                    question=user_question,
+                    search_query=user_question,
+                    top_k=20
+                )
             
             # 步骤2: 调用BGE API生成向量
             yield {
@@ -197,69 +352,37 @@ class IntegratedAgent:
                 "status": "processing"
             }
             
-            # 步骤3: 查询向量数据库
-            yield {
-                "type": "step",
-                "step": "query_vector_db",
-                "message": "🔍 正在查询向量数据库...",
-                "status": "processing"
-            }
-            
-            # 执行文献检索
-            search_result = self.semantic_expert.search(user_question, top_k=20, with_scores=True)
-            
-            if not search_result.get('success'):
-                error_step = search_result.get('error_step', 'unknown')
-                error_msg = search_result.get('error', '未知错误')
+            if self.semantic_expert.embed_context(context):
+                yield {
+                    "type": "step",
+                    "step": "generate_embedding",
+                    "message": "✅ 查询向量生成成功",
+                    "status": "success"
+                }
                 
-                # 根据错误步骤返回友好提示
-                if error_step == 'generate_embedding':
-                    yield {
-                        "type": "step",
-                        "step": "generate_embedding",
-                        "message": f"❌ BGE API调用失败: {error_msg}",
-                        "status": "error",
-                        "error": error_msg
-                    }
-                    yield {
-                        "type": "error",
-                        "error": "BGE embedding服务不可用,请检查API连接",
-                        "details": error_msg
-                    }
-                elif error_step == 'vector_search':
-                    yield {
-                        "type": "step",
-                        "step": "query_vector_db",
-                        "message": f"❌ 向量数据库查询失败: {error_msg}",
-                        "status": "error",
-                        "error": error_msg
-                    }
-                    yield {
-                        "type": "error",
-                        "error": "向量数据库查询失败",
-                        "details": error_msg
-                    }
-                else:
-                    yield {
-                        "type": "error",
-                        "error": f"搜索失败: {error_msg}",
-                        "details": error_msg
-                    }
-                # 发送完成信号,即使出错也要结束流
-                yield {"type": "done", "references": [], "metadata": {}}
+                # 步骤3: 查询向量数据库
+                yield {
+                    "type": "step",
+                    "step": "query_vector_db",
+                    "message": "🔍 正在查询向量数据库...",
+                    "status": "processing"
+                }
+                
+                # 执行文献检索
+                try:
+                    self.semantic_expert.search_context(context, with_scores=True)
+                except Exception as e:
+                    logger.error(f"语义搜索失败: {e}")
+                    context.error = str(e)
+                    context.error_step = "search"
+            
+            if not context.success:
+                yield from self._retrieval_error_events(context)
                 return
             
-            documents = search_result.get('documents', [])
+            documents = context.documents
             doc_count = len(documents)
             
-            # BGE API 和向量查询成功
-            yield {
-                "type": "step",
-                "step": "generate_embedding",
-                "message": "✅ 查询向量生成成功",
-                "status": "success"
-            }
-            
             yield {
                 "type": "step",
                 "step": "query_vector_db",
@@ -282,7 +405,7 @@ class IntegratedAgent:
                 yield {"type": "done", "references": [], "metadata": {}}
                 return
             
-            # 步骤4: 构建Prompt
+            # 步骤4: 构建Prompt（精确问题先加载PDF原文）
             yield {
                 "type": "step",
                 "step": "build_prompt",
@@ -290,7 +413,29 @@ class IntegratedAgent:
                 "status": "processing"
             }
             
-            # 步骤5: 调用LLM生成答案
+            pdf_info = self.semantic_expert.load_context_pdfs(context, load_pdf=True)
+            is_broad = pdf_info.get('is_broad_question', False)
+            
+            yield from self._pdf_info_events(pdf_info)
+            
+            yield {
+                "type": "step",
+                "step": "build_prompt",
+                "message": "✅ 提示词构建完成",
+                "status": "success"
+            }
+            
+            # 引用和检索信息在生成开始前发送
+            references = self._build_references(context)
+            metadata = self._retrieval_metadata(context, pdf_info)
+            yield {
+                "type": "metadata",
+                "expert": "literature",
+                "references": references,
+                "retrieval": metadata
+            }
+            
+            # 步骤5: 调用LLM生成答案（逐token转发）
             yield {
                 "type": "step",
                 "step": "call_llm",
@@ -298,80 +443,11 @@ class IntegratedAgent:
                 "status": "processing"
             }
             
-            # 初始化结果
-            answer = ""
-            references = []
-            metadata = {}
-            
-            # 执行完整查询生成答案
+            answer_parts = []
             try:
-                result = self._query_literature(user_question)
-                
-                if not result.get("success"):
-                    yield {
-                        "type": "step",
-                        "step": "call_llm",
-                        "message": f"❌ LLM调用失败: {result.get('error', '未知错误')}",
-                        "status": "error",
-                        "error": result.get('error')
-                    }
-                    yield {
-                        "type": "error",
-                        "error": "LLM答案生成失败",
-                        "details": result.get('error', '未知错误')
-                    }
-                    # 发送完成信号
-                    yield {"type": "done", "references": [], "metadata": {}}
-                    return
-                
-                answer = result.get("answer", "")
-                references = result.get("references", [])
-                metadata = result.get("metadata", {})
-                pdf_info = result.get("pdf_info", {})
-                
-                # 显示PDF加载信息（不显示失败数量）
-                if pdf_info:
-                    pdf_loaded = pdf_info.get('pdf_loaded', 0)
-                    dois_found = pdf_info.get('dois_found', 0)
-                    
-                    if pdf_loaded > 0:
-                        yield {
-                            "type": "step",
-                            "step": "load_pdf",
-                            "message": f"📄 已加载 {pdf_loaded} 篇PDF原文传给LLM",
-                            "status": "success",
-                            "data": pdf_info
-                        }
-                    elif dois_found > 0:
-                        yield {
-                            "type": "step",
-                            "step": "load_pdf",
-                            "message": "⚠️ 找到DOI但未能加载PDF原文",
-                            "status": "warning",
-                            "data": pdf_info
-                        }
-                    else:
-                        yield {
-                            "type": "step",
-                            "step": "load_pdf",
-                            "message": "⚠️ 文献中未找到DOI，仅使用摘要",
-                            "status": "warning"
-                        }
-                
-                yield {
-                    "type": "step",
-                    "step": "build_prompt",
-                    "message": "✅ 提示词构建完成",
-                    "status": "success"
-                }
-                
-                yield {
-                    "type": "step",
-                    "step": "call_llm",
-                    "message": "✅ LLM响应成功",
-                    "status": "success"
-                }
-                
+                for token in self.semantic_expert.stream_answer(context, is_broad=is_broad):
+                    answer_parts.append(token)
+                    yield {"type": "content", "content": token}
             except Exception as e:
                 logger.error(f"答案生成失败: {e}", exc_info=True)
                 yield {
@@ -387,28 +463,35 @@ class IntegratedAgent:
                     "details": str(e)
                 }
                 # 发送完成信号
-                yield {"type": "done", "references": [], "metadata": {}}
+                yield {"type": "done", "references": references, "metadata": metadata}
                 return
             
-            # 3. 流式输出答案（分块）
-            if answer:
-                chunk_size = 50  # 每50个字符一块
-                for i in range(0, len(answer), chunk_size):
-                    chunk = answer[i:i+chunk_size]
-                    yield {"type": "content", "content": chunk}
-            else:
+            answer = "".join(answer_parts)
+            if not answer.strip():
                 # 答案为空时也要发送内容和完成信号
                 yield {
                     "type": "content",
                     "content": "抱歉,虽然找到了相关文献,但未能生成完整的答案。请尝试重新提问或换个角度描述您的问题。"
                 }
             
-            # 4. 发送完成信号
             yield {
+                "type": "step",
+                "step": "call_llm",
+                "message": "✅ LLM响应成功",
+                "status": "success"
+            }
+            
+            # 发送完成信号（精确问题附带插入DOI后的最终答案）
+            done = {
                 "type": "done",
                 "references": references,
                 "metadata": metadata
             }
+            if answer.strip():
+                final_answer = self.semantic_expert.finalize_answer(answer, context, is_broad=is_broad)
+                if final_answer != answer:
+                    done["final_answer"] = final_answer
+            yield done
             
         except Exception as e:
             logger.error(f"❌ 流式查询失败: {e}", exc_info=True)
@@ -416,11 +499,119 @@ class IntegratedAgent:
             # 确保发送完成信号
             yield {"type": "done", "references": [], "metadata": {}}
     
-    def _query_neo4j(self, question: str) -> Dict[str, Any]:
+    def _step_event(
+        self,
+        step: str,
+        message: str,
+        status: str,
+        **extra: Any
+    ) -> Dict[str, Any]:
+        """构建步骤进度事件"""
+        event = {
+            "type": "step",
+            "step": step,
+            "message": message,
+            "status": status
+        }
+        event.update(extra)
+        return event
+    
+    def _retrieval_error_events(self, context: RetrievalContext) -> List[Dict[str, Any]]:
+        """根据检索失败的步骤构建友好的错误事件（含完成信号）"""
+        error_step = context.error_step or 'unknown'
+        error_msg = context.error or '未知错误'
+        
+        if error_step == 'generate_embedding':
+            events = [
+                {
+                    "type": "step",
+                    "step": "generate_embedding",
+                    "message": f"❌ BGE API调用失败: {error_msg}",
+                    "status": "error",
+                    "error": error_msg
+                },
+                {
+                    "type": "error",
+                    "error": "BGE embedding服务不可用,请检查API连接",
+                    "details": error_msg
+                }
+            ]
+        elif error_step == 'vector_search':
+            events = [
+                {
+                    "type": "step",
+                    "step": "query_vector_db",
+                    "message": f"❌ 向量数据库查询失败: {error_msg}",
+                    "status": "error",
+                    "error": error_msg
+                },
+                {
+                    "type": "error",
+                    "error": "向量数据库查询失败",
+                    "details": error_msg
+                }
+            ]
+        else:
+            events = [
+                {
+                    "type": "error",
+                    "error": f"搜索失败: {error_msg}",
+                    "details": error_msg
+                }
+            ]
+        # 发送完成信号,即使出错也要结束流
+        events.append({"type": "done", "references": [], "metadata": {}})
+        return events
+    
+    def _pdf_info_events(self, pdf_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """构建PDF加载信息事件（宽泛问题不加载PDF，不显示失败数量）"""
+        if pdf_info.get('is_broad_question'):
+            return []
+        
+        pdf_loaded = pdf_info.get('pdf_loaded', 0)
+        dois_found = pdf_info.get('dois_found', 0)
+        
+        if pdf_loaded > 0:
+            return [{
+                "type": "step",
+                "step": "load_pdf",
+                "message": f"📄 已加载 {pdf_loaded} 篇PDF原文传给LLM",
+                "status": "success",
+                "data": pdf_info
+            }]
+        if dois_found > 0:
+            return [{
+                "type": "step",
+                "step": "load_pdf",
+                "message": "⚠️ 找到DOI但未能加载PDF原文",
+                "status": "warning",
+                "data": pdf_info
+            }]
+        return [{
+            "type": "step",
+            "step": "load_pdf",
+            "message": "⚠️ 文献中未找到DOI，仅使用摘要",
+            "status": "warning"
+        }]
+    
+    def _retrieval_metadata(
+        self,
+        context: RetrievalContext,
+        pdf_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """构建随流发送的检索元数据"""
+        return {
+            "keywords": context.search_query,
+            "result_count": len(context.documents),
+            "original_count": len(context.raw_documents),
+            "pdf_info": pdf_info
+        }
+    
+    def _query_neo4j(self, question: str, cypher: Optional[str] = None) -> Dict[str, Any]:
         """使用Neo4j知识图谱查询"""
         logger.info("🗃️ 使用Neo4j知识图谱查询...")
         try:
-            result = self.query_expert.execute_query(question)
+            result = self.query_expert.execute_query(question, cypher=cypher)
             result["expert_used"] = "neo4j"
             return result
         except Exception as e:
@@ -431,33 +622,44 @@ class IntegratedAgent:
                 "expert_used": "neo4j"
             }
     
-    def _query_literature(self, question: str, n_results: int = 10) -> Dict[str, Any]:
-        """使用文献语义搜索"""
+    def _query_literature(
+        self,
+        question: str,
+        n_results: int = 10,
+        context: Optional[RetrievalContext] = None
+    ) -> Dict[str, Any]:
+        """
+        使用文献语义搜索
+        
+        Args:
+            question: 用户问题
+            n_results: 引用候选数量
+            context: 已完成的检索上下文，未传入时在此执行一次检索
+            
+        Returns:
+            查询结果
+        """
         logger.info("\n" + "="*80)
         logger.info("📝 [步骤1] 用户提问")
         logger.info(f"问题: {question}")
         logger.info("="*80)
         try:
-            # 使用query()方法，会调用LLM生成综合答案（RAG模式）
+            # 检索只执行一次，合成答案与引用构建共用同一份结果
+            if context is None or not context.searched:
+                context = self.semantic_expert.retrieve(
+                    question, top_k=20, with_scores=True, context=context
+                )
+            
+            # 使用query_with_details()方法，会调用LLM生成综合答案（RAG模式）
             # 返回值中包含pdf_info信息
-            query_result = self.semantic_expert.query_with_details(question, load_pdf=True)
+            query_result = self.semantic_expert.query_with_details(
+                question, load_pdf=True, context=context
+            )
             answer = query_result.get('answer', '')
             pdf_info = query_result.get('pdf_info', {})
             
-            # 同时获取检索结果以提取引用
-            search_result = self.semantic_expert.search(question, top_k=n_results, with_scores=True)
-            
             # 提取文献引用（包含相似度）
-            references = []
-            if search_result.get('success') and search_result.get('documents'):
-                for doc in search_result['documents'][:5]:  # 取前5篇作为引用
-                    metadata = doc.get('metadata', {})
-                    ref = {
-                        'doi': metadata.get('DOI', metadata.get('doi', '')),
-                        'title': metadata.get('title', ''),
-                        'similarity': doc.get('score')  # 添加相似度分数
-                    }
-                    references.append(ref)
+            references = self._build_references(context, n_results)
             
             return {
                 "success": True,
@@ -474,6 +676,25 @@ class IntegratedAgent:
                 "expert_used": "literature"
             }
     
+    def _build_references(
+        self,
+        context: RetrievalContext,
+        n_results: int = 10,
+        max_references: int = 5
+    ) -> List[Dict[str, Any]]:
+        """从检索上下文构建文献引用（取前n_results条中的前5篇）"""
+        references = []
+        if not context.success:
+            return references
+        for doc in context.documents[:n_results][:max_references]:
+            metadata = doc.get('metadata', {})
+            references.append({
+                'doi': metadata.get('DOI', metadata.get('doi', '')),
+                'title': metadata.get('title', ''),
+                'similarity': doc.get('score')  # 添加相似度分数
+            })
+        return references
+    
     def _query_community(self, question: str, n_results: int = 5) -> Dict[str, Any]:
         """使用社区摘要分析"""
         logger.info("🏘️ 使用社区摘要分析...")
@@ -524,6 +745,33 @@ class IntegratedAgent:
             }
 
 
+# 推测执行的共享线程池和进程内并发上限（懒加载）
+_speculation_pool: Optional[ThreadPoolExecutor] = None
+_speculation_semaphore: Optional[threading.BoundedSemaphore] = None
+_speculation_lock = threading.Lock()
+
+
+def _speculation_executor() -> ThreadPoolExecutor:
+    """获取推测执行线程池"""
+    global _speculation_pool
+    with _speculation_lock:
+        if _speculation_pool is None:
+            _speculation_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.speculative_max_inflight),
+                thread_name_prefix="speculative"
+            )
+    return _speculation_pool
+
+
+def _speculation_slots() -> threading.BoundedSemaphore:
+    """获取推测分支并发信号量"""
+    global _speculation_semaphore
+    with _speculation_lock:
+        if _speculation_semaphore is None:
+            _speculation_semaphore = threading.BoundedSemaphore(max(1, settings.speculative_max_inflight))
+    return _speculation_semaphore
+
+
 # 全局单例
 _integrated_agent: Optional[IntegratedAgent] = None
 
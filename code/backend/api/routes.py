@@ -12,9 +12,12 @@ from backend.config.settings import settings
 from backend.services.llm_service import LLMService
 from backend.services.neo4j_service import Neo4jService
 from backend.services.vector_service import VectorService
+from backend.services.embedding_cache import get_embedding_cache
+from backend.services.embedding_client import get_embedding_client
+from backend.services.reranker import get_reranker
 from backend.agents.experts import RouterExpert, QueryExpert, SemanticExpert
 from backend.models import (
-    QueryRequest, RouteRequest, SearchParams,
+    QueryRequest, RouteRequest, SearchParams, BatchSearchParams,
     QueryResponse, RouteResponse, SearchResponse,
     ErrorResponse
 )
@@ -91,6 +94,8 @@ def ask_stream():
     """
     问答流式接口 (SSE格式) - 使用 IntegratedAgent
     
+    ASYNC_AGENT=True 时改用 AsyncIntegratedAgent，在进程内共享的后台事件循环中执行
+    
     流程:
     1. 用户提问
     2. IntegratedAgent 自动路由到合适的专家
@@ -115,16 +120,20 @@ def ask_stream():
     
     def generate():
         try:
-            # 获取 IntegratedAgent
-            from backend.agents.integrated_agent import get_integrated_agent
-            integrated_agent = get_integrated_agent()
+            # 获取 IntegratedAgent（异步模式下为 AsyncIntegratedAgent）
+            if settings.async_agent:
+                from backend.agents.async_integrated_agent import get_async_integrated_agent, stream_in_background
+                chunks = stream_in_background(get_async_integrated_agent().aquery_stream(question))
+            else:
+                from backend.agents.integrated_agent import get_integrated_agent
+                chunks = get_integrated_agent().query_stream(question)
             
             # 发送开始信号
             start_data = json.dumps({'type': 'start', 'message': '开始处理问题'}, ensure_ascii=False)
             yield f"data: {start_data}\n\n"
             
-            # 使用 IntegratedAgent 流式查询
-            for chunk in integrated_agent.query_stream(question):
+            # 流式查询
+            for chunk in chunks:
                 chunk_data = json.dumps(chunk, ensure_ascii=False)
                 yield f"data: {chunk_data}\n\n"
             
@@ -296,7 +305,7 @@ def translate():
                 ]
                 
                 # 调用LLM
-                response = llm_service.invoke(messages)
+                response = llm_service.invoke(messages, profile="translate")
                 translation = response.content.strip()
                 translations.append(translation)
                 
@@ -545,6 +554,46 @@ def search_documents():
         ).to_dict()), 500
 
 
+@api.route('/search/batch', methods=['POST'])
+def search_documents_batch():
+    """批量语义搜索（一次Embedding调用 + 一次向量检索）"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify(ErrorResponse(
+                error="请求体不能为空",
+                code="INVALID_REQUEST"
+            ).to_dict()), 400
+        
+        params = BatchSearchParams(
+            queries=data.get('queries', []),
+            top_k=data.get('top_k', 10),
+            filters=data.get('filters')
+        )
+        errors = params.validate()
+        if errors:
+            return jsonify(ErrorResponse(
+                error="; ".join(errors),
+                code="VALIDATION_ERROR"
+            ).to_dict()), 400
+        
+        services = get_services()
+        result = services['vector'].search_literature_batch(
+            params.queries,
+            top_k=params.top_k,
+            filters=params.filters
+        )
+        
+        return jsonify(result), 200 if result.get('success') else 500
+        
+    except Exception as e:
+        logger.error(f"批量搜索失败: {e}")
+        return jsonify(ErrorResponse(
+            error=str(e),
+            code="SEARCH_ERROR"
+        ).to_dict()), 500
+
+
 # ============== 聚合知识端点 ==============
 
 @api.route('/aggregate', methods=['POST'])
@@ -595,17 +644,23 @@ def get_stats():
         
         literature_stats = services['vector'].get_collection_stats('literature')
         community_stats = services['vector'].get_collection_stats('community')
+        embedding_cache = get_embedding_cache()
+        reranker = get_reranker()
         
         return jsonify({
             "success": True,
             "statistics": {
                 "literature": {
-                    "count": literature_stats.get('count', 0)
+                    "count": literature_stats.get('count', 0),
+                    "memory_index": literature_stats.get('memory_index')
                 },
                 "community": {
                     "count": community_stats.get('count', 0)
                 }
-            }
+            },
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "embedding_client": get_embedding_client().stats(),
+            "reranker": reranker.stats() if reranker else None
         })
         
     except Exception as e:
@@ -13,6 +13,7 @@ COMMUNITY_VECTOR_DB_PATH_STR = "/Users/zhuyinghua/Desktop/agent/main/vector_db"
 DOI_TO_PDF_MAPPING_STR = "/Users/zhuyinghua/Desktop/agent/main/code/backend/doi_to_pdf_mapping.json"
 LOGS_DIR_STR = "/Users/zhuyinghua/Desktop/agent/main/logs"
 TRANSLATION_CACHE_DIR_STR = "/Users/zhuyinghua/Desktop/agent/main/translation_cache"
+EMBEDDING_CACHE_PATH_STR = "/Users/zhuyinghua/Desktop/agent/main/embedding_cache/query_embeddings.sqlite"
 STATIC_DIR_STR = "/Users/zhuyinghua/Desktop/agent/main/static"
 
 # Linux 路径 (迁移时取消注释并注释掉上面的 macOS 路径)
@@ -24,4 +25,5 @@ STATIC_DIR_STR = "/Users/zhuyinghua/Desktop/agent/main/static"
 # DOI_TO_PDF_MAPPING_STR = "/home/your_user/agent/main/code/backend/doi_to_pdf_mapping.json"
 # LOGS_DIR_STR = "/home/your_user/agent/main/logs"
 # TRANSLATION_CACHE_DIR_STR = "/home/your_user/agent/main/translation_cache"
+# EMBEDDING_CACHE_PATH_STR = "/home/your_user/agent/main/embedding_cache/query_embeddings.sqlite"
 # STATIC_DIR_STR = "/home/your_user/agent/main/static"
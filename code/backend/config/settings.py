@@ -3,13 +3,15 @@
 """
 import os
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Optional, Dict, Any, List
 from pathlib import Path
 from .paths import (
     PAPERS_DIR_STR,
     VECTOR_DATABASE_PATH_STR,
     COMMUNITY_VECTOR_DB_PATH_STR,
     DOI_TO_PDF_MAPPING_STR,
+    LOGS_DIR_STR,
+    EMBEDDING_CACHE_PATH_STR,
 )
 
 
@@ -56,6 +58,32 @@ class Settings:
             "VECTOR_DB_PATH",
             VECTOR_DATABASE_PATH_STR
         )
+        # 文献集合的进程内精确索引（可选，默认关闭；全部向量常驻内存，检索不经过 ChromaDB HNSW）
+        self.vector_memory_index: bool = os.getenv("VECTOR_MEMORY_INDEX", "False").lower() == "true"
+        self.vector_memory_index_refresh_interval: float = float(os.getenv("VECTOR_MEMORY_INDEX_REFRESH_INTERVAL", "5"))
+        self.vector_memory_index_max_rows: int = int(os.getenv("VECTOR_MEMORY_INDEX_MAX_ROWS", "200000"))
+        # 混合检索（可选，默认关闭，依赖内存向量索引）：BM25 关键词检索与向量检索按倒数排名融合（RRF）
+        self.hybrid_search: bool = os.getenv("HYBRID_SEARCH", "False").lower() == "true"
+        self.hybrid_rrf_k: int = int(os.getenv("HYBRID_RRF_K", "60"))
+        self.hybrid_lexical_top_k: int = int(os.getenv("HYBRID_LEXICAL_TOP_K", "20"))
+        # 关键词结果豁免相似度阈值的 BM25 得分下限（<=0 时只豁免命中字母数字/化学式术语的结果）
+        self.hybrid_lexical_score_floor: float = float(os.getenv("HYBRID_LEXICAL_SCORE_FLOOR", "0"))
+        # 结果多样化（可选，默认关闭）：多取候选后按 DOI 分组做 MMR，同一论文最多保留若干切片，总数仍为 top_k
+        self.diversity_selection: bool = os.getenv("DIVERSITY_SELECTION", "False").lower() == "true"
+        self.diversity_overfetch: int = int(os.getenv("DIVERSITY_OVERFETCH", "3"))
+        self.diversity_mmr_lambda: float = float(os.getenv("DIVERSITY_MMR_LAMBDA", "0.7"))
+        self.diversity_chunks_per_doi: int = int(os.getenv("DIVERSITY_CHUNKS_PER_DOI", "1"))
+        # 交叉编码器重排序（默认关闭）：按延迟预算估算可重排的候选数，一次批量前向打分，预算不足时跳过
+        self.reranker_enabled: bool = os.getenv("RERANKER_ENABLED", "False").lower() == "true"
+        self.reranker_model: str = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+        self.reranker_device: str = os.getenv("RERANKER_DEVICE", "cpu")
+        self.reranker_max_length: int = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+        self.reranker_budget_ms: float = float(os.getenv("RERANKER_BUDGET_MS", "300"))
+        self.reranker_ms_per_pair: float = float(os.getenv("RERANKER_MS_PER_PAIR", "20"))
+        self.reranker_min_candidates: int = int(os.getenv("RERANKER_MIN_CANDIDATES", "4"))
+        self.reranker_top_n: int = int(os.getenv("RERANKER_TOP_N", "0"))
+        # 构建脚本导出的 mmap 快照目录（每个集合一个子目录），多个 worker 共享同一份页缓存；默认为空，不使用
+        self.vector_snapshot_dir: str = os.getenv("VECTOR_SNAPSHOT_DIR", "")
         self.community_vector_db_path: str = os.getenv(
             "COMMUNITY_VECTOR_DB_PATH",
             COMMUNITY_VECTOR_DB_PATH_STR
@@ -70,6 +98,34 @@ class Settings:
             "BGE_API_URL",
             "http://172.18.8.31:8001/v1/embeddings"
         )
+        # 多个BGE服务地址（逗号分隔），客户端负载均衡；未设置时只使用 BGE_API_URL
+        self.bge_api_urls: List[str] = [
+            url.strip() for url in os.getenv("BGE_API_URLS", "").split(",") if url.strip()
+        ] or [self.bge_api_url]
+        self.embedding_lb_strategy: str = os.getenv("EMBEDDING_LB_STRATEGY", "p2c").lower()  # p2c/least
+        self.embedding_health_interval: float = float(os.getenv("EMBEDDING_HEALTH_INTERVAL", "5"))
+        self.embedding_model_name: str = os.getenv("EMBEDDING_MODEL_NAME", "bge-large-zh-v1.5")
+        
+        # Embedding后端：http=调用BGE服务，local=进程内加载模型
+        self.embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "http").lower()
+        self.embedding_local_model: str = os.getenv("EMBEDDING_LOCAL_MODEL", self.bge_model_path)
+        self.embedding_local_device: str = os.getenv("EMBEDDING_LOCAL_DEVICE", "cpu")
+        self.embedding_local_runtime: str = os.getenv("EMBEDDING_LOCAL_RUNTIME", "torch").lower()  # torch/onnx
+        
+        # Embedding客户端（连接池、并发请求合批、重试退避）
+        self.embedding_timeout: float = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+        self.embedding_max_retries: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+        self.embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        self.embedding_batch_window_ms: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+        self.embedding_pool_size: int = int(os.getenv("EMBEDDING_POOL_SIZE", "8"))
+        # 响应编码：float（JSON数组）/ base64（float32）/ base64_float16
+        self.embedding_encoding_format: str = os.getenv("EMBEDDING_ENCODING_FORMAT", "base64").lower()
+        
+        # 查询向量缓存（内存LRU + SQLite持久化）
+        self.embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+        self.embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", EMBEDDING_CACHE_PATH_STR)
+        self.embedding_cache_memory_size: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "2048"))
+        self.embedding_cache_max_rows: int = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "100000"))
         
         # PDF存储路径
         self.papers_dir: str = os.getenv(
@@ -86,9 +142,37 @@ class Settings:
         # 其他配置
         self.llm_temperature: float = float(os.getenv("LLM_TEMPERATURE", "0.5"))
         self.llm_max_tokens: int = int(os.getenv("LLM_MAX_TOKENS", "4096"))
+        
+        # LLM分级配置：控制步骤（路由/关键词/Cypher）用低延迟模型，答案综合用强模型
+        # 未单独配置的模型沿用 llm_model
+        self.llm_profiles: Dict[str, Dict[str, Any]] = {
+            "fast": self._llm_profile("FAST", max_tokens=1024, timeout=20.0),
+            "synthesis": self._llm_profile("SYNTHESIS", max_tokens=self.llm_max_tokens, timeout=60.0),
+            "translate": self._llm_profile("TRANSLATE", max_tokens=2048, timeout=30.0),
+        }
         self.similarity_threshold_broad: float = float(os.getenv("SIMILARITY_THRESHOLD_BROAD", "0.3"))
         self.similarity_threshold_precise: float = float(os.getenv("SIMILARITY_THRESHOLD_PRECISE", "0.3"))
         
+        # 联合规划：一次LLM调用同时完成路由、检索关键词和Cypher生成（默认关闭，使用原有路由提示词）
+        self.joint_planning: bool = os.getenv("JOINT_PLANNING", "False").lower() == "true"
+        
+        # 异步执行路径：/ask_stream 改由 AsyncIntegratedAgent 在进程内共享的事件循环中处理（默认关闭）
+        self.async_agent: bool = os.getenv("ASYNC_AGENT", "False").lower() == "true"
+        
+        # 推测式并行路由配置（路由LLM调用与检索/Cypher生成并发执行）
+        self.speculative_routing: bool = os.getenv("SPECULATIVE_ROUTING", "False").lower() == "true"
+        self.speculative_max_llm_calls: int = int(os.getenv("SPECULATIVE_MAX_LLM_CALLS", "2"))  # 单请求推测LLM调用上限
+        self.speculative_max_inflight: int = int(os.getenv("SPECULATIVE_MAX_INFLIGHT", "8"))  # 进程内并发推测分支上限
+        
+        # 本地路由配置（基于BGE向量的最近质心分类，置信度达标时跳过路由LLM）
+        self.local_router_enabled: bool = os.getenv("LOCAL_ROUTER_ENABLED", "False").lower() == "true"
+        self.local_router_threshold: float = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.75"))
+        self.routing_log_path: str = os.getenv(
+            "ROUTING_LOG_PATH",
+            os.path.join(LOGS_DIR_STR, "routing_decisions.jsonl")
+        )
+        self.routing_log_min_confidence: float = float(os.getenv("ROUTING_LOG_MIN_CONFIDENCE", "0.8"))  # LLM决策写入日志的最低置信度
+        
         # API 服务配置
         self.api_host: str = os.getenv("API_HOST", "0.0.0.0")
         self.api_port: int = int(os.getenv("API_PORT", "8000"))
@@ -105,6 +189,31 @@ class Settings:
         self.jwt_secret: str = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
         self.jwt_expire: int = int(os.getenv("JWT_EXPIRE", "86400"))  # 24小时
         
+    def _llm_profile(self, name: str, max_tokens: int, timeout: float) -> Dict[str, Any]:
+        """读取单个LLM分级配置（LLM_<NAME>_MODEL / _MAX_TOKENS / _TIMEOUT / _TEMPERATURE）"""
+        return {
+            "model": os.getenv(f"LLM_{name}_MODEL") or None,
+            "max_tokens": int(os.getenv(f"LLM_{name}_MAX_TOKENS", str(max_tokens))),
+            "timeout": float(os.getenv(f"LLM_{name}_TIMEOUT", str(timeout))),
+            "temperature": float(os.getenv(f"LLM_{name}_TEMPERATURE", str(self.llm_temperature))),
+        }
+    
+    def llm_profile(self, name: str) -> Dict[str, Any]:
+        """
+        获取LLM分级配置
+        
+        Args:
+            name: 配置名称（fast/synthesis/translate）
+            
+        Returns:
+            包含 model, max_tokens, timeout, temperature 的字典
+        """
+        if name not in self.llm_profiles:
+            raise ValueError(f"未知的LLM配置: {name}")
+        profile = dict(self.llm_profiles[name])
+        profile["model"] = profile["model"] or self.llm_model
+        return profile
+    
     @property
     def llm_api_key(self) -> Optional[str]:
         """获取LLM API密钥（优先使用阿里百炼）"""
@@ -9,7 +9,8 @@ from .entities import (
     CommunitySummary,
     QueryResult,
     RoutingDecision,
-    SearchResult
+    SearchResult,
+    RetrievalContext
 )
 
 from .dtos import (
@@ -22,6 +23,7 @@ from .dtos import (
     MaterialQueryParams,
     MaterialQueryResult,
     SearchParams,
+    BatchSearchParams,
     SearchResponse,
     SynthesisRequest,
     SynthesisResponse,
@@ -37,6 +39,7 @@ __all__ = [
     'QueryResult',
     'RoutingDecision',
     'SearchResult',
+    'RetrievalContext',
     # DTOs
     'QueryType',
     'ExpertType',
@@ -47,6 +50,7 @@ __all__ = [
     'MaterialQueryParams',
     'MaterialQueryResult',
     'SearchParams',
+    'BatchSearchParams',
     'SearchResponse',
     'SynthesisRequest',
     'SynthesisResponse',
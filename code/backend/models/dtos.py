@@ -153,6 +153,32 @@ class SearchParams:
         return errors
 
 
+@dataclass
+class BatchSearchParams:
+    """批量搜索参数 DTO"""
+    queries: List[str]
+    top_k: int = 10
+    filters: Optional[List[Optional[Dict]]] = None
+    
+    MAX_QUERIES = 256
+    
+    def validate(self) -> List[str]:
+        """验证请求数据"""
+        errors = []
+        if not isinstance(self.queries, list) or not self.queries:
+            errors.append("queries 必须是非空列表")
+        elif len(self.queries) > self.MAX_QUERIES:
+            errors.append(f"单次最多 {self.MAX_QUERIES} 个查询")
+        elif any(not isinstance(q, str) or not q.strip() for q in self.queries):
+            errors.append("查询不能为空")
+        if self.top_k < 1 or self.top_k > 100:
+            errors.append("top_k 必须在 1-100 之间")
+        if self.filters is not None and (
+                not isinstance(self.filters, list) or len(self.filters) != len(self.queries or [])):
+            errors.append("filters 数量必须与 queries 一致")
+        return errors
+
+
 @dataclass
 class SearchResponse:
     """搜索响应 DTO"""
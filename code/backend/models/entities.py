@@ -199,3 +199,52 @@ class SearchResult:
             "total_count": self.total_count,
             "search_time_ms": self.search_time_ms
         }
+
+
+@dataclass
+class RetrievalContext:
+    """
+    文献检索上下文实体
+
+    一次用户提问只计算一次关键词、查询向量和检索结果，
+    并在检索、PDF加载、答案合成和引用构建之间传递
+    """
+    question: str
+    search_query: str = ""
+    query_embedding: Optional[List[float]] = None
+    top_k: int = 20
+    raw_documents: List[Dict[str, Any]] = field(default_factory=list)  # 过滤前的检索结果
+    documents: List[Dict[str, Any]] = field(default_factory=list)  # 相似度过滤后的结果
+    pdf_contents: Dict[str, str] = field(default_factory=dict)  # DOI -> PDF原文
+    searched: bool = False  # 是否已完成向量检索
+    rerank_info: Optional[Dict[str, Any]] = None  # 重排序记录（耗时、名次变化，未启用时为None）
+    error: Optional[str] = None
+    error_step: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        """检索是否成功"""
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（与 SemanticExpert.search 返回格式一致）"""
+        if not self.success:
+            return {
+                "success": False,
+                "error": self.error,
+                "error_step": self.error_step,
+                "expert": "semantic",
+                "documents": []
+            }
+        result = {
+            "success": True,
+            "expert": "semantic",
+            "search_query": self.search_query,
+            "result_count": len(self.documents),
+            "original_count": len(self.raw_documents),
+            "documents": self.documents,
+            "question": self.question
+        }
+        if self.rerank_info is not None:
+            result["rerank"] = self.rerank_info
+        return result
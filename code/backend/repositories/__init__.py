@@ -5,6 +5,7 @@
 
 from .neo4j_repository import Neo4jRepository, get_neo4j_repository
 from .vector_repository import VectorRepository, CommunityVectorRepository, get_vector_repository, get_community_repository
+from .vector_index import InMemoryVectorIndex
 
 __all__ = [
     'Neo4jRepository',
@@ -13,4 +14,5 @@ __all__ = [
     'CommunityVectorRepository',
     'get_vector_repository',
     'get_community_repository',
+    'InMemoryVectorIndex',
 ]
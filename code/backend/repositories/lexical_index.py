@@ -0,0 +1,304 @@
+"""
+进程内 BM25 词法索引
+弥补向量检索对精确术语（如 LiFePO4/C、掺杂元素符号、工艺名称）的漏召回：
+英文/化学式按字母数字串切分并保留复合词，中文按字符二元组切分，
+倒排表为 CSR 形式的 NumPy 数组（可随向量快照导出并 mmap 加载），
+单次查询为若干次向量化累加加 argpartition
+"""
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import logging
+import mmap
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 字母数字串，允许 / . - + 连接（LiFePO4/C、Li1.05、Nb-doped、LiMn0.8Fe0.2PO4）
+_ALNUM_RE = re.compile(r"[A-Za-z0-9]+(?:[./+\-][A-Za-z0-9]+)*")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中英文混合分词
+
+    - 英文/化学式：小写化，复合词同时保留整体和各组成部分（lifepo4/c → lifepo4/c, lifepo4, c）
+    - 中文：连续汉字切分为字符二元组，单个汉字保留为一元组
+
+    Args:
+        text: 文本
+
+    Returns:
+        词项列表（保留重复，用于词频统计）
+    """
+    if not text:
+        return []
+    tokens = []
+    for match in _ALNUM_RE.finditer(text):
+        token = match.group().lower()
+        tokens.append(token)
+        parts = re.split(r"[./+\-]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    for match in _CJK_RE.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def exact_terms(text: str) -> Set[str]:
+    """
+    文本中的字母数字/化学式词项（如 lifepo4/c、nb-doped、lifepo4）
+
+    不含中文二元组和纯数字、单字符词项，用于判断关键词命中是否来自精确术语
+
+    Args:
+        text: 文本
+
+    Returns:
+        小写词项集合
+    """
+    terms = set()
+    for match in _ALNUM_RE.finditer(text or ""):
+        token = match.group().lower()
+        for term in [token] + re.split(r"[./+\-]", token):
+            if len(term) > 1 and not term.isdigit():
+                terms.add(term)
+    return terms
+
+
+class _TermTable(Sequence):
+    """
+    词项表：UTF-8 拼接字节串 + 偏移数组（下标即词项编号），按需解码
+
+    查找使用按 CRC32 排序的哈希数组二分定位，再逐个比对同哈希的词项，
+    构建时不需要对词项字符串排序；全部数组可为 mmap
+    """
+
+    def __init__(self, blob: Any, offsets: np.ndarray, hashes: np.ndarray, order: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+        self._hashes = hashes  # 升序的词项 CRC32
+        self._order = order    # 与 hashes 对应的词项编号
+
+    @classmethod
+    def build(cls, terms: Sequence[str]) -> "_TermTable":
+        """由按编号排列的词项构建"""
+        encoded = [t.encode("utf-8") for t in terms]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        hashes = np.fromiter(map(zlib.crc32, encoded), dtype=np.uint32, count=len(encoded))
+        order = np.argsort(hashes, kind="stable").astype(np.int32)
+        return cls(b"".join(encoded), offsets, hashes[order], order)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return bytes(self._blob[int(self._offsets[i]):int(self._offsets[i + 1])]).decode("utf-8")
+
+    def find(self, term: str) -> int:
+        """查找词项编号，不存在时返回-1"""
+        encoded = term.encode("utf-8")
+        h = np.uint32(zlib.crc32(encoded))
+        lo = int(np.searchsorted(self._hashes, h, side="left"))
+        hi = int(np.searchsorted(self._hashes, h, side="right"))
+        for t in self._order[lo:hi]:
+            if bytes(self._blob[int(self._offsets[t]):int(self._offsets[t + 1])]) == encoded:
+                return int(t)
+        return -1
+
+
+class BM25Index:
+    """
+    BM25 倒排索引（构建后只读）
+
+    倒排表为 CSR 形式的扁平数组：词项按首次出现顺序编号，第 t 个词项的倒排为
+    docs[offsets[t]:offsets[t + 1]]（文档下标）与对应的预计算 BM25 词频分量 weights，
+    查询时按 idf 加权累加到稠密得分数组。全部数组可随向量快照导出并以 mmap 加载，
+    多个 worker 共享同一份页缓存，不必各自重建
+    """
+
+    # 快照中的文件（键同时是文件名前缀）
+    FILES = ("lexical_terms", "lexical_term_offsets", "lexical_term_hashes", "lexical_term_order",
+             "lexical_offsets", "lexical_docs", "lexical_weights", "lexical_idf", "lexical_lengths")
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        """
+        构建索引
+
+        分词仍逐篇进行，词项编号后的计数、排序与权重计算全部向量化
+
+        Args:
+            documents: 文档文本序列（下标即文档编号）
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        start = time.perf_counter()
+        size = len(documents)
+        vocab: Dict[str, int] = {}
+        term_ids = array("i")
+        lengths = np.zeros(size, dtype=np.int32)
+        for doc_id in range(size):
+            ids = [vocab.setdefault(token, len(vocab)) for token in tokenize(documents[doc_id] or "")]
+            lengths[doc_id] = len(ids)
+            term_ids.extend(ids)
+
+        terms = _TermTable.build(list(vocab))
+        del vocab
+        doc_of_token = np.repeat(np.arange(size, dtype=np.int64), lengths)
+        keys = np.frombuffer(term_ids, dtype=np.int32).astype(np.int64) * max(size, 1) + doc_of_token
+        del term_ids, doc_of_token
+        # 按 (词项, 文档) 排序去重即得 CSR 倒排及词频
+        keys, tf = np.unique(keys, return_counts=True)
+        offsets = np.searchsorted(keys // max(size, 1), np.arange(len(terms) + 1)).astype(np.int64)
+        docs = (keys % max(size, 1)).astype(np.int32)
+        del keys
+
+        df = np.diff(offsets).astype(np.float32)
+        idf = np.log1p((size - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(lengths.mean()) if size else 0.0
+        norm = k1 * (1 - b + b * lengths.astype(np.float32) / max(avgdl, 1e-6))
+        tf = tf.astype(np.float32)
+        weights = (tf * (k1 + 1) / (tf + norm[docs])).astype(np.float32)
+
+        self._assign(k1, b, terms, offsets, docs, weights, idf, lengths)
+        logger.info(f"✅ BM25 索引已构建: {self.size} 篇, {self.vocabulary_size} 个词项 "
+                    f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    def _assign(self, k1: float, b: float, terms: _TermTable, offsets: np.ndarray, docs: np.ndarray,
+                weights: np.ndarray, idf: np.ndarray, lengths: np.ndarray):
+        self.k1 = k1
+        self.b = b
+        self.size = len(lengths)
+        self._terms = terms
+        self._offsets = offsets
+        self._docs = docs
+        self._weights = weights
+        self._idf = idf
+        self._lengths = lengths
+
+    def save(self, directory: str, version: str) -> Dict[str, str]:
+        """
+        导出为快照文件（词项字节串 .bin，其余为 .npy）
+
+        Args:
+            directory: 快照目录
+            version: 文件版本号（与向量快照一致）
+
+        Returns:
+            键到文件名的映射（写入 manifest 的 files）
+        """
+        files = {key: f"{key}.{version}.{'bin' if key == 'lexical_terms' else 'npy'}" for key in self.FILES}
+        with open(os.path.join(directory, files["lexical_terms"]), "wb") as f:
+            f.write(bytes(self._terms._blob))
+        arrays = {
+            "lexical_term_offsets": self._terms._offsets,
+            "lexical_term_hashes": self._terms._hashes,
+            "lexical_term_order": self._terms._order,
+            "lexical_offsets": self._offsets,
+            "lexical_docs": self._docs,
+            "lexical_weights": self._weights,
+            "lexical_idf": self._idf,
+            "lexical_lengths": self._lengths
+        }
+        for key, values in arrays.items():
+            np.save(os.path.join(directory, files[key]), values)
+        return files
+
+    @classmethod
+    def load(cls, directory: str, files: Dict[str, str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        以 mmap 只读方式加载 save 导出的索引
+
+        Args:
+            directory: 快照目录
+            files: save 返回的文件映射
+            k1: 导出时使用的词频饱和参数
+            b: 导出时使用的文档长度归一化参数
+
+        Returns:
+            BM25 索引（倒排数组映射自磁盘，不复制到进程内存）
+        """
+        def load_array(key: str) -> np.ndarray:
+            return np.load(os.path.join(directory, files[key]), mmap_mode="r")
+
+        blob = b""
+        with open(os.path.join(directory, files["lexical_terms"]), "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index = cls.__new__(cls)
+        terms = _TermTable(blob, load_array("lexical_term_offsets"), load_array("lexical_term_hashes"),
+                           load_array("lexical_term_order"))
+        index._assign(k1, b, terms, load_array("lexical_offsets"),
+                      load_array("lexical_docs"), load_array("lexical_weights"), load_array("lexical_idf"),
+                      load_array("lexical_lengths"))
+        if len(index._offsets) != len(index._terms) + 1 or len(index._docs) != len(index._weights):
+            raise ValueError(f"BM25 快照文件不一致: {directory}")
+        return index
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._terms)
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 10,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本
+            n_results: 返回数量
+            rows: 只在这些文档下标中检索（升序数组），为None时不限制
+
+        Returns:
+            (文档下标, BM25 得分)，按得分降序，只包含得分大于0的文档
+        """
+        term_ids = [t for t in (self._terms.find(term) for term in dict.fromkeys(tokenize(query))) if t >= 0]
+        if not term_ids or n_results <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        for t in term_ids:
+            start, end = int(self._offsets[t]), int(self._offsets[t + 1])
+            scores[self._docs[start:end]] += self._idf[t] * self._weights[start:end]
+
+        hits = np.flatnonzero(scores)
+        if rows is not None:
+            hits = np.intersect1d(hits, rows, assume_unique=True)
+        if len(hits) > n_results:
+            hits = hits[np.argpartition(-scores[hits], n_results - 1)[:n_results]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return hits, scores[hits]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> Dict[str, float]:
+    """
+    倒数排名融合（RRF）
+
+    Args:
+        rankings: 多路检索结果，每路为按相关性降序的文档 id 列表
+        k: 平滑常数，越大各路排名差异的影响越小
+
+    Returns:
+        文档 id 到融合得分 sum(1 / (k + rank)) 的映射（rank 从1开始）
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,140 @@
+"""
+元数据旁路索引
+为 doi / page / filename / type 等字段建立 值 → 排序行号数组 的映射，
+ChromaDB 风格的 where 过滤条件解析为行号集合（交集为有序数组二分查找，并集为位图），
+过滤检索和按 DOI 取全部切片不再需要扫描集合
+"""
+from typing import Any, Dict, List, Sequence
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = ("doi", "DOI", "page", "filename", "type")
+
+
+def filter_supported(where: Any, fields: Sequence[str] = INDEXED_FIELDS) -> bool:
+    """
+    过滤条件能否由元数据索引解析
+
+    支持: {字段: 值}、{字段: {"$eq": 值}}、{字段: {"$in": [...]}}、{"$and": [...]}、{"$or": [...]}，
+    多个键视为 $and；其他运算符或未索引字段返回False（交给 ChromaDB）
+    """
+    if not isinstance(where, dict) or not where:
+        return False
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value or not all(filter_supported(w, fields) for w in value):
+                return False
+        elif key not in fields:
+            return False
+        elif isinstance(value, dict):
+            if len(value) != 1:
+                return False
+            op, operand = next(iter(value.items()))
+            if op == "$in":
+                if not isinstance(operand, list):
+                    return False
+            elif op != "$eq":
+                return False
+        elif isinstance(value, (list, tuple)):
+            return False
+    return True
+
+
+class MetadataIndex:
+    """字段值到行号的倒排索引（构建后只读）"""
+
+    def __init__(self, metadatas: Sequence[Dict[str, Any]], fields: Sequence[str] = INDEXED_FIELDS):
+        """
+        构建索引
+
+        Args:
+            metadatas: 元数据序列（下标即行号）
+            fields: 建立索引的字段
+        """
+        start = time.perf_counter()
+        self.fields = tuple(fields)
+        self.size = len(metadatas)
+
+        postings: Dict[str, Dict[Any, List[int]]] = {f: {} for f in self.fields}
+        for row in range(self.size):
+            metadata = metadatas[row] or {}
+            for f in self.fields:
+                value = metadata.get(f)
+                if value is not None:
+                    postings[f].setdefault(value, []).append(row)
+
+        # 行号按升序追加，天然有序
+        self._postings: Dict[str, Dict[Any, np.ndarray]] = {
+            f: {value: np.asarray(rows, dtype=np.int32) for value, rows in values.items()}
+            for f, values in postings.items()
+        }
+        logger.info(f"✅ 元数据索引已构建: {self.size} 行, "
+                    + ", ".join(f"{f}={len(v)}" for f, v in self._postings.items() if v)
+                    + f" ({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    def rows(self, field: str, value: Any) -> np.ndarray:
+        """
+        某字段取某值的全部行号
+
+        Returns:
+            升序的 int32 行号数组（无匹配时为空数组）
+        """
+        return self._postings.get(field, {}).get(value, np.empty(0, dtype=np.int32))
+
+    def values(self, field: str) -> List[Any]:
+        """某字段的全部取值"""
+        return list(self._postings.get(field, {}))
+
+    def resolve(self, where: Dict[str, Any]) -> np.ndarray:
+        """
+        将过滤条件解析为行号集合（调用前应通过 filter_supported 检查）
+
+        Returns:
+            升序去重的行号数组
+        """
+        clauses = []
+        for key, value in where.items():
+            if key == "$and":
+                clauses.append(self._intersect([self.resolve(w) for w in value]))
+            elif key == "$or":
+                clauses.append(self._union([self.resolve(w) for w in value]))
+            elif isinstance(value, dict) and "$in" in value:
+                clauses.append(self._union([self.rows(key, v) for v in value["$in"]]))
+            else:
+                clauses.append(self.rows(key, value["$eq"] if isinstance(value, dict) else value))
+        return self._intersect(clauses)
+
+    def _union(self, arrays: List[np.ndarray]) -> np.ndarray:
+        """有序行号数组的并集（位图置位后取非零下标）"""
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        if len(arrays) == 1:
+            return arrays[0]
+        bitmap = np.zeros(self.size, dtype=bool)
+        for rows in arrays:
+            bitmap[rows] = True
+        return np.flatnonzero(bitmap).astype(np.int32)
+
+    @staticmethod
+    def _intersect(arrays: List[np.ndarray]) -> np.ndarray:
+        """有序行号数组的交集（从最短的数组开始，在其余数组中二分查找）"""
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        arrays = sorted(arrays, key=len)
+        result = arrays[0]
+        for other in arrays[1:]:
+            if not len(result):
+                break
+            pos = np.searchsorted(other, result)
+            found = pos < len(other)
+            found[found] = other[pos[found]] == result[found]
+            result = result[found]
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """各字段的不同取值数"""
+        return {f: len(values) for f, values in self._postings.items()}
@@ -0,0 +1,617 @@
+"""
+进程内精确向量索引
+将 ChromaDB 集合的全部向量一次性加载为连续的 float32 矩阵，
+top-k 检索为一次矩阵乘法加 argpartition，结果精确且支持批量查询
+
+构建脚本可额外导出磁盘快照（.npy 矩阵 + id 数组 + 文档/元数据旁路文件 + BM25 倒排数组），
+各 worker 以 mmap 只读方式加载，共享同一份页缓存
+"""
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from dataclasses import dataclass, field, replace
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+from backend.repositories.lexical_index import BM25Index
+from backend.repositories.metadata_index import MetadataIndex, filter_supported
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MANIFEST = "manifest.json"
+_PAGE_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """一次加载的索引快照（只读，刷新时整体替换）"""
+    ids: Sequence[str]
+    documents: Sequence[str]
+    metadatas: Sequence[Dict[str, Any]]
+    matrix: np.ndarray                       # (N, D) float32；cosine 空间下已归一化
+    sq_norms: Optional[np.ndarray] = None    # l2 空间下各行的平方范数
+    loaded_at: float = field(default_factory=time.time)
+    source: str = "chromadb"                 # chromadb / snapshot（mmap）
+    lexical: Optional[BM25Index] = None      # 基于 documents 的 BM25 索引（启用时）
+    fields: Optional[MetadataIndex] = None   # 元数据旁路索引（doi/page/filename/type → 行号）
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+
+class _SidecarColumn(Sequence):
+    """旁路文件中的一列（文档或元数据），按行偏移从 mmap 中按需解析"""
+
+    def __init__(self, buf: mmap.mmap, offsets: np.ndarray, column: int):
+        self._buf = buf
+        self._offsets = offsets
+        self._column = column
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = range(len(self))[i]
+        row = json.loads(self._buf[int(self._offsets[i]):int(self._offsets[i + 1])])
+        return row[self._column]
+
+
+def read_collection(collection: Any, page_size: int = _PAGE_SIZE) -> Tuple[List[str], List[str], List[Dict[str, Any]], Optional[np.ndarray]]:
+    """
+    分页读取集合的全部 id、文档、元数据和向量
+
+    Returns:
+        (ids, documents, metadatas, embeddings)，集合为空时 embeddings 为None
+    """
+    count = collection.count()
+    ids, documents, metadatas, embeddings = [], [], [], []
+    for offset in range(0, max(count, 1), page_size):
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=page_size,
+            offset=offset
+        )
+        if not page.get("ids"):
+            break
+        ids.extend(page["ids"])
+        documents.extend(page.get("documents") or [""] * len(page["ids"]))
+        metadatas.extend(page.get("metadatas") or [{}] * len(page["ids"]))
+        embeddings.append(np.asarray(page["embeddings"], dtype=np.float32))
+    return ids, documents, [m or {} for m in metadatas], (np.vstack(embeddings) if embeddings else None)
+
+
+def prepare_matrix(matrix: np.ndarray, space: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """按距离空间预处理矩阵：cosine 行归一化，l2 预计算平方范数"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    sq_norms = None
+    if space == "cosine":
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+    elif space == "l2":
+        sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+    return matrix, sq_norms
+
+
+def export_snapshot(
+    collection: Any,
+    snapshot_dir: str,
+    space: Optional[str] = None,
+    lexical: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    将集合导出为磁盘快照
+
+    写入 embeddings.<版本>.npy（已按距离空间预处理的 float32 矩阵）、sq_norms.<版本>.npy（l2）、
+    ids.<版本>.npy、rows.<版本>.jsonl（每行 [文档, 元数据]）及其行偏移 offsets.<版本>.npy、
+    BM25 倒排数组 lexical_*.<版本>.*，最后原子替换 manifest.json。
+    旧版本文件随后删除，已 mmap 的进程不受影响
+
+    Args:
+        collection: ChromaDB 集合
+        snapshot_dir: 快照目录（每个集合一个目录）
+        space: 距离空间，默认取集合的 hnsw:space
+        lexical: 是否同时导出 BM25 词法索引（worker 加载时不再各自构建）
+
+    Returns:
+        写入的 manifest，集合为空时返回None
+    """
+    space = space or (collection.metadata or {}).get("hnsw:space", "l2")
+    ids, documents, metadatas, embeddings = read_collection(collection)
+    if embeddings is None:
+        logger.warning(f"⚠️  集合 {collection.name} 为空，未导出快照")
+        return None
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    version = str(int(time.time() * 1000))
+    files = {
+        "embeddings": f"embeddings.{version}.npy",
+        "ids": f"ids.{version}.npy",
+        "rows": f"rows.{version}.jsonl",
+        "offsets": f"offsets.{version}.npy",
+        "sq_norms": None
+    }
+
+    matrix, sq_norms = prepare_matrix(embeddings, space)
+    np.save(os.path.join(snapshot_dir, files["embeddings"]), matrix)
+    if sq_norms is not None:
+        files["sq_norms"] = f"sq_norms.{version}.npy"
+        np.save(os.path.join(snapshot_dir, files["sq_norms"]), sq_norms)
+    np.save(os.path.join(snapshot_dir, files["ids"]), np.asarray(ids, dtype=str))
+
+    offsets = [0]
+    with open(os.path.join(snapshot_dir, files["rows"]), "wb") as f:
+        for document, metadata in zip(documents, metadatas):
+            line = json.dumps([document or "", metadata], ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(snapshot_dir, files["offsets"]), np.asarray(offsets, dtype=np.uint64))
+
+    lexical_params = None
+    if lexical:
+        bm25 = BM25Index(documents)
+        files.update(bm25.save(snapshot_dir, version))
+        lexical_params = {"k1": bm25.k1, "b": bm25.b, "terms": bm25.vocabulary_size}
+
+    manifest = {
+        "version": version,
+        "collection": collection.name,
+        "collection_id": str(collection.id),
+        "space": space,
+        "count": len(ids),
+        "dim": int(matrix.shape[1]),
+        "created_at": time.time(),
+        "lexical": lexical_params,
+        "files": files
+    }
+    tmp_path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(snapshot_dir, SNAPSHOT_MANIFEST))
+
+    current = {name for name in files.values() if name}
+    for name in os.listdir(snapshot_dir):
+        if name != SNAPSHOT_MANIFEST and name not in current and name.split(".")[0] in (
+                ("embeddings", "sq_norms", "ids", "rows", "offsets") + BM25Index.FILES):
+            try:
+                os.remove(os.path.join(snapshot_dir, name))
+            except OSError:
+                pass
+
+    logger.info(f"✅ 向量快照已导出: {snapshot_dir} ({len(ids)} 条, {matrix.shape[1]} 维, space={space})")
+    return manifest
+
+
+def read_manifest(snapshot_dir: str) -> Optional[Dict[str, Any]]:
+    """读取快照 manifest，不存在或损坏时返回None"""
+    try:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(snapshot_dir: str, manifest: Optional[Dict[str, Any]] = None) -> IndexSnapshot:
+    """
+    以 mmap 只读方式加载磁盘快照
+
+    Args:
+        snapshot_dir: 快照目录
+        manifest: 已读取的 manifest，默认从目录读取
+
+    Returns:
+        索引快照（矩阵、id、旁路文件与 BM25 倒排均映射自磁盘，不复制到进程内存；
+        旧版快照不含 BM25 文件时 lexical 为None）
+    """
+    manifest = manifest or read_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"快照不存在: {snapshot_dir}")
+    files = manifest["files"]
+
+    def path(key: str) -> str:
+        return os.path.join(snapshot_dir, files[key])
+
+    matrix = np.load(path("embeddings"), mmap_mode="r")
+    sq_norms = np.load(path("sq_norms"), mmap_mode="r") if files.get("sq_norms") else None
+    ids = np.load(path("ids"), mmap_mode="r")
+    offsets = np.load(path("offsets"), mmap_mode="r")
+    with open(path("rows"), "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if matrix.shape[0] != len(ids) or len(offsets) != len(ids) + 1:
+        raise ValueError(f"快照文件不一致: {snapshot_dir}")
+
+    lexical = None
+    params = manifest.get("lexical")
+    if params and all(files.get(key) for key in BM25Index.FILES):
+        lexical = BM25Index.load(snapshot_dir, files, k1=params["k1"], b=params["b"])
+        if lexical.size != len(ids):
+            raise ValueError(f"快照文件不一致: {snapshot_dir}")
+    return IndexSnapshot(
+        ids=ids,
+        documents=_SidecarColumn(buf, offsets, 0),
+        metadatas=_SidecarColumn(buf, offsets, 1),
+        matrix=matrix,
+        sq_norms=sq_norms,
+        source="snapshot",
+        lexical=lexical
+    )
+
+
+class InMemoryVectorIndex:
+    """
+    进程内精确向量索引
+
+    ChromaDB 仍是唯一数据源：索引从集合加载，集合变化（同一进程内写入，
+    或其他进程写入导致 chroma.sqlite3 修改时间变化）后在后台重新加载，
+    加载完成前继续使用旧快照。返回的 distances 与集合的 hnsw:space 一致
+
+    配置 snapshot_dir 且快照与集合一致（集合 id、条数、距离空间相同）时 mmap 加载快照，
+    否则从集合读取到进程内存。本进程写入集合后不再使用快照，直到重新导出
+    """
+
+    _PAGE_SIZE = _PAGE_SIZE
+
+    def __init__(
+        self,
+        collection: Any,
+        space: str = "l2",
+        db_path: Optional[str] = None,
+        refresh_interval: float = 5.0,
+        max_rows: int = 200000,
+        snapshot_dir: Optional[str] = None,
+        lexical: bool = False
+    ):
+        """
+        初始化索引
+
+        Args:
+            collection: ChromaDB 集合
+            space: 距离空间（l2/cosine/ip），与集合的 hnsw:space 一致
+            db_path: ChromaDB 持久化目录，用于检测其他进程的写入
+            refresh_interval: 检查集合变化的最小间隔（秒）
+            max_rows: 集合超过该条数时不加载（继续使用 ChromaDB 检索）
+            snapshot_dir: 磁盘快照目录，为空时总是从集合加载
+            lexical: 是否在每次加载后同时构建 BM25 词法索引
+        """
+        self._collection = collection
+        self.space = space
+        self._sqlite_path = os.path.join(db_path, "chroma.sqlite3") if db_path else None
+        self._refresh_interval = refresh_interval
+        self._max_rows = max_rows
+        self._snapshot_dir = snapshot_dir
+        self._lexical = lexical
+
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._source_mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._stale = False
+        self._loading = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """索引是否可用"""
+        self._maybe_refresh()
+        return self._snapshot is not None
+
+    @property
+    def stale(self) -> bool:
+        """本进程修改过集合、新快照尚未加载完成（此时快照可能缺少新增的行）"""
+        return self._stale
+
+    @property
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        """当前快照（可能为None）"""
+        return self._snapshot
+
+    @property
+    def size(self) -> int:
+        snapshot = self._snapshot
+        return snapshot.size if snapshot is not None else 0
+
+    def load(self) -> bool:
+        """
+        从集合加载全部向量（同步）
+
+        Returns:
+            是否加载成功
+        """
+        with self._loading:
+            return self._load()
+
+    def _load(self) -> bool:
+        start = time.perf_counter()
+        mtime = self._current_mtime()
+        try:
+            count = self._collection.count()
+            if count > self._max_rows:
+                logger.warning(f"⚠️  集合共 {count} 条，超过内存索引上限 {self._max_rows}，继续使用ChromaDB检索")
+                self._snapshot = None
+                return False
+
+            snapshot = self._load_from_disk(count)
+            if snapshot is None:
+                ids, documents, metadatas, embeddings = read_collection(self._collection, self._PAGE_SIZE)
+                if embeddings is None:
+                    self._snapshot = None
+                    return False
+                snapshot = self._build_snapshot(ids, documents, metadatas, embeddings)
+            # 快照已包含 BM25 倒排时直接使用（mmap 共享），否则在本进程构建
+            lexical = None
+            if self._lexical:
+                lexical = snapshot.lexical or BM25Index(snapshot.documents)
+            snapshot = replace(snapshot, fields=MetadataIndex(snapshot.metadatas), lexical=lexical)
+
+            self._snapshot = snapshot
+            self._source_mtime = mtime
+            self._stale = False
+            logger.info(f"✅ 内存向量索引已加载: {snapshot.size} 条, {snapshot.matrix.shape[1]} 维, "
+                        f"space={self.space}, 来源={snapshot.source} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+            return True
+        except Exception as e:
+            logger.error(f"❌ 内存向量索引加载失败: {e}")
+            return False
+
+    def _load_from_disk(self, count: int) -> Optional[IndexSnapshot]:
+        """快照与集合一致时 mmap 加载，否则返回None（从集合加载）"""
+        if not self._snapshot_dir or self._stale:
+            return None
+        manifest = read_manifest(self._snapshot_dir)
+        if manifest is None:
+            return None
+        if (manifest.get("collection_id") != str(getattr(self._collection, "id", ""))
+                or manifest.get("count") != count or manifest.get("space") != self.space):
+            logger.warning(f"⚠️  向量快照与集合不一致，从ChromaDB加载（请重新导出快照）: {self._snapshot_dir}")
+            return None
+        try:
+            return load_snapshot(self._snapshot_dir, manifest)
+        except Exception as e:
+            logger.warning(f"⚠️  向量快照加载失败，从ChromaDB加载: {e}")
+            return None
+
+    def _build_snapshot(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        matrix: np.ndarray
+    ) -> IndexSnapshot:
+        """按距离空间预处理矩阵"""
+        matrix, sq_norms = prepare_matrix(matrix, self.space)
+        return IndexSnapshot(ids=ids, documents=documents, metadatas=metadatas,
+                             matrix=matrix, sq_norms=sq_norms)
+
+    def invalidate(self):
+        """标记集合已变化，下次检索前在后台重新加载"""
+        self._stale = True
+        self._last_check = 0.0
+
+    def _current_mtime(self) -> Optional[float]:
+        """集合（chroma.sqlite3）与快照 manifest 中较新的修改时间"""
+        paths = [self._sqlite_path]
+        if self._snapshot_dir:
+            paths.append(os.path.join(self._snapshot_dir, SNAPSHOT_MANIFEST))
+        mtimes = []
+        for path in filter(None, paths):
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        return max(mtimes) if mtimes else None
+
+    def start(self):
+        """在后台线程加载索引，加载完成前检索继续走 ChromaDB"""
+        self._last_check = time.monotonic()
+        self._load_in_background()
+
+    def _load_in_background(self):
+        if not self._loading.acquire(blocking=False):
+            return  # 已有加载在进行
+
+        def reload():
+            try:
+                self._load()
+            finally:
+                self._loading.release()
+        threading.Thread(target=reload, name="vector-index-load", daemon=True).start()
+
+    def _maybe_refresh(self):
+        """按间隔检查集合是否变化，变化时在后台线程重新加载"""
+        now = time.monotonic()
+        if now - self._last_check < self._refresh_interval:
+            return
+        self._last_check = now
+
+        mtime = self._current_mtime()
+        if self._snapshot is not None and not self._stale and (mtime is None or mtime == self._source_mtime):
+            return
+        self._load_in_background()
+
+    @staticmethod
+    def can_filter(where: Optional[Dict[str, Any]]) -> bool:
+        """过滤条件能否由元数据索引解析（否则应交给 ChromaDB）"""
+        return filter_supported(where)
+
+    def _resolve(self, snapshot: IndexSnapshot, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """过滤条件解析为行号，无过滤条件时返回None"""
+        if not where:
+            return None
+        if not filter_supported(where):
+            raise ValueError(f"内存索引不支持该过滤条件: {where}")
+        return snapshot.fields.resolve(where)
+
+    def search(
+        self,
+        query_embeddings: Any,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        精确 top-k 检索
+
+        Args:
+            query_embeddings: 单个查询向量 (D,) 或批量查询矩阵 (M, D)
+            n_results: 每个查询返回的数量
+            where: 元数据过滤条件（需满足 can_filter），只在匹配的行中检索
+            include_embeddings: 是否同时返回命中行的向量（embeddings，形状 (k, D)）
+
+        Returns:
+            每个查询一个结果字典（documents, metadatas, distances, ids），按距离升序
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("内存向量索引未加载")
+
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if queries.shape[1] != snapshot.matrix.shape[1]:
+            raise ValueError(f"查询向量维度 {queries.shape[1]} 与索引维度 {snapshot.matrix.shape[1]} 不一致")
+        if self.space == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        rows = self._resolve(snapshot, where)
+        candidates = snapshot.size if rows is None else len(rows)
+        k = min(n_results, candidates)
+        if k <= 0:
+            return [{"documents": [], "metadatas": [], "distances": [], "ids": []} for _ in queries]
+
+        # 过滤后行数较少时只对这些行计算；较多时整体计算再屏蔽其余行，避免复制大块矩阵
+        gather = rows is not None and len(rows) * 4 < snapshot.size
+        matrix = snapshot.matrix[rows] if gather else snapshot.matrix
+        scores = queries @ matrix.T  # (M, N) 或 (M, len(rows))
+        if self.space == "l2":
+            # ||q - x||² = ||q||² + ||x||² - 2 q·x，排序只需要后两项
+            scores = 2 * scores - (snapshot.sq_norms[rows] if gather else snapshot.sq_norms)
+        if rows is not None and not gather:
+            mask = np.full(snapshot.size, -np.inf, dtype=np.float32)
+            mask[rows] = 0.0
+            scores = scores + mask
+
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        if gather:
+            top = rows[top]
+
+        if self.space == "l2":
+            distances = np.einsum("ij,ij->i", queries, queries)[:, None] - top_scores
+            distances = np.maximum(distances, 0.0)
+        else:
+            distances = 1.0 - top_scores
+
+        results = [
+            {
+                "documents": [snapshot.documents[i] for i in row],
+                "metadatas": [snapshot.metadatas[i] for i in row],
+                "distances": [float(d) for d in row_distances],
+                "ids": [str(snapshot.ids[i]) for i in row]
+            }
+            for row, row_distances in zip(top, distances)
+        ]
+        if include_embeddings:
+            for result, row in zip(results, top):
+                result["embeddings"] = np.asarray(snapshot.matrix[row])
+        return results
+
+    def lexical_search(
+        self,
+        query: str,
+        n_results: int = 10,
+        query_embedding: Any = None,
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
+    ) -> Dict[str, Any]:
+        """
+        BM25 词法检索
+
+        Args:
+            query: 查询文本
+            n_results: 返回数量
+            query_embedding: 查询向量，提供时同时计算命中文档的向量距离
+            where: 元数据过滤条件（需满足 can_filter）
+            include_embeddings: 是否同时返回命中行的向量
+
+        Returns:
+            结果字典（documents, metadatas, ids, scores，及可选的 distances、embeddings），按 BM25 得分降序
+        """
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.lexical is None:
+            raise RuntimeError("词法索引未加载")
+
+        rows, scores = snapshot.lexical.search(query, n_results, rows=self._resolve(snapshot, where))
+        result = {
+            "documents": [snapshot.documents[i] for i in rows],
+            "metadatas": [snapshot.metadatas[i] for i in rows],
+            "ids": [str(snapshot.ids[i]) for i in rows],
+            "scores": [float(s) for s in scores]
+        }
+        if query_embedding is not None:
+            result["distances"] = [float(d) for d in self._row_distances(snapshot, query_embedding, rows)]
+        if include_embeddings:
+            result["embeddings"] = np.asarray(snapshot.matrix[rows])
+        return result
+
+    def _row_distances(self, snapshot: IndexSnapshot, query_embedding: Any, rows: np.ndarray) -> np.ndarray:
+        """查询向量到指定行的距离（与 search 的距离定义一致）"""
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if self.space == "cosine":
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+        dots = snapshot.matrix[rows] @ query
+        if self.space == "l2":
+            return np.maximum(float(query @ query) + snapshot.sq_norms[rows] - 2 * dots, 0.0)
+        return 1.0 - dots
+
+    def get_by_field(self, field: str, value: Any) -> Dict[str, Any]:
+        """
+        取某元数据字段等于某值的全部行（如一篇 DOI 的全部切片），无需扫描集合
+
+        Returns:
+            结果字典（ids, documents, metadatas），按集合中的顺序
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("内存向量索引未加载")
+        rows = snapshot.fields.rows(field, value)
+        return {
+            "ids": [str(snapshot.ids[i]) for i in rows],
+            "documents": [snapshot.documents[i] for i in rows],
+            "metadatas": [snapshot.metadatas[i] for i in rows]
+        }
+
+    def ids_by_field(self, field: str, value: Any) -> List[str]:
+        """
+        取某元数据字段等于某值的全部行 id（如按 DOI 删除前定位切片）
+
+        Returns:
+            id 列表，按集合中的顺序
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("内存向量索引未加载")
+        return [str(snapshot.ids[i]) for i in snapshot.fields.rows(field, value)]
+
+    def stats(self) -> Dict[str, Any]:
+        """索引状态"""
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "size": snapshot.size if snapshot is not None else 0,
+            "dim": int(snapshot.matrix.shape[1]) if snapshot is not None else 0,
+            "space": self.space,
+            "source": snapshot.source if snapshot is not None else None,
+            "lexical_terms": snapshot.lexical.vocabulary_size if snapshot is not None and snapshot.lexical is not None else 0,
+            "metadata_fields": snapshot.fields.stats() if snapshot is not None and snapshot.fields is not None else {},
+            "memory_mb": round(snapshot.matrix.nbytes / (1024 * 1024), 1) if snapshot is not None else 0.0,
+            "loaded_at": snapshot.loaded_at if snapshot is not None else None
+        }
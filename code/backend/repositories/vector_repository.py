@@ -3,9 +3,14 @@
 封装 ChromaDB 操作
 """
 from typing import Dict, List, Any, Optional
+import json
 import logging
+import os
+
+import numpy as np
 
 from backend.config.settings import settings
+from backend.repositories.vector_index import InMemoryVectorIndex
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +26,13 @@ except ImportError:
 class VectorRepository:
     """ChromaDB 向量数据库访问类"""
     
-    def __init__(self, collection_name: str = "lfp_papers"):
+    def __init__(self, collection_name: str = "lfp_papers", use_memory_index: Optional[bool] = None):
         """
         初始化向量数据库
         
         Args:
             collection_name: 集合名称
+            use_memory_index: 是否启用进程内精确索引，默认使用配置
         """
         if not CHROMA_AVAILABLE:
             raise ImportError("ChromaDB 未安装，请先安装: pip install chromadb")
@@ -34,7 +40,20 @@ class VectorRepository:
         self._client = None
         self._collection = None
         self._collection_name = collection_name
+        self._index: Optional[InMemoryVectorIndex] = None
         self._init_client()
+        
+        if settings.vector_memory_index if use_memory_index is None else use_memory_index:
+            self._index = InMemoryVectorIndex(
+                self._collection,
+                space=(self._collection.metadata or {}).get("hnsw:space", "l2"),
+                db_path=settings.vector_db_path,
+                refresh_interval=settings.vector_memory_index_refresh_interval,
+                max_rows=settings.vector_memory_index_max_rows,
+                snapshot_dir=os.path.join(settings.vector_snapshot_dir, collection_name) if settings.vector_snapshot_dir else None,
+                lexical=settings.hybrid_search
+            )
+            self._index.start()
     
     def _init_client(self):
         """初始化 ChromaDB 客户端"""
@@ -61,7 +80,8 @@ class VectorRepository:
         query: str = None,
         query_embedding: List[float] = None,
         n_results: int = 10,
-        where_filter: Optional[Dict] = None
+        where_filter: Optional[Dict] = None,
+        include_embeddings: bool = False
     ) -> Dict[str, Any]:
         """
         语义搜索
@@ -71,9 +91,10 @@ class VectorRepository:
             query_embedding: 查询的embedding向量（1024维）
             n_results: 返回结果数量
             where_filter: 过滤条件
+            include_embeddings: 是否同时返回命中文档的向量（用于结果多样化）
             
         Returns:
-            搜索结果（包含 documents, metadatas, distances）
+            搜索结果（包含 documents, metadatas, distances，及可选的 embeddings）
         """
         try:
             # 如果没有提供embedding，返回错误
@@ -87,19 +108,39 @@ class VectorRepository:
                     "ids": []
                 }
             
+            # 内存索引可用且过滤条件可由元数据索引解析时直接精确检索，不经过 ChromaDB
+            if self._use_index(where_filter):
+                try:
+                    result = self._index.search(
+                        query_embedding, n_results, where=where_filter, include_embeddings=include_embeddings
+                    )[0]
+                    result["success"] = True
+                    return result
+                except Exception as e:
+                    logger.warning(f"⚠️  内存索引检索失败，回退到ChromaDB: {e}")
+            
+            # Embedding客户端返回 NumPy 数组，旧版 ChromaDB 只接受列表
+            if hasattr(query_embedding, "tolist"):
+                query_embedding = query_embedding.tolist()
+            
+            include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
             result = self._collection.query(
                 query_embeddings=[query_embedding],
                 n_results=n_results,
-                where=where_filter
+                where=where_filter,
+                include=include
             )
             
-            return {
+            response = {
                 "success": True,
                 "documents": result.get("documents", [[]])[0],
                 "metadatas": result.get("metadatas", [[]])[0],
                 "distances": result.get("distances", [[]])[0],
                 "ids": result.get("ids", [[]])[0]
             }
+            if include_embeddings:
+                response["embeddings"] = np.asarray(result.get("embeddings", [[]])[0], dtype=np.float32)
+            return response
             
         except Exception as e:
             logger.error(f"向量搜索失败: {e}")
@@ -112,6 +153,131 @@ class VectorRepository:
                 "ids": []
             }
     
+    def search_batch(
+        self,
+        query_embeddings: Any,
+        n_results: int = 10,
+        where_filters: Optional[List[Optional[Dict]]] = None
+    ) -> Dict[str, Any]:
+        """
+        批量语义搜索
+        
+        查询按过滤条件分组，每组一次检索（过滤条件全部相同时只有一次）：
+        内存索引可解析的分组一次矩阵运算完成，其余分组一次 ChromaDB 查询
+        
+        Args:
+            query_embeddings: 查询向量矩阵 (M, D)
+            n_results: 每个查询返回的数量
+            where_filters: 每个查询的过滤条件，为None时全部不过滤
+            
+        Returns:
+            {"success": ..., "results": 每个查询一个结果（documents, metadatas, distances, ids）}
+        """
+        try:
+            queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+            if where_filters is None:
+                where_filters = [None] * len(queries)
+            if len(where_filters) != len(queries):
+                return {
+                    "success": False,
+                    "error": f"过滤条件数量 {len(where_filters)} 与查询数量 {len(queries)} 不一致",
+                    "results": []
+                }
+            
+            # 按过滤条件分组（空过滤条件视为不过滤）
+            groups: Dict[str, List[int]] = {}
+            for i, where in enumerate(where_filters):
+                key = json.dumps(where, sort_keys=True, ensure_ascii=False) if where else ""
+                groups.setdefault(key, []).append(i)
+            
+            results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+            for key, rows in list(groups.items()):
+                where = where_filters[rows[0]] or None
+                if not self._use_index(where):
+                    continue
+                try:
+                    for i, result in zip(rows, self._index.search(queries[rows], n_results, where=where)):
+                        results[i] = result
+                    del groups[key]
+                except Exception as e:
+                    logger.warning(f"⚠️  内存索引检索失败，回退到ChromaDB: {e}")
+            
+            for rows in groups.values():
+                result = self._collection.query(
+                    query_embeddings=queries[rows].tolist(),
+                    n_results=n_results,
+                    where=where_filters[rows[0]] or None
+                )
+                for j, i in enumerate(rows):
+                    results[i] = {
+                        key: (result.get(key) or [[]] * len(rows))[j]
+                        for key in ("documents", "metadatas", "distances", "ids")
+                    }
+            
+            return {"success": True, "results": results}
+            
+        except Exception as e:
+            logger.error(f"批量搜索失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": []
+            }
+    
+    def _use_index(self, where_filter: Optional[Dict] = None) -> bool:
+        """内存索引是否可用，且过滤条件（如有）可由元数据索引解析"""
+        if where_filter and not InMemoryVectorIndex.can_filter(where_filter):
+            return False
+        return self._index is not None and self._index.ready
+    
+    def lexical_search(
+        self,
+        query: str,
+        n_results: int = 10,
+        query_embedding: Any = None,
+        where_filter: Optional[Dict] = None,
+        include_embeddings: bool = False
+    ) -> Dict[str, Any]:
+        """
+        BM25 关键词检索（基于内存索引，集合变化后随内存索引一起重建）
+        
+        Args:
+            query: 查询文本
+            n_results: 返回数量
+            query_embedding: 查询向量，提供时同时返回命中文档的向量距离
+            where_filter: 过滤条件（仅支持元数据索引可解析的条件）
+            include_embeddings: 是否同时返回命中文档的向量
+            
+        Returns:
+            搜索结果（documents, metadatas, ids, scores[, distances]），按 BM25 得分降序
+        """
+        if not self._use_index(where_filter):
+            return {
+                "success": False,
+                "error": "词法索引未就绪或不支持该过滤条件",
+                "documents": [],
+                "metadatas": [],
+                "ids": [],
+                "scores": []
+            }
+        try:
+            result = self._index.lexical_search(
+                query, n_results, query_embedding=query_embedding, where=where_filter,
+                include_embeddings=include_embeddings
+            )
+            result["success"] = True
+            return result
+        except Exception as e:
+            logger.error(f"关键词检索失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "documents": [],
+                "metadatas": [],
+                "ids": [],
+                "scores": []
+            }
+    
     def search_with_filter(
         self,
         query: str,
@@ -149,9 +315,14 @@ class VectorRepository:
             文档信息或 None
         """
         try:
-            result = self._collection.get(
-                where={"doi": doi}
-            )
+            if self._use_index():
+                result = self._index.get_by_field("doi", doi)
+                if not result["ids"]:
+                    return None
+            else:
+                result = self._collection.get(
+                    where={"doi": doi}
+                )
             
             if result and result.get("ids"):
                 return {
@@ -165,6 +336,38 @@ class VectorRepository:
             logger.error(f"获取 DOI 文档失败: {e}")
             return None
     
+    def get_chunks_by_doi(self, doi: str) -> List[Dict[str, Any]]:
+        """
+        获取一篇文献的全部切片（内存索引可用时不扫描集合）
+        
+        Args:
+            doi: 文献 DOI
+            
+        Returns:
+            切片列表（id, document, metadata），按页码排序
+        """
+        try:
+            if self._use_index():
+                result = self._index.get_by_field("doi", doi)
+            else:
+                result = self._collection.get(
+                    where={"doi": doi},
+                    include=["documents", "metadatas"]
+                )
+            
+            chunks = [
+                {"id": chunk_id, "document": document, "metadata": metadata or {}}
+                for chunk_id, document, metadata in zip(
+                    result.get("ids", []), result.get("documents") or [], result.get("metadatas") or []
+                )
+            ]
+            chunks.sort(key=lambda chunk: chunk["metadata"].get("page") or 0)
+            return chunks
+            
+        except Exception as e:
+            logger.error(f"获取 DOI 切片失败: {e}")
+            return []
+    
     def get_count(self) -> int:
         """获取文档总数"""
         try:
@@ -184,6 +387,13 @@ class VectorRepository:
             文档列表，每项包含 text 和 metadata
         """
         try:
+            snapshot = self._index.snapshot if self._index is not None and self._index.ready else None
+            if snapshot is not None:
+                return [
+                    {"text": snapshot.documents[i], "metadata": snapshot.metadatas[i]}
+                    for i in range(min(limit, snapshot.size))
+                ]
+            
             result = self._collection.get(limit=limit, include=["documents", "metadatas"])
             docs = []
             for i, doc in enumerate(result.get("documents", [])):
@@ -237,6 +447,8 @@ class VectorRepository:
                 ids=ids
             )
             logger.info(f"✅ 添加 {len(documents)} 个文档")
+            if self._index is not None:
+                self._index.invalidate()
             return True
         except Exception as e:
             logger.error(f"添加文档失败: {e}")
@@ -244,7 +456,7 @@ class VectorRepository:
     
     def delete_by_doi(self, doi: str) -> bool:
         """
-        根据 DOI 删除文档
+        根据 DOI 删除文档（内存索引可用且未过期时按 id 删除，不扫描集合）
         
         Args:
             doi: 文献 DOI
@@ -253,15 +465,26 @@ class VectorRepository:
             是否成功
         """
         try:
-            self._collection.delete(
-                where={"doi": doi}
-            )
+            if self._use_index() and not self._index.stale:
+                ids = self._index.ids_by_field("doi", doi)
+                if ids:
+                    self._collection.delete(ids=ids)
+            else:
+                self._collection.delete(
+                    where={"doi": doi}
+                )
             logger.info(f"✅ 删除 DOI 为 {doi} 的文档")
+            if self._index is not None:
+                self._index.invalidate()
             return True
         except Exception as e:
             logger.error(f"删除文档失败: {e}")
             return False
     
+    def index_stats(self) -> Optional[Dict[str, Any]]:
+        """内存索引状态，未启用时返回None"""
+        return self._index.stats() if self._index is not None else None
+    
     def close(self):
         """关闭连接"""
         if self._client:
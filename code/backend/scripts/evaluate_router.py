@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+评估本地路由分类器
+输入为带标签的问题集（JSONL，每行 {"question": ..., "expert": ...}），
+输出准确率和LLM跳过率
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.config.settings import settings
+from backend.agents.experts import RouterExpert, LocalRouter
+from backend.agents.experts.local_router import load_routing_log
+
+
+def evaluate_router(labels_path: str, threshold: float, with_llm: bool = False):
+    """
+    训练本地路由并在带标签问题集上评估
+
+    Args:
+        labels_path: 带标签问题集路径
+        threshold: 本地路由置信度阈值
+        with_llm: 低置信度问题是否实际调用LLM路由，以统计整体准确率
+
+    Returns:
+        评估报告，没有带标签问题或训练失败时返回None
+    """
+    labelled = load_routing_log(labels_path, limit=100000)
+    print(f"📄 带标签问题数: {len(labelled)}")
+    if not labelled:
+        print("❌ 没有可用的带标签问题")
+        return None
+
+    llm_service = None
+    if with_llm:
+        from backend.services import LLMService
+        llm_service = LLMService()
+
+    local_router = LocalRouter(threshold=threshold)
+    # 评估时的LLM路由不写入路由日志，否则带标签问题会在下次训练时混入训练样本
+    router = RouterExpert(llm_service=llm_service, local_router=local_router, log_decisions=False)
+
+    # 带标签问题集可能就是路由日志本身，训练时剔除这些问题，避免测试集泄漏到训练样本
+    labelled_questions = {question for question, _ in labelled}
+    samples = [(q, e) for q, e in router.training_samples() if q not in labelled_questions]
+
+    print(f"🔌 BGE服务: {settings.bge_api_url}")
+    if not local_router.fit(samples):
+        print("❌ 本地路由训练失败")
+        return None
+    print(f"📦 训练样本: {local_router.sample_counts}")
+
+    llm_route_fn = None
+    if with_llm:
+        llm_route_fn = lambda question: router.route(question, use_local=False)["primary_expert"]
+
+    report = local_router.evaluate(labelled, llm_route_fn=llm_route_fn)
+
+    print("-" * 50)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='评估本地路由分类器')
+    parser.add_argument('--labels', type=str, required=True,
+                        help='带标签问题集（JSONL）')
+    parser.add_argument('--threshold', type=float, default=settings.local_router_threshold,
+                        help='置信度阈值')
+    parser.add_argument('--with_llm', action='store_true',
+                        help='低置信度问题调用LLM路由，统计整体准确率')
+
+    args = parser.parse_args()
+
+    evaluate_router(args.labels, args.threshold, args.with_llm)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+导出向量快照
+将 ChromaDB 集合导出为 mmap 快照（.npy 矩阵 + id 数组 + 文档/元数据旁路文件），
+后端各 worker 共享加载。构建脚本结束时会自动导出，集合被修改后可用本脚本重新导出
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import chromadb
+from chromadb.config import Settings
+
+from backend.config.settings import settings
+from backend.repositories.vector_index import export_snapshot
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='导出 ChromaDB 集合的 mmap 向量快照')
+    parser.add_argument('--collection', type=str, default='lfp_papers',
+                        help='ChromaDB 集合名称')
+    parser.add_argument('--db-path', type=str, default=settings.vector_db_path,
+                        help='ChromaDB 路径')
+    parser.add_argument('--snapshot-dir', type=str, default=settings.vector_snapshot_dir,
+                        help='快照根目录（每个集合一个子目录），默认使用 VECTOR_SNAPSHOT_DIR，'
+                             '未配置时为 <db-path>/snapshots')
+
+    args = parser.parse_args()
+    if not args.snapshot_dir:
+        args.snapshot_dir = os.path.join(args.db_path, "snapshots")
+        print(f"ℹ️  未配置 VECTOR_SNAPSHOT_DIR，导出到 {args.snapshot_dir}；后端需配置该目录才会加载快照")
+
+    client = chromadb.PersistentClient(
+        path=args.db_path,
+        settings=Settings(anonymized_telemetry=False)
+    )
+    collection = client.get_collection(args.collection)
+    manifest = export_snapshot(collection, os.path.join(args.snapshot_dir, args.collection))
+    if manifest is None:
+        print("❌ 集合为空，未导出快照")
+        return
+    print(f"✅ 快照已导出: {manifest['count']} 条, {manifest['dim']} 维, space={manifest['space']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,15 @@
 """
 import json
 import os
+import sys
 from pathlib import Path
 import chromadb
 from chromadb.config import Settings
 
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from backend.repositories.vector_index import export_snapshot
+
 # 从环境变量读取配置
 VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", str(Path(__file__).parent.parent.parent / "vector_database"))
 
@@ -131,6 +136,9 @@ def import_json_data(json_dir: str, collection_name: str = "literature"):
     print(f"   导入后文档数: {count_after}")
     print(f"   新增文档数: {count_after - count_before}")
     
+    # 导出 mmap 快照（后端各 worker 共享加载）
+    export_snapshot(collection, os.path.join(VECTOR_DB_PATH, "snapshots", collection_name))
+    
     client.close()
 
 
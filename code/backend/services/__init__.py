@@ -6,6 +6,10 @@
 from .llm_service import LLMService, get_llm_service
 from .neo4j_service import Neo4jService, get_neo4j_service
 from .vector_service import VectorService, get_vector_service, reset_vector_service
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+from .embedding_client import EmbeddingClient, EmbeddingError, get_embedding_client
+from .local_embedding import LocalEmbeddingClient
+from .reranker import Reranker, get_reranker
 
 __all__ = [
     'LLMService',
@@ -15,4 +19,12 @@ __all__ = [
     'VectorService',
     'get_vector_service',
     'reset_vector_service',
+    'EmbeddingCache',
+    'get_embedding_cache',
+    'EmbeddingClient',
+    'EmbeddingError',
+    'get_embedding_client',
+    'LocalEmbeddingClient',
+    'Reranker',
+    'get_reranker',
 ]
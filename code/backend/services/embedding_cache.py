@@ -0,0 +1,289 @@
+"""
+查询向量缓存服务
+内存LRU + SQLite持久化两级缓存，按规范化文本和模型名缓存embedding
+"""
+from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+import array
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 问句末尾对检索无意义的标点
+_TRAILING_PUNCTUATION = "?？。.!！~～ "
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化查询文本：全半角统一、合并空白、转小写、去除句末标点
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        规范化后的文本
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+class EmbeddingCache:
+    """
+    查询向量两级缓存
+
+    - 内存层：进程内 LRU，命中时无任何IO
+    - 磁盘层：SQLite（WAL模式），跨重启保留，并在同一主机的多个worker间共享
+    - 磁盘命中只读不写：最近使用时间先记在内存，随下一次写入、淘汰前或累计一定条数时批量更新
+    """
+
+    # 每写入多少条检查一次磁盘容量
+    _PRUNE_INTERVAL = 200
+    # 累计多少条未写回的最近使用时间时批量更新一次
+    _TOUCH_FLUSH_SIZE = 256
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        memory_size: int = 2048,
+        max_rows: int = 100000,
+        model_name: Optional[str] = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite文件路径，为空时只使用内存层
+            memory_size: 内存层最大条数
+            max_rows: 磁盘层最大条数，超出时淘汰最久未使用的记录
+            model_name: 模型名称（参与缓存键，换模型后旧向量自然失效）
+        """
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._memory_size = max(0, memory_size)
+        self._max_rows = max_rows
+        self._model_name = model_name or settings.embedding_model_name
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._touched: Dict[str, float] = {}
+
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._conn = self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> Optional[sqlite3.Connection]:
+        """打开（必要时创建）SQLite缓存库，失败时退化为纯内存缓存"""
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            conn.commit()
+            logger.info(f"✅ 向量缓存已加载: {db_path}")
+            return conn
+        except Exception as e:
+            logger.warning(f"⚠️  向量缓存数据库不可用，仅使用内存缓存: {e}")
+            return None
+
+    def make_key(self, text: str) -> str:
+        """根据模型名和规范化文本生成缓存键"""
+        raw = f"{self._model_name}\n{normalize_text(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """
+        读取缓存向量
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            命中时返回向量，否则返回None
+        """
+        key = self.make_key(text)
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._hits_memory += 1
+                return vector
+
+            vector = self._disk_get(key)
+            if vector is not None:
+                self._remember(key, vector)
+                self._hits_disk += 1
+                return vector
+
+            self._misses += 1
+            return None
+
+    def put(self, text: str, vector: List[float]):
+        """
+        写入缓存向量
+
+        Args:
+            text: 查询文本
+            vector: embedding向量
+        """
+        key = self.make_key(text)
+        vector = [float(v) for v in vector]
+
+        with self._lock:
+            self._remember(key, vector)
+            self._disk_put(key, vector)
+
+    def _remember(self, key: str, vector: List[float]):
+        """写入内存层并按LRU淘汰"""
+        if self._memory_size == 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        """从磁盘层读取，最近使用时间延后批量写回"""
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= self._TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+            return array.array("f", row[0]).tolist()
+        except Exception as e:
+            logger.warning(f"⚠️  读取向量缓存失败: {e}")
+            return None
+
+    def _disk_put(self, key: str, vector: List[float]):
+        """写入磁盘层（float32），定期淘汰超出容量的旧记录"""
+        if self._conn is None:
+            return
+        try:
+            self._flush_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, self._model_name, len(vector), array.array("f", vector).tobytes(), time.time())
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= self._PRUNE_INTERVAL:
+                self._writes_since_prune = 0
+                self._prune()
+            self._conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️  写入向量缓存失败: {e}")
+
+    def _flush_touched(self):
+        """把累计的最近使用时间写回磁盘层（由调用方提交事务）"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+            [(used, key) for key, used in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def _prune(self):
+        """淘汰超出 max_rows 的最久未使用记录"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self._max_rows
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            logger.info(f"🗑️ 向量缓存淘汰 {overflow} 条旧记录")
+
+    def disk_size(self) -> int:
+        """磁盘层记录数"""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            try:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            except Exception:
+                return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中/未命中计数、命中率和各层大小
+        """
+        hits = self._hits_memory + self._hits_disk
+        total = hits + self._misses
+        return {
+            "model": self._model_name,
+            "hits_memory": self._hits_memory,
+            "hits_disk": self._hits_disk,
+            "misses": self._misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_size": len(self._memory),
+            "memory_limit": self._memory_size,
+            "disk_size": self.disk_size(),
+            "disk_limit": self._max_rows if self._conn is not None else 0
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_touched()
+                    self._conn.commit()
+                except Exception as e:
+                    logger.warning(f"⚠️  写回向量缓存使用时间失败: {e}")
+                self._conn.close()
+                self._conn = None
+
+
+# 全局缓存实例（懒加载）
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """获取全局查询向量缓存实例，未开启缓存时返回None"""
+    global _embedding_cache
+    if not settings.embedding_cache_enabled:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(
+                db_path=settings.embedding_cache_path,
+                memory_size=settings.embedding_cache_memory_size,
+                max_rows=settings.embedding_cache_max_rows
+            )
+    return _embedding_cache
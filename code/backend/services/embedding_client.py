@@ -0,0 +1,419 @@
+"""
+Embedding客户端服务
+统一封装对BGE /v1/embeddings 服务的调用：连接池复用、并发单条请求合批、有限次重试退避
+"""
+from typing import Optional, Dict, Any, List, Tuple, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import base64
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.config.settings import settings
+from backend.services.embedding_endpoints import Endpoint, EndpointPool
+from backend.services.shm_transport import LocalTransportError
+
+logger = logging.getLogger(__name__)
+
+# 响应编码格式 -> base64 解码后的数据类型（小端）；float 为 OpenAI 默认的JSON数组
+ENCODING_DTYPES = {
+    "float": None,
+    "base64": "<f4",
+    "base64_float16": "<f2",
+}
+
+
+def decode_embeddings(items: List[Union[str, List[float]]], encoding_format: str) -> np.ndarray:
+    """
+    将 /v1/embeddings 响应中的 embedding 字段解码为 float32 矩阵
+
+    base64 格式的向量直接拼接字节后一次解码；旧版服务忽略 encoding_format
+    返回JSON数组时同样可以解码
+
+    Args:
+        items: 各条 embedding（base64字符串或浮点数列表）
+        encoding_format: 请求时使用的编码格式
+
+    Returns:
+        形状为 (条数, 维度) 的 float32 数组
+    """
+    if not items:
+        return np.empty((0, 0), dtype=np.float32)
+    dtype = ENCODING_DTYPES.get(encoding_format)
+    if dtype is None or not isinstance(items[0], str):
+        return np.asarray(items, dtype=np.float32)
+
+    raw = b"".join(base64.b64decode(item) for item in items)
+    return np.frombuffer(raw, dtype=dtype).astype(np.float32).reshape(len(items), -1)
+
+
+class EmbeddingError(Exception):
+    """Embedding服务调用失败（重试耗尽或不可重试的错误）"""
+    pass
+
+
+class _RetryableError(Exception):
+    """可重试的服务端响应（429 / 5xx）或连接失败"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, status: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+class EmbeddingClient:
+    """
+    Embedding客户端
+
+    - 连接池：同一 requests.Session 复用 keep-alive 连接
+    - 合批：embed_query 提交的单条请求在 batch_window_ms 时间窗内合并为一次批量调用
+    - 重试：连接错误、超时、429 和 5xx 按指数退避重试，最多 max_retries 次
+    - 传输：默认请求 base64 编码的 float32 向量，直接解码为 NumPy 数组；
+      api_url 为 unix:// 路径时改用 Unix 域套接字 + 共享内存（同机部署）
+    - 负载均衡：配置多个服务地址时按未完成请求数选择端点，失败端点摘除并探测恢复
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        max_backoff: float = 30.0,
+        batch_size: int = 32,
+        batch_window_ms: float = 5.0,
+        pool_size: int = 8,
+        encoding_format: Optional[str] = None,
+        api_urls: Optional[List[str]] = None,
+        lb_strategy: Optional[str] = None,
+        health_interval: Optional[float] = None
+    ):
+        """
+        初始化Embedding客户端
+
+        Args:
+            api_url: Embedding服务地址（http(s):// 或 unix:///path/to/bge.sock），默认使用配置
+            timeout: 单次请求超时（秒）
+            max_retries: 最大重试次数
+            backoff_base: 退避基数（秒），第n次重试等待 backoff_base * 2^n
+            max_backoff: 单次退避上限（秒）
+            batch_size: 单次请求最多包含的文本数
+            batch_window_ms: 单条请求合批的等待时间窗（毫秒）
+            pool_size: 连接池大小，同时也是并发批次上限
+            encoding_format: 响应编码格式（float/base64/base64_float16），默认使用配置
+            api_urls: 多个服务地址（负载均衡），优先于 api_url，默认使用配置
+            lb_strategy: 负载均衡策略（p2c/least），默认使用配置
+            health_interval: 不健康端点的探测间隔（秒），默认使用配置
+        """
+        urls = api_urls or ([api_url] if api_url else settings.bge_api_urls)
+        self.api_url = urls[0]
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.batch_size = max(1, batch_size)
+        self.batch_window = max(0.0, batch_window_ms) / 1000.0
+        self.pool_size = max(1, pool_size)
+        self.encoding_format = encoding_format or settings.embedding_encoding_format
+        if self.encoding_format not in ENCODING_DTYPES:
+            raise ValueError(f"不支持的encoding_format: {self.encoding_format}，"
+                             f"可选: {', '.join(ENCODING_DTYPES)}")
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=self.pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._endpoints = EndpointPool(
+            urls,
+            strategy=lb_strategy or settings.embedding_lb_strategy,
+            health_interval=health_interval if health_interval is not None else settings.embedding_health_interval,
+            timeout=self.timeout,
+            pool_size=self.pool_size,
+            session=self._session
+        )
+
+        # 合批队列和调度线程（懒启动）
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._senders: Optional[ThreadPoolExecutor] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "coalesced_batches": 0, "retries": 0, "errors": 0}
+
+    # ==================== 批量调用 ====================
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        批量生成向量（按 batch_size 分块请求）
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的 float32 矩阵，形状为 (文本数, 维度)
+
+        Raises:
+            EmbeddingError: 重试耗尽仍失败
+        """
+        chunks = [
+            self._post(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(chunks) if len(chunks) > 1 else np.asarray(chunks[0], dtype=np.float32)
+
+    async def aembed_batch(self, texts: List[str]) -> np.ndarray:
+        """批量生成向量（异步，在线程池中执行）"""
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+    # ==================== 单条调用（合批） ====================
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """
+        生成单条文本向量，与同一时间窗内的其他请求合并发送
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            float32 向量
+
+        Raises:
+            EmbeddingError: 重试耗尽仍失败
+        """
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """生成单条文本向量（异步），与同步调用共享合批队列"""
+        return await asyncio.wrap_future(self._submit(text))
+
+    def _submit(self, text: str) -> Future:
+        """将单条请求放入合批队列"""
+        if self._closed:
+            raise EmbeddingError("Embedding客户端已关闭")
+        self._ensure_dispatcher()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_dispatcher(self):
+        """懒启动合批调度线程"""
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._senders = ThreadPoolExecutor(
+                    max_workers=self.pool_size,
+                    thread_name_prefix="embedding-sender"
+                )
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop,
+                    name="embedding-batcher",
+                    daemon=True
+                )
+                self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        """收集时间窗内的请求，组成批次后交给发送线程"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._senders.submit(self._send_batch, batch)
+                    return
+                batch.append(item)
+
+            self._senders.submit(self._send_batch, batch)
+
+    def _send_batch(self, batch: List[Tuple[str, Future]]):
+        """发送一个合并批次，并把结果分发回各请求（相同文本只发送一次）"""
+        pending = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        unique_texts = list(dict.fromkeys(text for text, _ in pending))
+        with self._stats_lock:
+            self._stats["coalesced_batches"] += 1
+
+        try:
+            vectors = dict(zip(unique_texts, self._post(unique_texts)))
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        for text, future in pending:
+            future.set_result(vectors[text])
+
+    # ==================== 请求发送 ====================
+
+    def _post(self, texts: List[str]) -> np.ndarray:
+        """发送一次批量请求，失败时按指数退避重试（多端点时重试会避开已摘除的端点）"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._post_once(texts)
+            except (requests.ConnectionError, requests.Timeout, _RetryableError) as e:
+                last_error = e
+                if attempt == self.max_retries:
+                    break
+                wait = min(self.max_backoff, self.backoff_base * (2 ** attempt))
+                if isinstance(e, _RetryableError) and e.retry_after is not None:
+                    wait = min(self.max_backoff, max(wait, e.retry_after))
+                logger.warning(f"⚠️  Embedding请求失败，{wait:.1f}秒后重试 "
+                               f"(第{attempt + 1}/{self.max_retries}次): {e}")
+                with self._stats_lock:
+                    self._stats["retries"] += 1
+                time.sleep(wait)
+            except Exception as e:
+                last_error = e
+                break
+
+        with self._stats_lock:
+            self._stats["errors"] += 1
+        raise EmbeddingError(f"Embedding服务调用失败: {last_error}") from last_error
+
+    def _post_once(self, texts: List[str]) -> np.ndarray:
+        """选择一个端点发送单次请求；连接失败、超时和 5xx 时摘除该端点，重试会落到其他端点"""
+        endpoint = self._endpoints.acquire()
+        try:
+            if endpoint.transport is not None:
+                vectors = self._post_local(endpoint, texts)
+            else:
+                vectors = self._post_http(endpoint, texts)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._endpoints.release(endpoint, e)
+            raise
+        except _RetryableError as e:
+            # 429 表示端点过载而非故障，不摘除
+            self._endpoints.release(endpoint, None if e.status == 429 else e)
+            raise
+        except Exception:
+            self._endpoints.release(endpoint)
+            raise
+        self._endpoints.release(endpoint)
+        return vectors
+
+    def _post_http(self, endpoint: Endpoint, texts: List[str]) -> np.ndarray:
+        """发送HTTP请求并解码响应"""
+        response = self._session.post(
+            endpoint.url,
+            json={"input": texts, "encoding_format": self.encoding_format},
+            timeout=self.timeout
+        )
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise _RetryableError(
+                f"HTTP {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                status=response.status_code
+            )
+        response.raise_for_status()
+
+        data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+        if len(data) != len(texts):
+            raise EmbeddingError(f"返回向量数量不匹配: {len(data)} != {len(texts)}")
+        return decode_embeddings([item["embedding"] for item in data], self.encoding_format)
+
+    def _post_local(self, endpoint: Endpoint, texts: List[str]) -> np.ndarray:
+        """通过本机 Unix 套接字 + 共享内存发送请求（错误按HTTP状态码同样的规则重试）"""
+        try:
+            vectors = endpoint.transport.post(texts)
+        except ConnectionError as e:
+            raise _RetryableError(str(e))
+        except LocalTransportError as e:
+            if e.status == 429 or e.status >= 500:
+                raise _RetryableError(str(e), status=e.status)
+            raise EmbeddingError(f"Embedding服务返回错误: {e}")
+
+        if len(vectors) != len(texts):
+            raise EmbeddingError(f"返回向量数量不匹配: {len(vectors)} != {len(texts)}")
+        return vectors
+
+    # ==================== 其他 ====================
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取调用统计
+
+        Returns:
+            请求数、文本数、合批次数、重试次数、失败次数、平均批大小和各端点状态
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["backend"] = "http"
+        stats["encoding_format"] = self.encoding_format
+        stats["lb_strategy"] = self._endpoints.strategy
+        stats["endpoints"] = self._endpoints.stats()
+        stats["avg_batch_size"] = stats["texts"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def close(self):
+        """停止合批线程并关闭连接池"""
+        self._closed = True
+        if self._dispatcher is not None:
+            self._queue.put(None)
+            self._dispatcher.join(timeout=5)
+            self._senders.shutdown(wait=True)
+        self._endpoints.close()
+        self._session.close()
+
+
+# 全局客户端实例（懒加载）
+_embedding_client: Optional[Any] = None
+_embedding_client_lock = threading.Lock()
+
+
+def get_embedding_client():
+    """
+    获取全局Embedding客户端实例
+
+    Returns:
+        EMBEDDING_BACKEND=local 时返回 LocalEmbeddingClient，否则返回 EmbeddingClient
+    """
+    global _embedding_client
+    with _embedding_client_lock:
+        if _embedding_client is None:
+            if settings.embedding_backend == "local":
+                from backend.services.local_embedding import LocalEmbeddingClient
+                _embedding_client = LocalEmbeddingClient(batch_size=settings.embedding_batch_size)
+            else:
+                _embedding_client = EmbeddingClient(
+                    timeout=settings.embedding_timeout,
+                    max_retries=settings.embedding_max_retries,
+                    batch_size=settings.embedding_batch_size,
+                    batch_window_ms=settings.embedding_batch_window_ms,
+                    pool_size=settings.embedding_pool_size
+                )
+            logger.info(f"🔌 Embedding后端: {settings.embedding_backend}")
+    return _embedding_client
@@ -0,0 +1,191 @@
+"""
+Embedding服务端点池
+多个 bge_server 实例间的客户端负载均衡：按未完成请求数选择端点（最少未完成 / 二选一），
+请求失败的端点摘除，后台线程通过 /health 探测恢复
+"""
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit, urlunsplit
+import logging
+import random
+import threading
+
+import requests
+
+from backend.services.shm_transport import UnixSocketTransport
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """单个Embedding服务端点及其负载、健康状态"""
+
+    def __init__(self, url: str, timeout: float = 30.0, pool_size: int = 8):
+        """
+        初始化端点
+
+        Args:
+            url: 服务地址（http(s)://.../v1/embeddings 或 unix:///path/to/bge.sock）
+            timeout: 单次请求超时（秒）
+            pool_size: unix 传输的连接池大小
+        """
+        self.url = url
+        self.transport: Optional[UnixSocketTransport] = None
+        self.health_url: Optional[str] = None
+        if url.startswith("unix://"):
+            self.transport = UnixSocketTransport(url[len("unix://"):], timeout=timeout, pool_size=pool_size)
+        else:
+            parts = urlsplit(url)
+            self.health_url = urlunsplit((parts.scheme, parts.netloc, "/health", "", ""))
+
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        """端点状态"""
+        stats = {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+        if self.transport is not None:
+            stats.update(self.transport.stats())
+        else:
+            stats["transport"] = "http"
+        return stats
+
+
+class EndpointPool:
+    """
+    端点池
+
+    - 选择：p2c 随机取两个健康端点选未完成请求较少者，least 直接选未完成请求最少者
+    - 摘除：连接失败、超时或 5xx 时标记为不健康，不再参与选择
+    - 恢复：后台线程每 health_interval 秒探测不健康端点的 /health，恢复后重新加入
+    - 全部不健康时仍在所有端点中选择，避免因探测滞后拒绝服务
+    """
+
+    STRATEGIES = ("p2c", "least")
+
+    def __init__(
+        self,
+        urls: List[str],
+        strategy: str = "p2c",
+        health_interval: float = 5.0,
+        timeout: float = 30.0,
+        pool_size: int = 8,
+        session: Optional[requests.Session] = None
+    ):
+        """
+        初始化端点池
+
+        Args:
+            urls: 端点地址列表
+            strategy: 选择策略（p2c/least）
+            health_interval: 不健康端点的探测间隔（秒）
+            timeout: 单次请求超时（秒）
+            pool_size: unix 传输的连接池大小
+            session: 探测使用的 requests.Session
+        """
+        if not urls:
+            raise ValueError("至少需要一个Embedding服务地址")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"不支持的负载均衡策略: {strategy}，可选: {', '.join(self.STRATEGIES)}")
+
+        self.endpoints = [Endpoint(url, timeout=timeout, pool_size=pool_size) for url in dict.fromkeys(urls)]
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self._session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    def acquire(self) -> Endpoint:
+        """选择一个端点并计入未完成请求"""
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep.healthy] or self.endpoints
+            if len(candidates) == 1:
+                endpoint = candidates[0]
+            elif self.strategy == "p2c":
+                first, second = random.sample(candidates, 2)
+                endpoint = first if first.outstanding <= second.outstanding else second
+            else:
+                least = min(ep.outstanding for ep in candidates)
+                endpoint = random.choice([ep for ep in candidates if ep.outstanding == least])
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, error: Optional[Exception] = None):
+        """
+        归还端点
+
+        Args:
+            endpoint: acquire 返回的端点
+            error: 需要摘除端点的错误（连接失败、超时、5xx），成功或客户端错误时为None
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                return
+            endpoint.failures += 1
+            endpoint.last_error = str(error)
+            if not endpoint.healthy or len(self.endpoints) == 1:
+                return
+            endpoint.healthy = False
+        logger.warning(f"⚠️  Embedding端点不可用，暂时摘除: {endpoint.url} ({error})")
+        self._ensure_prober()
+
+    def _ensure_prober(self):
+        """懒启动健康探测线程"""
+        with self._lock:
+            if self._prober is not None or self._stop.is_set():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="embedding-prober", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        """定期探测不健康端点，全部恢复后退出"""
+        while not self._stop.wait(self.health_interval):
+            for endpoint in [ep for ep in self.endpoints if not ep.healthy]:
+                if self.probe(endpoint):
+                    with self._lock:
+                        endpoint.healthy = True
+                    logger.info(f"✅ Embedding端点已恢复: {endpoint.url}")
+            with self._lock:
+                if all(ep.healthy for ep in self.endpoints):
+                    self._prober = None
+                    return
+
+    def probe(self, endpoint: Endpoint) -> bool:
+        """
+        探测端点是否可用
+
+        Returns:
+            HTTP 端点 /health 返回 healthy（模型已加载）时为True；unix 端点能完成握手时为True
+        """
+        try:
+            if endpoint.transport is not None:
+                endpoint.transport.ping()
+                return True
+            response = self._session.get(endpoint.health_url, timeout=2.0)
+            return response.status_code == 200 and response.json().get("status") == "healthy"
+        except Exception:
+            return False
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各端点状态"""
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        """停止探测线程并关闭 unix 传输"""
+        self._stop.set()
+        for endpoint in self.endpoints:
+            if endpoint.transport is not None:
+                endpoint.transport.close()
@@ -2,10 +2,11 @@
 LLM服务
 封装大语言模型调用
 """
-from typing import Optional, Dict, Any, List, Generator
+from typing import Optional, Dict, Any, List, Generator, AsyncGenerator
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage
 import logging
+import threading
 
 from backend.config.settings import settings
 
@@ -13,7 +14,14 @@ logger = logging.getLogger(__name__)
 
 
 class LLMService:
-    """LLM服务类"""
+    """
+    LLM服务类
+    
+    按分级配置（fast/synthesis/translate）懒加载各自的模型客户端，
+    调用方通过 profile 参数选择，默认使用 synthesis
+    """
+    
+    DEFAULT_PROFILE = "synthesis"
     
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         """
@@ -21,58 +29,130 @@ class LLMService:
         
         Args:
             api_key: API密钥，默认使用配置
-            model: 模型名称，默认使用配置
+            model: synthesis 配置使用的模型名称，默认使用配置
         """
-        api_key = api_key or settings.llm_api_key
-        base_url = settings.llm_base_url
-        model = model or settings.llm_model
+        self._api_key = api_key or settings.llm_api_key
+        self._base_url = settings.llm_base_url
+        self._model_override = model
         
-        if not api_key:
+        if not self._api_key:
             raise ValueError("未配置LLM API密钥")
         
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=settings.llm_temperature,
-            max_tokens=settings.llm_max_tokens,
-            timeout=60.0,
-            max_retries=3,
-            api_key=api_key,
-            base_url=base_url
-        )
-        logger.info(f"✅ LLM服务初始化成功: {model}")
+        self._clients: Dict[str, ChatOpenAI] = {}
+        self._clients_lock = threading.Lock()
+        
+        self.llm = self.get_client(self.DEFAULT_PROFILE)
+        logger.info(f"✅ LLM服务初始化成功: {self.model_name}")
+    
+    def get_client(self, profile: Optional[str] = None) -> ChatOpenAI:
+        """
+        获取指定分级配置的模型客户端（懒加载）
+        
+        Args:
+            profile: 配置名称（fast/synthesis/translate），默认 synthesis
+            
+        Returns:
+            ChatOpenAI 实例
+        """
+        profile = profile or self.DEFAULT_PROFILE
+        client = self._clients.get(profile)
+        if client is not None:
+            return client
+        
+        config = settings.llm_profile(profile)
+        if profile == self.DEFAULT_PROFILE and self._model_override:
+            config["model"] = self._model_override
+        
+        with self._clients_lock:
+            if profile not in self._clients:
+                self._clients[profile] = ChatOpenAI(
+                    model=config["model"],
+                    temperature=config["temperature"],
+                    max_tokens=config["max_tokens"],
+                    timeout=config["timeout"],
+                    max_retries=3,
+                    api_key=self._api_key,
+                    base_url=self._base_url
+                )
+                logger.info(f"🔧 LLM配置 {profile}: {config['model']} "
+                           f"(max_tokens={config['max_tokens']}, timeout={config['timeout']}s)")
+            return self._clients[profile]
     
-    def invoke(self, messages: List[BaseMessage]) -> BaseMessage:
+    def invoke(self, messages: List[BaseMessage], profile: Optional[str] = None) -> BaseMessage:
         """
         调用LLM（同步）
         
         Args:
             messages: 消息列表
+            profile: LLM分级配置名称，默认 synthesis
             
         Returns:
             LLM响应
         """
-        return self.llm.invoke(messages)
+        return self.get_client(profile).invoke(messages)
     
-    def stream(self, messages: List[BaseMessage]) -> Generator[BaseMessage, None, None]:
+    def stream(
+        self,
+        messages: List[BaseMessage],
+        profile: Optional[str] = None
+    ) -> Generator[BaseMessage, None, None]:
         """
         调用LLM（流式）
         
         Args:
             messages: 消息列表
+            profile: LLM分级配置名称，默认 synthesis
+            
+        Yields:
+            消息块
+        """
+        for chunk in self.get_client(profile).stream(messages):
+            yield chunk
+    
+    async def ainvoke(self, messages: List[BaseMessage], profile: Optional[str] = None) -> BaseMessage:
+        """
+        调用LLM（异步）
+        
+        Args:
+            messages: 消息列表
+            profile: LLM分级配置名称，默认 synthesis
+            
+        Returns:
+            LLM响应
+        """
+        return await self.get_client(profile).ainvoke(messages)
+    
+    async def astream(
+        self,
+        messages: List[BaseMessage],
+        profile: Optional[str] = None
+    ) -> AsyncGenerator[BaseMessage, None]:
+        """
+        调用LLM（异步流式）
+        
+        Args:
+            messages: 消息列表
+            profile: LLM分级配置名称，默认 synthesis
             
         Yields:
             消息块
         """
-        for chunk in self.llm.stream(messages):
+        async for chunk in self.get_client(profile).astream(messages):
             yield chunk
     
-    def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        profile: Optional[str] = None
+    ) -> str:
         """
         简单生成（便捷方法）
         
         Args:
             prompt: 用户提示
             system_prompt: 系统提示（可选）
+            profile: LLM分级配置名称，默认 synthesis
             
         Returns:
             生成的文本
@@ -84,7 +164,7 @@ class LLMService:
             messages.append(SystemMessage(content=system_prompt))
         messages.append(HumanMessage(content=prompt))
         
-        response = self.invoke(messages)
+        response = self.invoke(messages, profile=profile)
         return response.content
     
     @property
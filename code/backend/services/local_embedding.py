@@ -0,0 +1,156 @@
+"""
+进程内Embedding后端
+在当前进程加载 bge-large-zh-v1.5（sentence-transformers，PyTorch 或 ONNX Runtime），
+接口与 EmbeddingClient 一致，单机部署时省去到 bge_server 的网络往返
+"""
+from typing import Optional, Dict, Any, List
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+DEFAULT_MODEL_ID = "BAAI/bge-large-zh-v1.5"
+
+
+class LocalEmbeddingClient:
+    """
+    进程内Embedding客户端
+
+    模型在首次调用时加载，每个worker进程只加载一次；
+    编码参数与 bge_server.py 相同（L2归一化），向量与HTTP后端一致
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        runtime: Optional[str] = None,
+        batch_size: int = 32,
+        model: Optional[Any] = None
+    ):
+        """
+        初始化进程内Embedding客户端
+
+        Args:
+            model_name: 本地模型目录或HuggingFace模型名，默认使用配置
+            device: 运行设备（cpu/cuda），默认使用配置
+            runtime: 推理运行时（torch/onnx），默认使用配置
+            batch_size: 编码批大小
+            model: 已加载的模型对象（需提供 encode 方法），传入时不再加载
+        """
+        self.model_name = self._resolve_model_name(model_name or settings.embedding_local_model)
+        self.device = device or settings.embedding_local_device
+        self.runtime = runtime or settings.embedding_local_runtime
+        self.batch_size = max(1, batch_size)
+
+        self._model = model
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "encode_seconds": 0.0}
+
+    @staticmethod
+    def _resolve_model_name(model_name: str) -> str:
+        """本地模型目录不存在时改用HuggingFace模型名"""
+        if os.path.isabs(model_name) and not os.path.exists(model_name):
+            logger.warning(f"⚠️  本地模型目录不存在: {model_name}，改用 {DEFAULT_MODEL_ID}")
+            return DEFAULT_MODEL_ID
+        return model_name
+
+    @property
+    def model(self) -> Any:
+        """懒加载模型（线程安全，只加载一次）"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def _load_model(self) -> Any:
+        """加载sentence-transformers模型"""
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("sentence-transformers 未安装，无法使用进程内Embedding后端")
+
+        logger.info(f"🔄 正在加载进程内Embedding模型: {self.model_name} "
+                    f"(device={self.device}, runtime={self.runtime})")
+        start = time.time()
+        kwargs = {"device": self.device}
+        if self.runtime == "onnx":
+            # 需要 sentence-transformers>=3.2 和 optimum[onnxruntime]
+            kwargs["backend"] = "onnx"
+        model = SentenceTransformer(self.model_name, **kwargs)
+        logger.info(f"✅ 进程内Embedding模型加载完成 ({time.time() - start:.1f}s)")
+        return model
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        批量生成向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的 float32 矩阵，形状为 (文本数, 维度)
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        start = time.perf_counter()
+        embeddings = self.model.encode(
+            texts,
+            normalize_embeddings=True,  # 与 bge_server 一致，L2 归一化
+            show_progress_bar=False,
+            batch_size=self.batch_size
+        )
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+            self._stats["encode_seconds"] += elapsed
+
+        return np.asarray(embeddings, dtype=np.float32)
+
+    async def aembed_batch(self, texts: List[str]) -> np.ndarray:
+        """批量生成向量（异步，在线程池中执行）"""
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """生成单条文本向量"""
+        return self.embed_batch([text])[0]
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """生成单条文本向量（异步，在线程池中执行）"""
+        return (await self.aembed_batch([text]))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取调用统计
+
+        Returns:
+            请求数、文本数、累计和平均编码耗时
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["backend"] = "local"
+        stats["model"] = self.model_name
+        stats["avg_encode_ms"] = (
+            stats["encode_seconds"] * 1000 / stats["requests"] if stats["requests"] else 0.0
+        )
+        return stats
+
+    def close(self):
+        """释放模型"""
+        self._model = None
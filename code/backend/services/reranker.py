@@ -0,0 +1,245 @@
+"""
+交叉编码器重排序
+用 bge-reranker（或配置的 CrossEncoder 模型）对 (问题, 切片) 对一次批量前向打分，
+按延迟预算截断参与重排的候选数，预算不足或模型未就绪时跳过
+"""
+from typing import Optional, Dict, Any, List, Tuple
+import logging
+import threading
+import time
+
+import numpy as np
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    CROSS_ENCODER_AVAILABLE = False
+
+
+class Reranker:
+    """
+    交叉编码器重排序器
+
+    - 预算：按每对耗时估计（初始为配置值，之后用实测值指数平滑）计算预算内可重排的候选数，
+      只重排排名最前的这些候选，其余保持原顺序接在后面
+    - 估计值只能由实际执行的重排更新，因此每次因超出预算跳过时向初始配置值衰减，
+      避免一次偶发的慢请求让重排永久停用
+    - 模型在后台线程加载并做一次预热前向（不计入估计），加载完成前的请求直接跳过，不占用请求延迟
+    """
+
+    # 每次因超出预算跳过时，耗时估计向初始配置值衰减的系数
+    SKIP_DECAY = 0.9
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        max_length: Optional[int] = None,
+        budget_ms: Optional[float] = None,
+        ms_per_pair: Optional[float] = None,
+        min_candidates: Optional[int] = None,
+        model: Optional[Any] = None
+    ):
+        """
+        初始化重排序器
+
+        Args:
+            model_name: CrossEncoder 模型目录或HuggingFace模型名，默认使用配置
+            device: 运行设备，默认使用配置
+            max_length: (问题, 切片) 对的最大 token 数
+            budget_ms: 单次重排的延迟预算（毫秒）
+            ms_per_pair: 每对耗时的初始估计（毫秒）
+            min_candidates: 预算内可重排的候选少于该值时跳过
+            model: 已加载的模型对象（需提供 predict 方法），传入时不再加载
+        """
+        self.model_name = model_name or settings.reranker_model
+        self.device = device or settings.reranker_device
+        self.max_length = max_length or settings.reranker_max_length
+        self.budget_ms = settings.reranker_budget_ms if budget_ms is None else budget_ms
+        self.min_candidates = max(1, settings.reranker_min_candidates if min_candidates is None else min_candidates)
+        self._initial_ms_per_pair = settings.reranker_ms_per_pair if ms_per_pair is None else ms_per_pair
+        self._ms_per_pair = self._initial_ms_per_pair
+
+        self._model = model
+        self._load_error: Optional[str] = None
+        self._loader: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "reranked": 0, "skipped": 0, "pairs": 0, "rerank_seconds": 0.0}
+
+    @property
+    def ready(self) -> bool:
+        """模型是否已加载（未加载时在后台开始加载）"""
+        if self._model is None:
+            self.warmup()
+        return self._model is not None
+
+    def warmup(self):
+        """在后台线程加载模型（只加载一次）"""
+        with self._lock:
+            if self._model is not None or self._loader is not None or self._load_error:
+                return
+            self._loader = threading.Thread(target=self._load_model, name="reranker-load", daemon=True)
+            self._loader.start()
+
+    def _load_model(self):
+        """加载 CrossEncoder 模型"""
+        if not CROSS_ENCODER_AVAILABLE:
+            self._load_error = "sentence-transformers 未安装"
+            logger.warning(f"⚠️  {self._load_error}，重排序已停用")
+            return
+        try:
+            logger.info(f"🔄 正在加载重排序模型: {self.model_name} (device={self.device})")
+            start = time.time()
+            model = CrossEncoder(self.model_name, device=self.device, max_length=self.max_length)
+            # 预热：首次前向包含内核初始化和内存分配，耗时远高于稳态，不计入每对耗时估计
+            model.predict([("warmup", "warmup")], batch_size=1, show_progress_bar=False)
+            self._model = model
+            logger.info(f"✅ 重排序模型加载完成 ({time.time() - start:.1f}s)")
+        except Exception as e:
+            self._load_error = str(e)
+            logger.error(f"❌ 重排序模型加载失败: {e}")
+
+    def plan(self, n_candidates: int, budget_ms: Optional[float] = None) -> int:
+        """
+        预算内可重排的候选数
+
+        Args:
+            n_candidates: 候选总数
+            budget_ms: 延迟预算，默认使用实例配置
+
+        Returns:
+            参与重排的候选数，小于 min_candidates 时为0（跳过）
+        """
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        fits = int(budget // max(self._ms_per_pair, 1e-3))
+        count = min(n_candidates, fits)
+        return count if count >= min(self.min_candidates, n_candidates) and count > 1 else 0
+
+    def rerank(
+        self,
+        question: str,
+        documents: List[Dict[str, Any]],
+        budget_ms: Optional[float] = None,
+        top_n: int = 0
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        重排序
+
+        Args:
+            question: 用户问题
+            documents: 按当前相关性排序的候选（使用 content 字段）
+            budget_ms: 本次请求的延迟预算，默认使用实例配置
+            top_n: 重排后保留的数量，0 表示全部保留
+
+        Returns:
+            (重排后的文档, 本次重排记录)。记录包含是否执行、跳过原因、候选数、耗时和名次变化；
+            重排的文档附带 rerank_score 和 pre_rerank_rank
+        """
+        info: Dict[str, Any] = {"applied": False, "candidates": len(documents), "model": self.model_name}
+        count = self.plan(len(documents), budget_ms)
+        reason = None
+        if not documents:
+            reason = "no_candidates"
+        elif self._load_error:
+            reason = "unavailable"
+        elif not self.ready:
+            reason = "model_loading"
+        elif count == 0:
+            reason = "over_budget"
+            # 跳过时没有新的实测值，估计向初始值衰减，之后的请求会以小批量重新测量
+            self._ms_per_pair = max(
+                self._initial_ms_per_pair,
+                self._initial_ms_per_pair + (self._ms_per_pair - self._initial_ms_per_pair) * self.SKIP_DECAY
+            )
+        if reason:
+            info["skipped"] = reason
+            self._record(skipped=True)
+            return (documents[:top_n] if top_n else documents), info
+
+        head, tail = documents[:count], documents[count:]
+        pairs = [(question, doc.get("content", "")) for doc in head]
+        start = time.perf_counter()
+        scores = np.asarray(
+            self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+            dtype=np.float32
+        ).reshape(-1)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        order = np.argsort(-scores, kind="stable")
+        for rank, doc in enumerate(head, 1):
+            doc["pre_rerank_rank"] = rank
+        for i, doc in enumerate(head):
+            doc["rerank_score"] = float(scores[i])
+        reranked = [head[i] for i in order] + tail
+        shifts = np.abs(order - np.arange(count))
+
+        # 实测每对耗时指数平滑，用于后续请求的预算计算
+        self._ms_per_pair = 0.7 * self._ms_per_pair + 0.3 * elapsed_ms / count
+        self._record(pairs=count, seconds=elapsed_ms / 1000)
+
+        info.update({
+            "applied": True,
+            "reranked": count,
+            "truncated": len(tail),
+            "elapsed_ms": round(elapsed_ms, 1),
+            "budget_ms": self.budget_ms if budget_ms is None else budget_ms,
+            "moved": int(np.count_nonzero(shifts)),
+            "mean_shift": round(float(shifts.mean()), 2),
+            "top1_changed": bool(order[0] != 0)
+        })
+        return (reranked[:top_n] if top_n else reranked), info
+
+    def _record(self, skipped: bool = False, pairs: int = 0, seconds: float = 0.0):
+        with self._lock:
+            self._stats["requests"] += 1
+            if skipped:
+                self._stats["skipped"] += 1
+            else:
+                self._stats["reranked"] += 1
+                self._stats["pairs"] += pairs
+                self._stats["rerank_seconds"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取调用统计
+
+        Returns:
+            请求数、执行/跳过次数、平均耗时和当前每对耗时估计
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["model"] = self.model_name
+        stats["ready"] = self._model is not None
+        stats["load_error"] = self._load_error
+        stats["budget_ms"] = self.budget_ms
+        stats["ms_per_pair"] = round(self._ms_per_pair, 2)
+        stats["avg_rerank_ms"] = (
+            stats["rerank_seconds"] * 1000 / stats["reranked"] if stats["reranked"] else 0.0
+        )
+        return stats
+
+
+# 全局重排序器实例（懒加载）
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[Reranker]:
+    """
+    获取全局重排序器实例
+
+    Returns:
+        RERANKER_ENABLED 为 True 时返回 Reranker，否则返回None
+    """
+    global _reranker
+    if not settings.reranker_enabled:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker()
+    return _reranker
@@ -0,0 +1,208 @@
+"""
+本机Embedding传输
+与 bge_server 同机部署时通过 Unix 域套接字发送文本，向量由服务端写入共享内存，
+客户端按偏移映射为 NumPy 视图直接返回（不拷贝），省去TCP、HTTP和JSON解析
+"""
+from typing import Optional, Dict, Any, List
+from collections import deque
+from multiprocessing import shared_memory
+import logging
+import socket
+import struct
+import threading
+import weakref
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 协议（小端，与 bge_server.SharedMemoryTransport 一致）
+# 握手（服务端 -> 客户端）: u32 名称长度 + 共享内存名称 + u64 缓冲区大小
+# 请求: u32 文本数 + 每条 (u32 字节数 + UTF-8 文本)
+# 响应: u32 状态码 + u32 行数 + u32 维度 + u64 偏移；状态码非200时随后是 u32 长度 + 错误信息
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_RESPONSE = struct.Struct("<IIIQ")
+
+
+class LocalTransportError(Exception):
+    """服务端返回的错误（状态码含义与HTTP一致）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """读取指定字节数，对端关闭时抛出ConnectionError"""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("bge_server 已关闭连接")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """只读方式挂载服务端创建的共享内存，不交给本进程的 resource_tracker 回收"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class UnixSocketTransport:
+    """
+    Unix 域套接字 + 共享内存传输
+
+    服务端为每个连接保留一段区域，直到该连接发送下一个请求或断开。
+    post 返回的数组是该区域上的只读视图，连接在视图（及由它切片、reshape 得到的所有视图）
+    被回收后才放回连接池，因此视图存活期间区域不会被复用；需要长期保存时调用方自行拷贝
+    （如写入向量缓存时转为列表）。连接池为 deque，回收回调中只做原子的 append，不持有锁。
+    服务端重启后共享内存名称变化，新连接握手时自动重新挂载
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0, pool_size: int = 8):
+        """
+        初始化传输
+
+        Args:
+            path: bge_server 的 Unix 套接字路径
+            timeout: 单次请求超时（秒）
+            pool_size: 空闲连接池大小
+        """
+        self.path = path
+        self.timeout = timeout
+        self.pool_size = max(1, pool_size)
+        self._idle: "deque[socket.socket]" = deque()
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._retired: List[shared_memory.SharedMemory] = []
+        self._shm_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> socket.socket:
+        """建立连接并完成握手"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+            (name_len,) = _U32.unpack(_recv_exact(sock, _U32.size))
+            name = _recv_exact(sock, name_len).decode("utf-8")
+            _recv_exact(sock, _U64.size)  # 缓冲区大小，仅用于诊断
+        except Exception:
+            sock.close()
+            raise
+
+        with self._shm_lock:
+            if self._shm is None or self._shm.name.lstrip("/") != name.lstrip("/"):
+                if self._shm is not None:
+                    self._retired.append(self._shm)
+                self._shm = _attach_shared_memory(name)
+                self._close_retired()
+                logger.info(f"🔗 已挂载 bge_server 共享内存: {name} ({self._shm.size // (1024 * 1024)} MB)")
+        return sock
+
+    def _close_retired(self):
+        """卸载旧的共享内存（仍有视图引用时留到下次）"""
+        alive = []
+        for shm in self._retired:
+            try:
+                shm.close()
+            except BufferError:
+                alive.append(shm)
+        self._retired = alive
+
+    def _acquire(self) -> socket.socket:
+        try:
+            return self._idle.pop()
+        except IndexError:
+            return self._connect()
+
+    def _release(self, sock: socket.socket):
+        """归还连接（也作为视图回收回调，只做原子操作）"""
+        if not self._closed and len(self._idle) < self.pool_size:
+            self._idle.append(sock)
+        else:
+            sock.close()
+
+    def post(self, texts: List[str]) -> np.ndarray:
+        """
+        发送一批文本并读取向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为 (文本数, 维度) 的 float32 只读数组，直接映射共享内存，
+            存活期间占用一个连接及其服务端区域
+
+        Raises:
+            ConnectionError: 连接失败、超时或对端断开
+            LocalTransportError: 服务端返回错误状态
+        """
+        parts = [_U32.pack(len(texts))]
+        for text in texts:
+            data = text.encode("utf-8")
+            parts.append(_U32.pack(len(data)))
+            parts.append(data)
+
+        try:
+            sock = self._acquire()
+        except OSError as e:
+            raise ConnectionError(f"无法连接 {self.path}: {e}") from e
+
+        try:
+            sock.sendall(b"".join(parts))
+            status, n_rows, dim, offset = _RESPONSE.unpack(_recv_exact(sock, _RESPONSE.size))
+            if status != 200:
+                (size,) = _U32.unpack(_recv_exact(sock, _U32.size))
+                message = _recv_exact(sock, size).decode("utf-8", errors="replace")
+                self._release(sock)
+                raise LocalTransportError(status, message)
+        except OSError as e:
+            sock.close()
+            raise ConnectionError(f"本机传输失败: {e}") from e
+
+        if n_rows == 0:
+            self._release(sock)
+            return np.empty((0, 0), dtype=np.float32)
+
+        # 视图的 base 收敛到这个数组，切片和 reshape 得到的视图都会让它保持存活
+        vectors = np.ndarray((n_rows, dim), dtype="<f4", buffer=self._shm.buf, offset=offset)
+        vectors.flags.writeable = False
+        weakref.finalize(vectors, self._release, sock)
+        return vectors
+
+    def ping(self):
+        """建立一个新连接完成握手（用于健康探测），成功后放入连接池"""
+        self._release(self._connect())
+
+    def stats(self) -> Dict[str, Any]:
+        """传输信息"""
+        return {
+            "transport": "unix",
+            "path": self.path,
+            "shared_memory": self._shm.name if self._shm is not None else None,
+            "idle_connections": len(self._idle)
+        }
+
+    def close(self):
+        """关闭空闲连接并卸载共享内存（仍被视图占用的连接在视图回收时关闭）"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.pop().close()
+            except IndexError:
+                break
+        with self._shm_lock:
+            if self._shm is not None:
+                self._retired.append(self._shm)
+                self._shm = None
+            self._close_retired()
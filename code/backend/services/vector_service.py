@@ -8,6 +8,8 @@ import time
 
 from backend.repositories.vector_repository import VectorRepository, CommunityVectorRepository
 from backend.services.llm_service import LLMService
+from backend.services.embedding_cache import get_embedding_cache
+from backend.services.embedding_client import get_embedding_client
 
 logger = logging.getLogger(__name__)
 
@@ -99,6 +101,99 @@ class VectorService:
                 "documents": []
             }
     
+    def search_literature_batch(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        filters: Optional[List[Optional[Dict]]] = None
+    ) -> Dict[str, Any]:
+        """
+        批量搜索文献
+        
+        全部查询（查询向量缓存未命中的部分）一次Embedding调用生成向量，
+        再通过 VectorRepository.search_batch 一次检索
+        
+        Args:
+            queries: 查询列表
+            top_k: 每个查询返回数量
+            filters: 每个查询的元数据过滤条件
+            
+        Returns:
+            搜索结果（results 与 queries 一一对应）
+        """
+        if self._vector_repo is None:
+            return {
+                "success": False,
+                "error": "向量数据库未初始化",
+                "results": []
+            }
+        
+        try:
+            start_time = time.time()
+            embeddings = self._embed_queries(queries)
+            embedding_time = (time.time() - start_time) * 1000
+            
+            start_time = time.time()
+            batch = self._vector_repo.search_batch(
+                query_embeddings=embeddings,
+                n_results=top_k,
+                where_filters=filters
+            )
+            search_time = (time.time() - start_time) * 1000
+            if not batch.get("success"):
+                return {
+                    "success": False,
+                    "error": batch.get("error", "批量搜索失败"),
+                    "results": []
+                }
+            
+            results = []
+            for query, result in zip(queries, batch["results"]):
+                documents = []
+                for i, doc_content in enumerate(result.get("documents", [])):
+                    doc_data = {
+                        "id": result["ids"][i],
+                        "content": doc_content,
+                        # 与 SemanticExpert 一致：相似度 = 1 - distance / 2
+                        "score": max(0.0, min(1.0, 1 - result["distances"][i] / 2.0))
+                    }
+                    if result["metadatas"][i]:
+                        doc_data["metadata"] = result["metadatas"][i]
+                    documents.append(doc_data)
+                results.append({
+                    "query": query,
+                    "documents": documents,
+                    "total_count": len(documents)
+                })
+            
+            return {
+                "success": True,
+                "results": results,
+                "embedding_time_ms": embedding_time,
+                "search_time_ms": search_time
+            }
+            
+        except Exception as e:
+            logger.error(f"批量文献搜索失败: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": []
+            }
+    
+    def _embed_queries(self, queries: List[str]) -> List[Any]:
+        """查询向量缓存未命中的查询合并为一次Embedding调用"""
+        cache = get_embedding_cache()
+        embeddings: List[Any] = [cache.get(q) if cache is not None else None for q in queries]
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if missing:
+            vectors = get_embedding_client().embed_batch([queries[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                embeddings[i] = vector
+                if cache is not None:
+                    cache.put(queries[i], vector)
+        return embeddings
+    
     def search_community(
         self,
         query: str,
@@ -270,12 +365,15 @@ class VectorService:
             }
         
         try:
-            count = repo.count()
-            return {
+            count = repo.get_count()
+            stats = {
                 "success": True,
                 "collection": collection,
                 "count": count
             }
+            if hasattr(repo, "index_stats"):
+                stats["memory_index"] = repo.index_stats()
+            return stats
         except Exception as e:
             logger.error(f"获取统计信息失败: {e}")
             return {
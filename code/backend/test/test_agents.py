@@ -71,6 +71,149 @@ class TestRouterExpert:
         # 其他查询默认路由到literature
         result = router._fallback_routing("LiFePO4材料的研究")
         assert result == "literature"
+    
+    def test_router_aroute_without_llm(self):
+        """测试异步路由 - 无LLM时降级"""
+        import asyncio
+        from backend.agents.experts import RouterExpert
+        
+        router = RouterExpert(llm_service=None)
+        result = asyncio.run(router.aroute("振实密度大于2.8的材料"))
+        
+        assert result["success"] is False
+        assert result["primary_expert"] == "neo4j"
+
+    def test_router_plan_single_llm_call(self):
+        """测试联合规划 - 一次LLM调用返回路由、关键词和Cypher"""
+        from types import SimpleNamespace
+        from backend.agents.experts import RouterExpert
+
+        class FakeLLM:
+            calls = 0
+            profiles = []
+
+            def invoke(self, messages, profile=None):
+                FakeLLM.calls += 1
+                FakeLLM.profiles.append(profile)
+                return SimpleNamespace(content='```json\n{"primary_expert": "neo4j", "confidence": 0.9, '
+                                               '"search_query": "振实密度 LiFePO4", '
+                                               '"cypher": "MATCH (m:Material) WHERE m.tap_density > 2.8 '
+                                               'RETURN m.material_name"}\n```')
+
+        router = RouterExpert(llm_service=FakeLLM())
+        result = router.plan("振实密度大于2.8的材料有哪些？")
+
+        assert FakeLLM.calls == 1
+        assert FakeLLM.profiles == ["fast"]
+        assert result["primary_expert"] == "neo4j"
+        assert result["search_query"] == "振实密度 LiFePO4"
+        assert result["cypher"].startswith("MATCH (m:Material)")
+
+
+def _char_embed(texts):
+    """按字符哈希的简易向量化（测试用，替代BGE服务）"""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 64
+        for ch in text:
+            vector[ord(ch) % 64] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+class TestLocalRouter:
+    """本地路由分类器测试类"""
+
+    def test_local_router_skips_llm_when_confident(self):
+        """测试本地路由置信度达标时不调用LLM"""
+        from backend.agents.experts import RouterExpert, LocalRouter
+
+        local_router = LocalRouter(embed_fn=_char_embed, threshold=0.5)
+        router = RouterExpert(llm_service=None, local_router=local_router)
+        question = RouterExpert.EXPERTS["community"]["examples"][0]
+        result = router.route(question)
+
+        assert result["source"] == "local"
+        assert result["primary_expert"] == "community"
+        assert result["confidence"] >= 0.5
+
+    def test_local_router_evaluate(self, tmp_path, monkeypatch):
+        """测试本地路由在留出问题集上的评估报告（训练样本含路由日志）"""
+        import json
+        from backend.config.settings import settings
+        from backend.agents.experts import RouterExpert, LocalRouter
+
+        routing_log = tmp_path / "routing_log.jsonl"
+        logged = [
+            ("压实密度最高的材料是什么？", "neo4j"),
+            ("溶胶凝胶法制备的材料文献", "literature"),
+            ("掺杂元素对循环性能的影响规律", "community")
+        ]
+        routing_log.write_text(
+            "".join(json.dumps({"question": q, "expert": e}, ensure_ascii=False) + "\n" for q, e in logged),
+            encoding="utf-8"
+        )
+        monkeypatch.setattr(settings, "routing_log_path", str(routing_log))
+
+        samples = RouterExpert(llm_service=None).training_samples()
+        held_out = [
+            ("首次放电比容量大于160的材料有哪些？", "neo4j"),
+            ("有哪些关于碳包覆LiFePO4的研究？", "literature"),
+            ("共沉淀法制备的材料文献", "literature"),
+            ("温度对容量衰减的影响规律是什么？", "community")
+        ]
+        assert not {q for q, _ in held_out} & {q for q, _ in samples}
+
+        local_router = LocalRouter(embed_fn=_char_embed, threshold=0.8)
+        assert local_router.fit(samples)
+        assert local_router.sample_counts == {"neo4j": 5, "literature": 5, "community": 6}
+
+        # LLM 路由用正确标签模拟，整体准确率只受本地误判影响
+        report = local_router.evaluate(held_out, llm_route_fn=dict(held_out).get)
+
+        assert report["total"] == 4
+        assert report["llm_skip_rate"] == pytest.approx(0.75)
+        assert report["llm_calls"] == 1
+        assert report["local_argmax_accuracy"] == pytest.approx(0.75)
+        assert report["local_accuracy_when_skipped"] == pytest.approx(2 / 3)
+        assert report["overall_accuracy"] == pytest.approx(0.75)
+
+
+    def test_evaluate_router_script_leaves_routing_log_unchanged(self, tmp_path, monkeypatch, capsys):
+        """测试评估脚本以路由日志为测试集、调用LLM路由时不追加日志"""
+        import json
+        from types import SimpleNamespace
+        from backend import services
+        from backend.config.settings import settings
+        from backend.agents.experts import local_router
+        from backend.scripts.evaluate_router import evaluate_router
+
+        class FakeLLM:
+            calls = 0
+
+            def invoke(self, messages, profile=None):
+                FakeLLM.calls += 1
+                return SimpleNamespace(content='{"primary_expert": "literature", "confidence": 0.95}')
+
+        routing_log = tmp_path / "routing_log.jsonl"
+        routing_log.write_text(
+            "".join(json.dumps({"question": q, "expert": e}, ensure_ascii=False) + "\n" for q, e in [
+                ("首次放电比容量大于160的材料有哪些？", "neo4j"),
+                ("共沉淀法制备的材料文献", "literature")
+            ]),
+            encoding="utf-8"
+        )
+        before = routing_log.read_bytes()
+        monkeypatch.setattr(settings, "routing_log_path", str(routing_log))
+        monkeypatch.setattr(settings, "local_router_enabled", True)
+        monkeypatch.setattr(local_router, "bge_embed", _char_embed)
+        monkeypatch.setattr(services, "LLMService", FakeLLM)
+
+        report = evaluate_router(str(routing_log), threshold=0.99, with_llm=True)
+
+        assert report["total"] == 2
+        assert report["llm_calls"] == FakeLLM.calls > 0
+        assert routing_log.read_bytes() == before
 
 
 class TestQueryExpert:
@@ -151,6 +294,451 @@ class TestSemanticExpert:
         assert "？" not in query
         assert "?" not in query
 
+    
+    def test_semantic_expert_fuses_lexical_hits(self, monkeypatch):
+        """测试关键词命中与向量命中按 RRF 融合，关键词命中的文档不被相似度阈值过滤"""
+        from backend.agents.experts import SemanticExpert
+        from backend.config.settings import settings
+        from backend.models.entities import RetrievalContext
+        
+        monkeypatch.setattr(settings, "hybrid_search", True)
+        
+        class FakeRepo:
+            def search(self, query_embedding, n_results, where_filter=None, include_embeddings=False):
+                return {"success": True, "ids": ["a", "b"], "documents": ["A", "B"],
+                        "metadatas": [{}, {}], "distances": [0.2, 0.4]}
+            
+            def lexical_search(self, query, n_results, query_embedding=None, where_filter=None, include_embeddings=False):
+                return {"success": True, "ids": ["c", "b", "d"], "documents": ["LiFePO4/C", "B", "正极材料的性能"],
+                        "metadatas": [{"doi": "10.1/c"}, {}, {}], "scores": [5.0, 2.0, 1.0],
+                        "distances": [1.6, 0.4, 1.6]}
+        
+        expert = SemanticExpert(vector_repo=FakeRepo(), llm_service=None)
+        context = RetrievalContext(question="LiFePO4/C 的倍率性能", top_k=4)
+        context.search_query = "LiFePO4/C 倍率性能"
+        context.query_embedding = [0.0, 1.0]
+        
+        assert expert.search_context(context, with_scores=True)
+        ids = [doc["id"] for doc in context.raw_documents]
+        assert ids[0] == "b"  # 两路都命中
+        assert set(ids) == {"a", "b", "c", "d"}
+        lexical_only = next(doc for doc in context.raw_documents if doc["id"] == "c")
+        assert abs(lexical_only["score"] - 0.2) < 1e-9 and lexical_only["lexical_rank"] == 1
+        assert lexical_only["lexical_terms"] == ["lifepo4", "lifepo4/c"]
+        kept = [doc["id"] for doc in context.documents]
+        # 命中化学式的关键词结果豁免阈值，只共享中文二元组“性能”的低相似度结果仍被过滤
+        assert "c" in kept and "d" not in kept
+    
+    def test_semantic_expert_diversifies_by_doi(self, monkeypatch):
+        """测试开启结果多样化时多取候选，按 DOI 选出不同论文，总数仍为 top_k"""
+        from backend.agents.experts import SemanticExpert
+        from backend.config.settings import settings
+        from backend.models.entities import RetrievalContext
+        
+        monkeypatch.setattr(settings, "diversity_selection", True)
+        monkeypatch.setattr(settings, "diversity_overfetch", 2)
+        monkeypatch.setattr(settings, "diversity_chunks_per_doi", 1)
+        
+        class FakeRepo:
+            def __init__(self):
+                self.requested = None
+            
+            def search(self, query_embedding, n_results, where_filter=None, include_embeddings=False):
+                self.requested = (n_results, include_embeddings)
+                return {"success": True, "ids": ["a1", "a2", "b1", "c1"], "documents": ["A1", "A2", "B1", "C1"],
+                        "metadatas": [{"doi": "10.1/a"}, {"doi": "10.1/a"}, {"doi": "10.1/b"}, {"doi": "10.1/c"}],
+                        "distances": [0.1, 0.12, 0.3, 0.4],
+                        "embeddings": [[1.0, 0.0], [1.0, 0.1], [0.0, 1.0], [0.7, 0.7]]}
+        
+        repo = FakeRepo()
+        expert = SemanticExpert(vector_repo=repo, llm_service=None)
+        context = RetrievalContext(question="碳包覆", top_k=2)
+        context.query_embedding = [1.0, 0.0]
+        
+        assert expert.search_context(context, with_scores=True)
+        assert repo.requested == (4, True)
+        ids = [doc["id"] for doc in context.raw_documents]
+        assert len(ids) == 2 and ids[0] == "a1" and "a2" not in ids
+
+
+class _StubSemanticExpert:
+    """语义专家桩：记录调用，可模拟生成查询向量失败"""
+    
+    def __init__(self, fail_embed=False):
+        self.fail_embed = fail_embed
+        self.calls = []
+    
+    def prepare_context(self, context):
+        self.calls.append("prepare")
+        context.search_query = "碳包覆 LiFePO4"
+        return context
+    
+    def embed_context(self, context):
+        self.calls.append("embed")
+        if self.fail_embed:
+            context.error = "生成查询向量失败: BGE 服务超时"
+            context.error_step = "generate_embedding"
+            return False
+        context.query_embedding = [1.0, 0.0]
+        return True
+    
+    def search_context(self, context, with_scores=True, filter_metadata=None):
+        self.calls.append("search")
+        context.raw_documents = context.documents = [
+            {"id": "a", "content": "LiFePO4/C", "score": 0.9, "metadata": {"doi": "10.1/a", "title": "A"}}
+        ]
+        context.searched = True
+        return True
+    
+    def retrieve(self, question, top_k=20, with_scores=True, filter_metadata=None, context=None):
+        from backend.models.entities import RetrievalContext
+        
+        context = context or RetrievalContext(question=question, top_k=top_k)
+        self.prepare_context(context)
+        if self.embed_context(context):
+            self.search_context(context)
+        return context
+    
+    def load_context_pdfs(self, context, load_pdf=True):
+        return {"documents_found": len(context.documents), "is_broad_question": False,
+                "dois_found": 1, "pdf_loaded": 1, "pdf_failed": 0}
+    
+    def query_with_details(self, question, top_k=20, load_pdf=True, context=None):
+        return {"answer": "碳包覆提高了导电性", "pdf_info": self.load_context_pdfs(context)}
+    
+    def stream_answer(self, context, is_broad=False):
+        yield "碳包覆"
+        yield "提高了导电性"
+    
+    def finalize_answer(self, answer, context, is_broad=False):
+        return answer + " (DOI: 10.1/a)"
+    
+    async def aprepare_context(self, context):
+        return self.prepare_context(context)
+    
+    async def aembed_context(self, context):
+        return self.embed_context(context)
+    
+    async def asearch_context(self, context, with_scores=True, filter_metadata=None):
+        return self.search_context(context, with_scores, filter_metadata)
+    
+    async def aretrieve(self, question, top_k=20, with_scores=True, filter_metadata=None, context=None):
+        return self.retrieve(question, top_k, with_scores, filter_metadata, context)
+    
+    async def aload_context_pdfs(self, context, load_pdf=True):
+        return self.load_context_pdfs(context, load_pdf)
+    
+    async def aquery_with_details(self, question, top_k=20, load_pdf=True, context=None):
+        return self.query_with_details(question, top_k, load_pdf, context)
+    
+    async def astream_answer(self, context, is_broad=False):
+        for token in self.stream_answer(context, is_broad):
+            yield token
+
+
+class _StubQueryExpert:
+    """精确查询专家桩：生成Cypher前可阻塞，用于观察未选中分支的处理"""
+    
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.calls = 0
+    
+    def can_handle(self, question):
+        return True
+    
+    def generate_cypher(self, question):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return "MATCH (m:Material) RETURN m"
+
+
+class _StubRouter:
+    """路由专家桩：关键词预判与路由结果分别指定"""
+    
+    def __init__(self, predicted, routed):
+        self.predicted = predicted
+        self.routed = routed
+        self.calls = []
+    
+    def _fallback_routing(self, question):
+        return self.predicted
+    
+    def route(self, question):
+        self.calls.append("route")
+        return {"success": True, "primary_expert": self.routed, "confidence": 0.9, "reasoning": "stub"}
+    
+    async def aroute(self, question):
+        return self.route(question)
+    
+    def plan(self, question):
+        self.calls.append("plan")
+        return {"success": True, "primary_expert": self.routed, "confidence": 0.9, "reasoning": "stub",
+                "search_query": "规划关键词", "cypher": "MATCH (m:Material) RETURN m"}
+    
+    async def aplan(self, question):
+        return self.plan(question)
+
+
+def _stub_agent(predicted="literature", routed="literature", semantic=None, query=None, agent_class=None):
+    """构造使用桩专家的集成Agent（不连接LLM、Neo4j和向量库），记录专家收到的预取结果"""
+    from backend.agents.integrated_agent import IntegratedAgent
+    
+    agent = (agent_class or IntegratedAgent)(llm_service=object())
+    agent._router = _StubRouter(predicted, routed)
+    agent._semantic_expert = semantic or _StubSemanticExpert()
+    agent._query_expert = query or _StubQueryExpert()
+    agent.received = {}
+    
+    def query_literature(question, n_results=10, context=None):
+        agent.received["literature"] = context
+        return {"success": True, "answer": "文献答案", "expert_used": "literature"}
+    
+    def query_neo4j(question, cypher=None):
+        agent.received["neo4j"] = cypher
+        return {"success": True, "answer": "数据答案", "expert_used": "neo4j"}
+    
+    async def aquery_literature(question, n_results=10, context=None):
+        return query_literature(question, n_results, context)
+    
+    async def aquery_neo4j(question, cypher=None):
+        return query_neo4j(question, cypher)
+    
+    agent._query_literature = query_literature
+    agent._query_neo4j = query_neo4j
+    agent._aquery_literature = aquery_literature
+    agent._aquery_neo4j = aquery_neo4j
+    return agent
+
+
+def _assert_slots_released():
+    """推测并发信号量已全部归还"""
+    from backend.agents.integrated_agent import _speculation_slots
+    from backend.config.settings import settings
+    
+    slots = _speculation_slots()
+    limit = max(1, settings.speculative_max_inflight)
+    acquired = 0
+    while acquired < limit and slots.acquire(blocking=False):
+        acquired += 1
+    for _ in range(acquired):
+        slots.release()
+    assert acquired == limit
+
+
+class TestIntegratedAgentPlanning:
+    """联合规划开关测试类"""
+    
+    def test_joint_planning_off_by_default(self, monkeypatch):
+        """测试默认只调用路由，开启联合规划后改用规划结果中的Cypher"""
+        from backend.config.settings import settings
+        
+        monkeypatch.setattr(settings, "speculative_routing", False)
+        agent = _stub_agent(routed="neo4j")
+        agent.query("振实密度大于2.8的材料有哪些？")
+        assert agent._router.calls == ["route"]
+        assert agent.received["neo4j"] is None
+        
+        monkeypatch.setattr(settings, "joint_planning", True)
+        agent = _stub_agent(routed="neo4j")
+        agent.query("振实密度大于2.8的材料有哪些？")
+        assert agent._router.calls == ["plan"]
+        assert agent.received["neo4j"] == "MATCH (m:Material) RETURN m"
+
+
+class TestIntegratedAgentSpeculation:
+    """推测式路由测试类"""
+    
+    def test_speculation_plan_orders_and_caps_branches(self, monkeypatch):
+        """测试推测分支按关键词预判排序，并按单请求LLM调用上限截断"""
+        from backend.config.settings import settings
+        
+        monkeypatch.setattr(settings, "speculative_max_llm_calls", 2)
+        assert _stub_agent(predicted="literature")._speculation_plan("q") == ["literature", "neo4j"]
+        assert _stub_agent(predicted="neo4j")._speculation_plan("q") == ["neo4j", "literature"]
+        
+        monkeypatch.setattr(settings, "speculative_max_llm_calls", 1)
+        assert _stub_agent(predicted="neo4j")._speculation_plan("q") == ["neo4j"]
+        monkeypatch.setattr(settings, "speculative_max_llm_calls", 0)
+        assert _stub_agent()._speculation_plan("q") == []
+    
+    def test_selected_branch_reused_and_other_discarded(self, monkeypatch):
+        """测试选中分支的检索上下文被专家复用，未选中分支被取消或丢弃，信号量全部归还"""
+        import threading
+        from concurrent.futures import Future
+        from backend.config.settings import settings
+        
+        monkeypatch.setattr(settings, "speculative_max_llm_calls", 2)
+        gate = threading.Event()
+        agent = _stub_agent(predicted="literature", routed="literature", query=_StubQueryExpert(gate))
+        started = {}
+        start_speculation = agent._start_speculation
+        agent._start_speculation = lambda question: started.update(start_speculation(question)) or dict(started)
+        
+        result = agent.query("碳包覆LiFePO4的研究", speculative=True)
+        # 路由完成时 Cypher 分支尚未启动则被取消，已在执行则结果被丢弃
+        neo4j_branch = started["neo4j"]
+        assert neo4j_branch.cancelled() or not neo4j_branch.done()
+        gate.set()
+        if not neo4j_branch.cancelled():
+            neo4j_branch.result(5)
+        assert result["speculation"] == {"branches": ["literature", "neo4j"], "used": True}
+        context = agent.received["literature"]
+        assert context.search_query == "碳包覆 LiFePO4" and context.query_embedding == [1.0, 0.0]
+        assert agent._semantic_expert.calls == ["prepare", "embed"]
+        assert "neo4j" not in agent.received
+        
+        # 未启动的分支被取消，已完成的分支结果被丢弃
+        pending, done = Future(), Future()
+        done.set_result("MATCH (n) RETURN n")
+        assert agent._collect_speculation({"neo4j": pending, "literature": done}, "literature") == "MATCH (n) RETURN n"
+        assert pending.cancelled()
+        
+        for future in agent._start_speculation("q").values():
+            future.result(5)
+        _assert_slots_released()
+    
+    def test_failed_speculative_embedding_falls_back_to_sync(self, monkeypatch):
+        """测试推测分支生成查询向量失败时不把失败上下文交给专家，保留关键词后同步执行"""
+        from backend.config.settings import settings
+        
+        monkeypatch.setattr(settings, "speculative_max_llm_calls", 1)
+        agent = _stub_agent(semantic=_StubSemanticExpert(fail_embed=True))
+        
+        result = agent.query("碳包覆LiFePO4的研究", speculative=True)
+        context = agent.received["literature"]
+        assert context.success and context.query_embedding is None
+        assert context.search_query == "碳包覆 LiFePO4"
+        assert result["speculation"]["used"] is True
+        _assert_slots_released()
+        
+        # 异步路径同样不复用失败的上下文
+        import asyncio
+        from backend.agents.async_integrated_agent import AsyncIntegratedAgent
+        
+        agent = _stub_agent(semantic=_StubSemanticExpert(fail_embed=True), agent_class=AsyncIntegratedAgent)
+        asyncio.run(agent.aquery("碳包覆LiFePO4的研究", speculative=True))
+        context = agent.received["literature"]
+        assert context.success and context.search_query == "碳包覆 LiFePO4"
+        _assert_slots_released()
+
+
+class TestAsyncIntegratedAgent:
+    """异步集成Agent测试类"""
+    
+    @staticmethod
+    def _collect(agen):
+        import asyncio
+        
+        async def run():
+            return [event async for event in agen]
+        return asyncio.run(run())
+    
+    def test_aquery_stream_matches_query_stream(self):
+        """测试异步流式查询的事件序列与同步 query_stream 一致（成功与生成向量失败两种情况）"""
+        from backend.agents.async_integrated_agent import AsyncIntegratedAgent
+        
+        sequences = {}
+        for fail_embed in (False, True):
+            sync_agent = _stub_agent(semantic=_StubSemanticExpert(fail_embed=fail_embed))
+            async_agent = _stub_agent(semantic=_StubSemanticExpert(fail_embed=fail_embed),
+                                      agent_class=AsyncIntegratedAgent)
+            expected = list(sync_agent.query_stream("碳包覆对LiFePO4导电性的影响"))
+            events = self._collect(async_agent.aquery_stream("碳包覆对LiFePO4导电性的影响"))
+            assert events == expected
+            sequences[fail_embed] = events
+        
+        success, failure = sequences[False], sequences[True]
+        assert [e["content"] for e in success if e["type"] == "content"] == ["碳包覆", "提高了导电性"]
+        assert success[-1]["type"] == "done"
+        assert success[-1]["final_answer"] == "碳包覆提高了导电性 (DOI: 10.1/a)"
+        assert [e["type"] for e in failure][-2:] == ["error", "done"]
+        assert failure[-3]["step"] == "generate_embedding" and failure[-3]["status"] == "error"
+    
+    def test_stream_in_background_serves_async_stream_to_sync_caller(self):
+        """测试后台事件循环桥接：同步迭代得到与 query_stream 相同的事件，异常重新抛出，提前停止时取消任务"""
+        import asyncio
+        import threading
+        from backend.agents.async_integrated_agent import AsyncIntegratedAgent, stream_in_background
+        
+        sync_agent = _stub_agent()
+        async_agent = _stub_agent(agent_class=AsyncIntegratedAgent)
+        expected = list(sync_agent.query_stream("碳包覆对LiFePO4导电性的影响"))
+        assert list(stream_in_background(async_agent.aquery_stream("碳包覆对LiFePO4导电性的影响"))) == expected
+        
+        async def failing():
+            yield 1
+            raise ValueError("boom")
+        
+        stream = stream_in_background(failing())
+        assert next(stream) == 1
+        with pytest.raises(ValueError):
+            next(stream)
+        
+        cancelled = threading.Event()
+        
+        async def endless():
+            try:
+                while True:
+                    yield 1
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        stream = stream_in_background(endless())
+        assert next(stream) == 1
+        stream.close()
+        assert cancelled.wait(2)
+    
+    def test_aquery_routes_and_aquery_with_expert(self):
+        """测试异步查询按路由调用专家，指定专家查询不经过路由"""
+        import asyncio
+        from backend.agents.async_integrated_agent import AsyncIntegratedAgent
+        
+        agent = _stub_agent(routed="literature", agent_class=AsyncIntegratedAgent)
+        del agent._aquery_literature  # 使用真实的异步文献查询，专家为桩
+        result = asyncio.run(agent.aquery("碳包覆LiFePO4的研究", speculative=False))
+        assert result["success"] and result["expert_used"] == "literature"
+        assert result["answer"] == "碳包覆提高了导电性"
+        assert result["references"] == [{"doi": "10.1/a", "title": "A", "similarity": 0.9}]
+        assert result["routing_info"]["primary_expert"] == "literature"
+        
+        agent = _stub_agent(routed="neo4j", agent_class=AsyncIntegratedAgent)
+        assert asyncio.run(agent.aquery("振实密度大于2.8", speculative=False))["expert_used"] == "neo4j"
+        
+        result = asyncio.run(agent.aquery_with_expert("q", "unknown"))
+        assert result["success"] is False and "unknown" in result["error"]
+        result = asyncio.run(agent.aquery_with_expert("q", "neo4j"))
+        assert result["expert_used"] == "neo4j" and agent.received["neo4j"] is None
+    
+    def test_concurrent_first_requests_create_experts_once(self, monkeypatch):
+        """测试并发的首批请求只创建一次向量仓储和语义专家"""
+        import asyncio
+        import threading
+        import time
+        from backend.agents import integrated_agent
+        from backend.agents.async_integrated_agent import AsyncIntegratedAgent
+        
+        created = []
+        lock = threading.Lock()
+        
+        class SlowRepository:
+            def __init__(self):
+                time.sleep(0.05)  # 模拟加载内存索引、连接数据库
+                with lock:
+                    created.append(self)
+        
+        monkeypatch.setattr(integrated_agent, "VectorRepository", SlowRepository)
+        monkeypatch.setattr(integrated_agent, "SemanticExpert", lambda vector_repo, llm_service: vector_repo)
+        agent = AsyncIntegratedAgent(llm_service=object())
+        
+        async def first_requests():
+            return await asyncio.gather(*[agent._aget_expert("semantic_expert") for _ in range(8)])
+        experts = asyncio.run(first_requests())
+        assert len(created) == 1
+        assert all(expert is created[0] for expert in experts)
+
 
 class TestExpertsModule:
     """专家模块测试类"""
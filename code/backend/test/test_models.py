@@ -107,6 +107,39 @@ class TestPaperEntity:
         assert paper.paper_id == "test_002"
 
 
+class TestRetrievalContext:
+    """检索上下文测试类"""
+    
+    def test_retrieval_context_success(self):
+        """测试检索成功时的字典格式"""
+        from backend.models import RetrievalContext
+        
+        context = RetrievalContext(question="碳包覆LiFePO4", search_query="碳包覆 LiFePO4")
+        context.raw_documents = [{"id": "a"}, {"id": "b"}]
+        context.documents = [{"id": "a"}]
+        data = context.to_dict()
+        
+        assert context.success is True
+        assert data['success'] is True
+        assert data['search_query'] == "碳包覆 LiFePO4"
+        assert data['result_count'] == 1
+        assert data['original_count'] == 2
+    
+    def test_retrieval_context_error(self):
+        """测试检索失败时的字典格式"""
+        from backend.models import RetrievalContext
+        
+        context = RetrievalContext(question="test")
+        context.error = "timeout"
+        context.error_step = "generate_embedding"
+        data = context.to_dict()
+        
+        assert context.success is False
+        assert data['success'] is False
+        assert data['error_step'] == "generate_embedding"
+        assert data['documents'] == []
+
+
 class TestDTOs:
     """数据传输对象测试类"""
     
@@ -160,6 +193,17 @@ class TestDTOs:
         errors = params.validate()
         assert len(errors) > 0
     
+    def test_batch_search_params_validation(self):
+        """测试批量搜索参数验证"""
+        from backend.models import BatchSearchParams
+        
+        params = BatchSearchParams(queries=["正极材料", "电解液"], top_k=5, filters=[None, {"type": "paper"}])
+        assert params.validate() == []
+        
+        assert BatchSearchParams(queries=[]).validate()
+        assert BatchSearchParams(queries=["a", " "]).validate()
+        assert BatchSearchParams(queries=["a", "b"], filters=[None]).validate()
+    
     def test_material_query_params_validation(self):
         """测试材料查询参数验证"""
         from backend.models import MaterialQueryParams
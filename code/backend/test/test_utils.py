@@ -328,3 +328,621 @@ class TestCypherUtils:
             "MATCH (m:Material) // comment\nRETURN m"
         )
         assert "//" not in sanitized
+
+
+class TestEmbeddingCache:
+    """查询向量缓存测试类"""
+    
+    def test_embedding_cache_persists_across_instances(self, tmp_path):
+        """测试缓存规范化文本命中并持久化到磁盘"""
+        from backend.services.embedding_cache import EmbeddingCache
+        
+        db_path = str(tmp_path / "cache.sqlite")
+        cache = EmbeddingCache(db_path=db_path, memory_size=4, model_name="bge-test")
+        assert cache.get("碳包覆 LiFePO4") is None
+        cache.put("碳包覆 LiFePO4", [0.5, -0.25, 1.0])
+        
+        # 空白、大小写和句末标点不同视为同一查询
+        assert cache.get("  碳包覆  lifepo4？") == [0.5, -0.25, 1.0]
+        cache.close()
+        
+        reopened = EmbeddingCache(db_path=db_path, memory_size=4, model_name="bge-test")
+        assert reopened.get("碳包覆 LiFePO4") == [0.5, -0.25, 1.0]
+        stats = reopened.stats()
+        assert stats["hits_disk"] == 1
+        assert stats["disk_size"] == 1
+        
+        # 模型名参与缓存键
+        other_model = EmbeddingCache(db_path=db_path, model_name="bge-other")
+        assert other_model.get("碳包覆 LiFePO4") is None
+    
+    def test_embedding_cache_disk_hits_defer_recency_writes(self, tmp_path):
+        """测试磁盘命中不写库，最近使用时间随下一次写入批量写回"""
+        from backend.services.embedding_cache import EmbeddingCache
+        
+        db_path = str(tmp_path / "cache.sqlite")
+        writer = EmbeddingCache(db_path=db_path, memory_size=0, model_name="bge-test")
+        writer.put("水热合成", [1.0])
+        writer.put("碳包覆", [2.0])
+        writer.close()
+        
+        cache = EmbeddingCache(db_path=db_path, memory_size=0, model_name="bge-test")
+        conn = cache._conn
+        key = cache.make_key("水热合成")
+        conn.execute("UPDATE embeddings SET last_used = 0 WHERE key = ?", (key,))
+        conn.commit()
+        
+        changes = conn.total_changes
+        assert cache.get("水热合成") == [1.0]
+        assert cache.get("水热合成") == [1.0]
+        assert conn.total_changes == changes
+        assert not conn.in_transaction
+        
+        cache.put("球磨", [3.0])
+        (used,) = conn.execute("SELECT last_used FROM embeddings WHERE key = ?", (key,)).fetchone()
+        assert used > 0
+        cache.close()
+
+
+class TestEmbeddingClient:
+    """Embedding客户端测试类"""
+    
+    def test_embedding_client_coalesces_concurrent_queries(self):
+        """测试并发单条请求合并为批量调用，结果按文本正确分发"""
+        from concurrent.futures import ThreadPoolExecutor
+        from backend.services.embedding_client import EmbeddingClient
+        
+        client = EmbeddingClient(api_url="http://bge.test/v1/embeddings", batch_window_ms=50)
+        sent_batches = []
+        
+        def fake_post_once(texts):
+            sent_batches.append(list(texts))
+            return [[float(len(text))] for text in texts]
+        
+        client._post_once = fake_post_once
+        texts = ["a" * n for n in range(1, 9)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            vectors = list(pool.map(client.embed_query, texts))
+        client.close()
+        
+        assert vectors == [[float(n)] for n in range(1, 9)]
+        assert len(sent_batches) < len(texts)
+        assert client.stats()["texts"] == len(texts)
+    
+    def test_embedding_client_retries_then_fails(self):
+        """测试可重试错误按次数重试后抛出EmbeddingError"""
+        import requests
+        from backend.services.embedding_client import EmbeddingClient, EmbeddingError
+        
+        client = EmbeddingClient(api_url="http://bge.test/v1/embeddings", max_retries=2, backoff_base=0.0)
+        
+        def failing_post_once(texts):
+            raise requests.ConnectionError("connection refused")
+        
+        client._post_once = failing_post_once
+        with pytest.raises(EmbeddingError):
+            client.embed_batch(["碳包覆"])
+        
+        assert client.stats()["retries"] == 2
+        assert client.stats()["errors"] == 1
+    
+    def test_embedding_client_selects_unix_transport(self):
+        """测试 unix:// 地址自动选用本机共享内存传输"""
+        from backend.services.embedding_client import EmbeddingClient
+        
+        client = EmbeddingClient(api_url="unix:///tmp/bge-test.sock")
+        endpoint = client.stats()["endpoints"][0]
+        assert endpoint["transport"] == "unix"
+        assert endpoint["path"] == "/tmp/bge-test.sock"
+        
+        client = EmbeddingClient(api_url="http://bge.test/v1/embeddings")
+        assert client.stats()["endpoints"][0]["transport"] == "http"
+    
+    def test_unix_transport_returns_view_pinning_connection(self, tmp_path, monkeypatch):
+        """测试本机传输返回共享内存视图，视图回收前连接不归还、区域不被复用"""
+        import gc
+        import socket
+        import struct
+        import threading
+        from multiprocessing import shared_memory
+        import numpy as np
+        from backend.services import shm_transport
+        from backend.services.shm_transport import UnixSocketTransport
+        
+        # 同一进程内挂载时保留 resource_tracker 登记，由测试统一回收
+        monkeypatch.setattr(shm_transport, "_attach_shared_memory", lambda name: shared_memory.SharedMemory(name=name))
+        shm = shared_memory.SharedMemory(create=True, size=4096)
+        path = str(tmp_path / "bge.sock")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen()
+        connections = []
+        
+        def recv(conn, size):
+            data = b""
+            while len(data) < size:
+                chunk = conn.recv(size - len(data))
+                if not chunk:
+                    raise ConnectionError
+                data += chunk
+            return data
+        
+        def serve(conn, slot):
+            # 每个连接固定写入自己的区域，行值为连接序号
+            name = shm.name.encode("utf-8")
+            conn.sendall(struct.pack("<I", len(name)) + name + struct.pack("<Q", shm.size))
+            try:
+                while True:
+                    (n_texts,) = struct.unpack("<I", recv(conn, 4))
+                    for _ in range(n_texts):
+                        (size,) = struct.unpack("<I", recv(conn, 4))
+                        recv(conn, size)
+                    offset = slot * 1024
+                    rows = np.ndarray((n_texts, 4), dtype="<f4", buffer=shm.buf, offset=offset)
+                    rows[:] = slot
+                    del rows
+                    conn.sendall(struct.pack("<IIIQ", 200, n_texts, 4, offset))
+            except (ConnectionError, OSError):
+                conn.close()
+        
+        def accept():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                connections.append(conn)
+                threading.Thread(target=serve, args=(conn, len(connections) - 1), daemon=True).start()
+        
+        threading.Thread(target=accept, daemon=True).start()
+        transport = UnixSocketTransport(path)
+        try:
+            first = transport.post(["碳包覆", "LiFePO4"])
+            assert first.shape == (2, 4)
+            assert not first.flags.owndata and not first.flags.writeable
+            # 服务端写入的变化直接可见，说明返回的是共享内存上的视图而非拷贝
+            np.ndarray((1,), dtype="<f4", buffer=shm.buf, offset=0)[0] = 7.0
+            assert first[0, 0] == 7.0
+            
+            # 第一个视图（及其切片）存活时，第二个请求必须走新连接，不能复用第一段区域
+            row = first[1]
+            del first
+            gc.collect()
+            second = transport.post(["水热法"])
+            assert len(connections) == 2
+            assert row.tolist() == [0.0] * 4
+            assert second.tolist() == [[1.0] * 4]
+            
+            del row, second
+            gc.collect()
+            assert transport.stats()["idle_connections"] == 2
+            transport.post(["球磨"])
+            assert len(connections) == 2
+        finally:
+            gc.collect()
+            transport.close()
+            server.close()
+            shm.close()
+            shm.unlink()
+    
+    def test_embedding_client_fails_over_between_endpoints(self, monkeypatch):
+        """测试多端点时失败端点被摘除，重试落到其他端点"""
+        import requests
+        from backend.services import embedding_endpoints
+        from backend.services.embedding_client import EmbeddingClient
+        
+        # least 策略在并列时取第一个端点，保证首次请求落到故障端点
+        monkeypatch.setattr(embedding_endpoints.random, "choice", lambda seq: seq[0])
+        client = EmbeddingClient(
+            api_urls=["http://bge-a.test/v1/embeddings", "http://bge-b.test/v1/embeddings"],
+            max_retries=2, backoff_base=0.0, health_interval=60, lb_strategy="least"
+        )
+        calls = []
+        
+        def fake_post_http(endpoint, texts):
+            calls.append(endpoint.url)
+            if "bge-a" in endpoint.url:
+                raise requests.ConnectionError("connection refused")
+            return [[1.0] for _ in texts]
+        
+        client._post_http = fake_post_http
+        for _ in range(5):
+            assert client.embed_batch(["碳包覆"]).tolist() == [[1.0]]
+        client.close()
+        
+        endpoints = {ep["url"]: ep for ep in client.stats()["endpoints"]}
+        assert calls[0] == "http://bge-a.test/v1/embeddings"
+        assert calls.count("http://bge-a.test/v1/embeddings") == 1
+        assert calls[1:] == ["http://bge-b.test/v1/embeddings"] * 5
+        assert endpoints["http://bge-a.test/v1/embeddings"]["healthy"] is False
+        assert endpoints["http://bge-b.test/v1/embeddings"]["outstanding"] == 0
+    
+    def test_decode_base64_embeddings(self):
+        """测试base64响应解码为float32矩阵，旧版服务返回的JSON数组同样可解码"""
+        import base64
+        import numpy as np
+        from backend.services.embedding_client import decode_embeddings
+        
+        vectors = np.array([[0.5, -0.25, 1.0], [0.125, 2.0, -1.5]], dtype=np.float32)
+        items32 = [base64.b64encode(v.astype("<f4").tobytes()).decode("ascii") for v in vectors]
+        items16 = [base64.b64encode(v.astype("<f2").tobytes()).decode("ascii") for v in vectors]
+        
+        decoded = decode_embeddings(items32, "base64")
+        assert decoded.dtype == np.float32
+        assert decoded.tolist() == vectors.tolist()
+        assert decode_embeddings(items16, "base64_float16").tolist() == vectors.tolist()
+        assert decode_embeddings(vectors.tolist(), "base64").tolist() == vectors.tolist()
+
+
+class TestLocalEmbeddingClient:
+    """进程内Embedding后端测试类"""
+    
+    def test_local_embedding_client_interface(self):
+        """测试进程内后端与HTTP客户端接口一致（注入模型，无需BGE服务）"""
+        import asyncio
+        import numpy as np
+        from backend.services.local_embedding import LocalEmbeddingClient
+        
+        class FakeModel:
+            def encode(self, texts, normalize_embeddings=True, show_progress_bar=False, batch_size=32):
+                return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+        
+        client = LocalEmbeddingClient(model_name="bge-test", model=FakeModel())
+        
+        assert client.embed_batch(["ab", "abc"]).tolist() == [[2.0, 1.0], [3.0, 1.0]]
+        assert client.embed_query("a").tolist() == [1.0, 1.0]
+        assert asyncio.run(client.aembed_query("abcd")).tolist() == [4.0, 1.0]
+        assert client.stats()["texts"] == 4
+
+
+class TestInMemoryVectorIndex:
+    """进程内精确向量索引测试类"""
+    
+    def test_index_exact_topk_matches_brute_force(self):
+        """测试内存索引的 top-k 与距离和暴力计算一致（l2/cosine，单条与批量查询）"""
+        import numpy as np
+        from backend.repositories.vector_index import InMemoryVectorIndex
+        
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(50, 8)).astype(np.float32)
+        
+        class FakeCollection:
+            def count(self):
+                return len(vectors)
+            
+            def get(self, include=None, limit=None, offset=0):
+                rows = range(offset, min(offset + limit, len(vectors)))
+                return {
+                    "ids": [f"id{i}" for i in rows],
+                    "documents": [f"doc{i}" for i in rows],
+                    "metadatas": [{"doi": f"10.1/{i}"} for i in rows],
+                    "embeddings": vectors[offset:offset + limit].tolist()
+                }
+        
+        queries = rng.normal(size=(3, 8)).astype(np.float32)
+        
+        index = InMemoryVectorIndex(FakeCollection(), space="l2")
+        index._PAGE_SIZE = 16  # 覆盖分页加载
+        assert index.load() and index.size == 50
+        expected = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+        results = index.search(queries, n_results=5)
+        for row, result in zip(expected, results):
+            assert result["ids"] == [f"id{i}" for i in np.argsort(row)[:5]]
+            assert np.allclose(result["distances"], np.sort(row)[:5], atol=1e-4)
+        assert index.search(queries[0], n_results=5)[0]["ids"] == results[0]["ids"]
+        
+        index = InMemoryVectorIndex(FakeCollection(), space="cosine")
+        assert index.load()
+        normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        query = queries[0] / np.linalg.norm(queries[0])
+        result = index.search(queries[0], n_results=100)[0]
+        assert result["ids"] == [f"id{i}" for i in np.argsort(-(normed @ query))]
+        assert result["metadatas"][0]["doi"] == f"10.1/{result['ids'][0][2:]}"
+    
+    def test_index_loads_matching_mmap_snapshot(self, tmp_path):
+        """测试导出的快照以 mmap 加载且结果与集合一致，集合变化后回退到集合加载"""
+        import numpy as np
+        from backend.repositories.vector_index import InMemoryVectorIndex, export_snapshot
+        
+        vectors = np.random.default_rng(1).normal(size=(20, 4)).astype(np.float32)
+        
+        class FakeCollection:
+            name = "papers"
+            id = "uuid-1"
+            metadata = {"hnsw:space": "cosine"}
+            
+            def count(self):
+                return len(vectors)
+            
+            def get(self, include=None, limit=None, offset=0):
+                rows = range(offset, min(offset + limit, len(vectors)))
+                return {
+                    "ids": [f"id{i}" for i in rows],
+                    "documents": [f"文献{i}" for i in rows],
+                    "metadatas": [{"doi": f"10.1/{i}"} for i in rows],
+                    "embeddings": vectors[offset:offset + limit].tolist()
+                }
+        
+        collection = FakeCollection()
+        snapshot_dir = str(tmp_path / "papers")
+        assert export_snapshot(collection, snapshot_dir)["count"] == 20
+        
+        mapped = InMemoryVectorIndex(collection, space="cosine", snapshot_dir=snapshot_dir, lexical=True)
+        direct = InMemoryVectorIndex(collection, space="cosine", lexical=True)
+        assert mapped.load() and direct.load()
+        assert mapped.stats()["source"] == "snapshot"
+        assert isinstance(mapped._snapshot.matrix, np.memmap)
+        assert mapped.search(vectors[:2], 5) == direct.search(vectors[:2], 5)
+        assert mapped.search(vectors[3], 1)[0]["documents"] == ["文献3"]
+        # BM25 倒排随快照导出，加载时直接 mmap 而不在本进程重建
+        assert isinstance(mapped._snapshot.lexical._docs, np.memmap)
+        assert mapped.lexical_search("文献 13", 5) == direct.lexical_search("文献 13", 5)
+        assert mapped.lexical_search("文献 13", 5)["ids"][0] == "id13"
+        
+        collection.id = "uuid-2"  # 集合重建后快照失效
+        assert mapped.load() and mapped.stats()["source"] == "chromadb"
+
+
+class TestVectorRepositoryBatch:
+    """批量向量检索测试类"""
+    
+    def test_search_batch_groups_queries_by_filter(self):
+        """测试批量检索按过滤条件分组，每组一次集合查询，结果按原顺序返回"""
+        from backend.repositories.vector_repository import VectorRepository
+        
+        class FakeCollection:
+            def __init__(self):
+                self.calls = []
+            
+            def query(self, query_embeddings, n_results, where=None):
+                self.calls.append((len(query_embeddings), where))
+                return {
+                    "documents": [[f"{q[0]:.0f}"] for q in query_embeddings],
+                    "metadatas": [[where or {}] for _ in query_embeddings],
+                    "distances": [[0.1] for _ in query_embeddings],
+                    "ids": [[f"id{q[0]:.0f}"] for q in query_embeddings]
+                }
+        
+        repo = VectorRepository.__new__(VectorRepository)  # 不连接 ChromaDB
+        repo._collection = FakeCollection()
+        repo._index = None
+        
+        paper = {"type": "paper"}
+        result = repo.search_batch(
+            [[0.0, 1.0], [1.0, 1.0], [2.0, 1.0], [3.0, 1.0]],
+            n_results=1,
+            where_filters=[None, paper, {}, {"type": "paper"}]
+        )
+        
+        assert result["success"]
+        assert [r["ids"] for r in result["results"]] == [["id0"], ["id1"], ["id2"], ["id3"]]
+        assert result["results"][1]["metadatas"] == [paper]
+        assert sorted(repo._collection.calls, key=str) == sorted([(2, None), (2, paper)], key=str)
+        
+        assert not repo.search_batch([[0.0, 1.0]], where_filters=[None, None])["success"]
+    
+    def test_delete_by_doi_uses_metadata_index(self, monkeypatch):
+        """测试内存索引可用时按元数据索引给出的 id 删除，索引过期或不可用时退回 where 删除"""
+        from backend.repositories.vector_index import InMemoryVectorIndex
+        from backend.repositories.vector_repository import VectorRepository
+        
+        metadatas = [{"doi": "10.1/a"}, {"doi": "10.1/b"}, {"doi": "10.1/a"}]
+        
+        class FakeCollection:
+            def __init__(self):
+                self.deletes = []
+            
+            def count(self):
+                return len(metadatas)
+            
+            def get(self, include=None, limit=None, offset=0):
+                rows = range(offset, min(offset + limit, len(metadatas)))
+                return {
+                    "ids": [f"id{i}" for i in rows],
+                    "documents": [f"doc{i}" for i in rows],
+                    "metadatas": [metadatas[i] for i in rows],
+                    "embeddings": [[float(i), 1.0] for i in rows]
+                }
+            
+            def delete(self, ids=None, where=None):
+                self.deletes.append({"ids": ids} if ids is not None else {"where": where})
+        
+        repo = VectorRepository.__new__(VectorRepository)  # 不连接 ChromaDB
+        repo._collection = FakeCollection()
+        repo._index = InMemoryVectorIndex(repo._collection, space="l2")
+        assert repo._index.load()
+        # 不在后台重新加载，保持删除后的过期状态
+        monkeypatch.setattr(repo._index, "_load_in_background", lambda: None)
+        
+        assert repo.delete_by_doi("10.1/a")
+        # 删除后索引过期，新快照加载前可能缺少行，退回 where 删除
+        assert repo.delete_by_doi("10.1/b")
+        repo._index = None
+        assert repo.delete_by_doi("10.1/c")
+        
+        assert repo._collection.deletes == [
+            {"ids": ["id0", "id2"]},
+            {"where": {"doi": "10.1/b"}},
+            {"where": {"doi": "10.1/c"}}
+        ]
+
+
+class TestLexicalIndex:
+    """BM25 词法索引测试类"""
+    
+    def test_tokenize_mixed_text(self):
+        """测试中英文混合分词：化学式保留整体和组成部分，中文切分为二元组"""
+        from backend.repositories.lexical_index import tokenize
+        
+        tokens = tokenize("LiFePO4/C 碳包覆")
+        assert tokens == ["lifepo4/c", "lifepo4", "c", "碳包", "包覆"]
+    
+    def test_bm25_ranks_exact_terms_and_rrf(self):
+        """测试 BM25 精确术语排序和倒数排名融合"""
+        from backend.repositories.lexical_index import BM25Index, reciprocal_rank_fusion
+        
+        index = BM25Index([
+            "磷酸铁锂正极材料的循环性能",
+            "Nb-doped LiFePO4/C 的倍率性能",
+            "LiFePO4 的水热合成",
+        ])
+        rows, scores = index.search("Nb掺杂 LiFePO4/C", n_results=3)
+        assert rows.tolist()[0] == 1
+        assert list(scores) == sorted(scores, reverse=True)
+        assert len(index.search("钠离子", n_results=3)[0]) == 0
+        
+        fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+        assert max(fused, key=fused.get) == "b"
+
+
+class TestMetadataIndex:
+    """元数据旁路索引测试类"""
+    
+    def test_metadata_index_resolves_filters(self):
+        """测试过滤条件解析为行号集合，不支持的条件交给 ChromaDB"""
+        from backend.repositories.metadata_index import MetadataIndex, filter_supported
+        
+        index = MetadataIndex([
+            {"doi": "10.1/a", "page": 1, "type": "content"},
+            {"doi": "10.1/a", "page": 2, "type": "content"},
+            {"doi": "10.1/b", "page": 1, "type": "abstract"},
+            {"doi": "10.1/c", "page": 1, "type": "content"},
+        ])
+        
+        assert index.resolve({"doi": "10.1/a"}).tolist() == [0, 1]
+        assert index.resolve({"$and": [{"page": 1}, {"type": {"$eq": "content"}}]}).tolist() == [0, 3]
+        assert index.resolve({"doi": {"$in": ["10.1/b", "10.1/c"]}}).tolist() == [2, 3]
+        assert index.resolve({"$or": [{"doi": "10.1/b"}, {"page": 2}]}).tolist() == [1, 2]
+        assert index.resolve({"doi": "10.1/x"}).tolist() == []
+        
+        assert filter_supported({"doi": "10.1/a"})
+        assert not filter_supported({"page": {"$gt": 1}})
+        assert not filter_supported({"year": 2020})
+    
+    def test_index_filtered_search_matches_brute_force(self):
+        """测试带过滤条件的内存检索只返回匹配行且与暴力计算一致（小集合与大集合两种路径）"""
+        import numpy as np
+        from backend.repositories.vector_index import InMemoryVectorIndex
+        
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(40, 6)).astype(np.float32)
+        metadatas = [{"doi": f"10.1/{i % 8}", "type": "content" if i % 4 else "abstract"} for i in range(40)]
+        
+        class FakeCollection:
+            def count(self):
+                return len(vectors)
+            
+            def get(self, include=None, limit=None, offset=0):
+                rows = range(offset, min(offset + limit, len(vectors)))
+                return {
+                    "ids": [f"id{i}" for i in rows],
+                    "documents": [f"doc{i}" for i in rows],
+                    "metadatas": [metadatas[i] for i in rows],
+                    "embeddings": vectors[offset:offset + limit].tolist()
+                }
+        
+        index = InMemoryVectorIndex(FakeCollection(), space="l2")
+        assert index.load()
+        query = rng.normal(size=6).astype(np.float32)
+        distances = ((vectors - query) ** 2).sum(axis=1)
+        
+        for where in ({"doi": "10.1/3"}, {"type": "content"}):
+            allowed = [i for i in range(40) if all(metadatas[i][k] == v for k, v in where.items())]
+            expected = sorted(allowed, key=lambda i: distances[i])[:3]
+            result = index.search(query, n_results=3, where=where)[0]
+            assert result["ids"] == [f"id{i}" for i in expected]
+            assert np.allclose(result["distances"], distances[expected], atol=1e-4)
+        
+        chunks = index.get_by_field("doi", "10.1/3")
+        assert chunks["ids"] == ["id3", "id11", "id19", "id27", "id35"]
+
+
+class TestDiversity:
+    """检索结果多样化测试类"""
+    
+    def test_select_diverse_groups_by_doi_and_applies_mmr(self):
+        """测试按 DOI 分组后 MMR 选择不同论文，且总切片数不超过 top_k"""
+        from backend.utils.diversity import select_diverse
+        
+        documents = [
+            {"id": "a1", "score": 0.90, "metadata": {"doi": "10.1/a"}},
+            {"id": "a2", "score": 0.88, "metadata": {"doi": "10.1/a"}},
+            {"id": "c1", "score": 0.87, "metadata": {"doi": "10.1/c"}},  # 与 a 几乎相同
+            {"id": "a3", "score": 0.86, "metadata": {"doi": "10.1/a"}},
+            {"id": "b1", "score": 0.80, "metadata": {"doi": "10.1/b"}},
+        ]
+        embeddings = [[1.0, 0.0], [1.0, 0.1], [1.0, 0.05], [0.9, 0.1], [0.0, 1.0]]
+        
+        selected = select_diverse(documents, embeddings, top_k=2, lambda_mult=0.5)
+        assert [doc["id"] for doc in selected] == ["a1", "b1"]
+        
+        selected = select_diverse(documents, embeddings, top_k=3, lambda_mult=1.0, chunks_per_doi=2)
+        assert [doc["id"] for doc in selected] == ["a1", "a2", "c1"]
+        assert [doc["mmr_rank"] for doc in selected] == [1, 1, 2]
+
+
+class TestReranker:
+    """交叉编码器重排序测试类"""
+    
+    class FakeCrossEncoder:
+        """按内容长度打分，记录每次 predict 的批大小"""
+        def __init__(self):
+            self.batches = []
+        
+        def predict(self, pairs, batch_size=32, show_progress_bar=False):
+            self.batches.append(len(pairs))
+            return [float(len(content)) for _, content in pairs]
+    
+    def test_rerank_within_budget(self):
+        """测试预算内的候选一次批量打分后重排，超出预算的候选保持原顺序，并记录名次变化"""
+        from backend.services.reranker import Reranker
+        
+        model = self.FakeCrossEncoder()
+        reranker = Reranker(model_name="fake", budget_ms=30, ms_per_pair=10, min_candidates=2, model=model)
+        documents = [{"id": i, "content": "x" * n} for i, n in enumerate([1, 3, 2, 9, 8])]
+        
+        reranked, info = reranker.rerank("q", documents)
+        assert model.batches == [3]
+        assert [doc["id"] for doc in reranked] == [1, 2, 0, 3, 4]
+        assert reranked[0]["pre_rerank_rank"] == 2 and reranked[0]["rerank_score"] == 3.0
+        assert info["applied"] and info["reranked"] == 3 and info["truncated"] == 2
+        assert info["moved"] == 3 and info["top1_changed"]
+        
+        reranked, _ = reranker.rerank("q", [dict(doc) for doc in documents], budget_ms=1000, top_n=2)
+        assert [doc["id"] for doc in reranked] == [3, 4]
+        assert reranker.stats()["reranked"] == 2
+    
+    def test_rerank_skips_when_over_budget(self):
+        """测试预算内可重排的候选过少时跳过，不调用模型"""
+        from backend.services.reranker import Reranker
+        
+        model = self.FakeCrossEncoder()
+        reranker = Reranker(model_name="fake", budget_ms=30, ms_per_pair=20, min_candidates=4, model=model)
+        documents = [{"id": i, "content": "x" * (i + 1)} for i in range(5)]
+        
+        reranked, info = reranker.rerank("q", documents)
+        assert reranked is documents
+        assert info["skipped"] == "over_budget" and not info["applied"]
+        assert model.batches == []
+        assert reranker.stats()["skipped"] == 1
+    
+    def test_estimate_recovers_after_slow_request(self, monkeypatch):
+        """测试加载时预热不计入估计，偶发慢请求后估计在跳过时衰减，重排恢复执行"""
+        from backend.services import reranker as reranker_module
+        from backend.services.reranker import Reranker
+        
+        model = self.FakeCrossEncoder()
+        monkeypatch.setattr(reranker_module, "CROSS_ENCODER_AVAILABLE", True)
+        monkeypatch.setattr(reranker_module, "CrossEncoder", lambda *args, **kwargs: model, raising=False)
+        reranker = Reranker(model_name="fake", budget_ms=300, ms_per_pair=20, min_candidates=4)
+        reranker._load_model()
+        assert reranker.ready and model.batches == [1]
+        assert reranker.stats()["ms_per_pair"] == 20
+        
+        reranker._ms_per_pair = 200.0  # 一次冷启动慢请求后的估计
+        documents = [{"id": i, "content": "x" * (i + 1)} for i in range(8)]
+        skipped = 0
+        while not reranker.rerank("q", [dict(doc) for doc in documents])[1]["applied"]:
+            skipped += 1
+            assert skipped < 20
+        assert skipped > 0 and model.batches[-1] >= 4
@@ -15,6 +15,7 @@ from .formatters import (
     truncate_text,
     format_duration
 )
+from .diversity import mmr_select, select_diverse
 
 __all__ = [
     # PDF工具
@@ -34,4 +35,7 @@ __all__ = [
     'ResponseFormatter',
     'truncate_text',
     'format_duration',
+    # 检索结果多样化
+    'mmr_select',
+    'select_diverse',
 ]
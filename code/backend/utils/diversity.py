@@ -0,0 +1,119 @@
+"""
+检索结果多样化
+按 DOI 分组后在论文层面做最大边际相关（MMR）选择，
+避免同一篇论文的多个切片占满上下文和引用
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7
+) -> List[int]:
+    """
+    最大边际相关选择
+
+    每一步选择 lambda * 相关性 - (1 - lambda) * 与已选项的最大余弦相似度 最高的候选
+
+    Args:
+        relevance: 候选相关性 (N,)，建议归一化到 0-1
+        embeddings: 候选向量 (N, D)，函数内按行归一化；全零行视为与其他候选不相似
+        k: 选择数量
+        lambda_mult: 相关性权重，1 为纯相关性排序，0 为纯多样性
+
+    Returns:
+        按选择顺序排列的候选下标
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+    for _ in range(k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+def _doc_relevance(documents: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """文档相关性：融合得分 > 相似度 > 名次倒数，归一化到 0-1"""
+    values = []
+    for rank, doc in enumerate(documents, 1):
+        if doc.get("rrf_score") is not None:
+            values.append(doc["rrf_score"])
+        elif doc.get("score") is not None:
+            values.append(doc["score"])
+        else:
+            values.append(1.0 / rank)
+    relevance = np.asarray(values, dtype=np.float32)
+    top = float(relevance.max()) if len(relevance) else 0.0
+    return relevance / top if top > 0 else relevance
+
+
+def select_diverse(
+    documents: List[Dict[str, Any]],
+    embeddings: Sequence[Optional[Any]],
+    top_k: int,
+    lambda_mult: float = 0.7,
+    chunks_per_doi: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    按 DOI 分组并用 MMR 选择不同的论文
+
+    每篇论文以其最相关的切片代表参与 MMR，选中后带上该论文最相关的 chunks_per_doi 个切片，
+    总切片数不超过 top_k。没有 DOI 的切片各自成组
+
+    Args:
+        documents: 按相关性降序的候选切片（含 metadata，可含 rrf_score/score）
+        embeddings: 与 documents 对齐的切片向量，缺失时为None
+        top_k: 返回的切片总数上限（与不分组时相同，不增加提示词长度）
+        lambda_mult: MMR 相关性权重
+        chunks_per_doi: 每篇论文最多保留的切片数
+
+    Returns:
+        选中的切片（按论文选择顺序，同一论文的切片相邻），附带 mmr_rank（论文名次）
+    """
+    if not documents or top_k <= 0:
+        return []
+    relevance = _doc_relevance(documents)
+
+    groups: Dict[str, List[int]] = {}
+    for i, doc in enumerate(documents):
+        metadata = doc.get("metadata") or {}
+        key = metadata.get("doi") or metadata.get("DOI") or f"id:{doc.get('id', i)}"
+        groups.setdefault(key, []).append(i)
+    members = [sorted(rows, key=lambda i: -relevance[i]) for rows in groups.values()]
+
+    dim = next((len(e) for e in embeddings if e is not None), 0)
+    representatives = np.zeros((len(members), max(dim, 1)), dtype=np.float32)
+    for g, rows in enumerate(members):
+        if dim and embeddings[rows[0]] is not None:
+            representatives[g] = np.asarray(embeddings[rows[0]], dtype=np.float32)
+    group_relevance = np.asarray([relevance[rows[0]] for rows in members], dtype=np.float32)
+
+    per_doi = max(1, chunks_per_doi)
+    order = mmr_select(group_relevance, representatives, min(len(members), top_k), lambda_mult)
+
+    selected = []
+    for rank, g in enumerate(order, 1):
+        for i in members[g][:per_doi]:
+            if len(selected) >= top_k:
+                return selected
+            documents[i]["mmr_rank"] = rank
+            selected.append(documents[i])
+    return selected